@@ -46,6 +46,15 @@ USER_AGENT = (
 
 TIMEOUT = 20
 
+# ------------------------------------------------------------
+# Local Mapping Service (mapping_service.py)
+# ------------------------------------------------------------
+
+# 只监听本机；脚本与 Tampermonkey 助手通过该地址查询 Mapping_Data
+MAPPING_SERVICE_HOST = "127.0.0.1"
+MAPPING_SERVICE_PORT = 8765
+MAPPING_SERVICE_URL = f"http://{MAPPING_SERVICE_HOST}:{MAPPING_SERVICE_PORT}"
+
 # ------------------------------------------------------------
 # Shared Constants
 # ------------------------------------------------------------
@@ -1,18 +1,27 @@
+import io
 import os
+import json
 import time
+import threading
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple
 
 import pandas as pd
 import requests
 
+import metrics
 from config import (
-    DXM_COOKIE_PATH,
     PICKLIST_FOLDER,
+    SCRAPE_FOLDER,
+    MAPPING_PATH,
     DRY_RUN,
     ENABLE_AUDIT,
     USER_AGENT,
 )
+from excel_io import iter_column, move_sidecars, read_excel, read_header_row, write_excel
+from http_client import load_cookie as load_shared_cookie, make_session as make_http_session, pause
+from mapping_service import is_complete_mapping, load_mapping_keys, lookup_skus, normalize_key
 
 # ================== CONFIG ==================
 
@@ -23,12 +32,55 @@ DO_AUDIT = ENABLE_AUDIT
 
 MAX_ORDERS = 300  # DXM 每页最多 300
 
+# list.json 分页并发数（第 1 页拿到总条数后，其余页并发获取）
+LIST_CONCURRENCY = 4
+
+# 多批次导出时同时轮询/下载的任务数（所有 exportPickData 任务会先一次性提交）
+EXPORT_CONCURRENCY = 4
+
 # 订单工作簿目录：现在相对 PICKLIST_FOLDER，可在任意电脑任意路径运行
 ORDER_IDS_DIR = os.path.join(PICKLIST_FOLDER, "Locate&Audit_UnprocessedOrders_InDXM")
 
 DOWNLOAD_DIR = PICKLIST_FOLDER
 WORK_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# 多批次导出时，把各批次拣货单合并成一个按 SKU 汇总的工作簿（add_to_cart 一次即可处理全部）
+CONSOLIDATE_CHUNKS = True
+# 合并后，各批次原始拣货单移到这里（避免 add_to_cart 再次拾取）
+CHUNKS_DIR = os.path.join(DOWNLOAD_DIR, "Export_chunks")
+
+# 导出前检查待审核订单中的 SKU 是否都已在 Mapping_Data 中有映射
+CHECK_MAPPING_COVERAGE = True
+# 同时把缺映射的 SKU 追加到 ID_Scrape 下的待抓取队列工作簿（填好 商品链接 后可用 scrape --excel 抓取）
+QUEUE_UNMAPPED_FOR_SCRAPE = False
+UNMAPPED_QUEUE_PATH = os.path.join(SCRAPE_FOLDER, "unmapped_sku_queue.xlsx")
+
+# Mode 2：orderId -> packageId 索引缓存（由一次完整的待审核分页构建，短时间内重复运行直接复用）
+ORDER_INDEX_CACHE_PATH = os.path.join(WORK_DIR, "dxm_order_index_cache.json")
+ORDER_INDEX_TTL_SEC = 600
+# 订单数不超过该值时，逐单查询比拉取整个待审核列表更快
+ORDER_INDEX_MIN_ORDERS = 10
+
+# 【待审核】包裹本地快照：增量同步（按付款时间），导出 / 审核 / 覆盖检查 / orderId 索引共用
+PENDING_SNAPSHOT_PATH = os.path.join(WORK_DIR, "dxm_pending_snapshot.json")
+# 超过该时间强制全量同步一次（按 idStr 对账，纠正总数不变但有包裹进出的情况）
+PENDING_SNAPSHOT_FULL_SYNC_SEC = 6 * 3600
+# 增量拉取时 startTime 往前回退的秒数（防止同一秒付款的订单漏掉）
+PENDING_SNAPSHOT_OVERLAP_SEC = 300
+
+# 导出台账：记录每个 packageId 的导出时间 / uuid / 文件，之后的运行默认跳过已导出的包裹
+EXPORT_LEDGER_PATH = os.path.join(WORK_DIR, "dxm_export_ledger.json")
+EXPORT_LEDGER_KEEP_DAYS = 30
+# True：忽略台账，已导出过的包裹也重新导出
+REEXPORT_EXPORTED = False
+
+# batchAudit 并发批次数（每批 MAX_ORDERS 个包裹）
+AUDIT_CONCURRENCY = 3
+# 审核后重新全量同步一次待审核列表，确认每个包裹是否真的离开了【待审核】
+VERIFY_AUDIT = True
+# 每次审核的逐包裹报告
+AUDIT_REPORT_DIR = os.path.join(WORK_DIR, "audit_reports")
+
 UA = USER_AGENT
 
 
@@ -39,19 +91,13 @@ def load_cookie() -> str:
     """\
     优先使用环境变量 DXM_COOKIE；
     否则使用 config.py 中 DXM_COOKIE_PATH 指定的文本文件。
+    （由 http_client 读取并缓存，每个进程只读一次）
     """
-    # 1) 先看环境变量
-    ck = os.environ.get("DXM_COOKIE", "").strip()
+    ck = load_shared_cookie("dxm")
     if ck:
         return ck
 
-    # 2) 再看 config.py 中配置的 txt 文件
-    cookie_path = DXM_COOKIE_PATH
-    if os.path.exists(cookie_path):
-        with open(cookie_path, "r", encoding="utf-8") as f:
-            return f.read().strip()
-
-    # 3) 两者都没有 → 抛出错误
+    # 两者都没有 → 抛出错误
     raise RuntimeError(
         "未找到 DXM Cookie。\n"
         "请设置环境变量 DXM_COOKIE，或在 config.py 中配置 DXM_COOKIE_PATH，"
@@ -63,7 +109,12 @@ def load_cookie() -> str:
 
 
 def make_session() -> Tuple[requests.Session, dict]:
-    s = requests.Session()
+    """\
+    共享传输层的 Session（连接池 + 默认超时 + 重试）。
+    只有查询类接口（list.json / checkProcess.json / 下载）会自动重试；
+    exportPickData / batchAudit 不是幂等请求，失败直接报告。
+    """
+    s = make_http_session()
     cookie = load_cookie()
     headers = {
         "User-Agent": UA,
@@ -76,24 +127,34 @@ def make_session() -> Tuple[requests.Session, dict]:
     return s, headers
 
 
+_thread_local = threading.local()
+
+
+def _worker_session() -> requests.Session:
+    """每个工作线程一个 Session（requests.Session 不保证线程安全）；headers 只读，可以共用。"""
+    s = getattr(_thread_local, "session", None)
+    if s is None:
+        s = make_http_session()
+        _thread_local.session = s
+    return s
+
+
 # ================== list.json helpers ==================
 
 
-def query_package_id_from_order_id(
-    session: requests.Session,
-    headers: dict,
-    order_id: str,
-) -> str | None:
-    """Mode 2：用 list.json 在【待审核】中查询一个 orderId -> packageId"""
-    url = "https://www.dianxiaomi.com/api/package/list.json"
+LIST_URL = "https://www.dianxiaomi.com/api/package/list.json"
+
+
+def build_list_payload(page_no: int, page_size: int = MAX_ORDERS, **overrides) -> dict:
+    """list.json 的【待审核】查询参数；overrides 覆盖个别字段（如 orderId / startTime）。"""
     data = {
-        "pageNo": 1,
-        "pageSize": 50,
+        "pageNo": page_no,
+        "pageSize": page_size,
         "shopId": -1,
         "state": "paid",  # 待审核
         "platform": "",
-        "isSearch": 1,
-        "searchType": "orderId",
+        "isSearch": 0,
+        "searchType": "",
         "authId": -1,
         "startTime": "",
         "endTime": "",
@@ -117,23 +178,69 @@ def query_package_id_from_order_id(
         "forbiddenStatus": -1,
         "forbiddenReason": 0,
         "behindTrack": -1,
-        "orderId": order_id,
+        "orderId": "",
     }
+    data.update(overrides)
+    return data
 
-    print(f"[INFO] list.json 查询 orderId = {order_id}")
-    resp = session.post(url, data=data, headers=headers)
-    print(f"[HTTP] list.json status = {resp.status_code}")
+
+def fetch_list_page(
+    session: requests.Session,
+    headers: dict,
+    data: dict,
+) -> dict | None:
+    """请求一页 list.json，返回 data.page 字典；HTTP / JSON / 网络出错时返回 None。"""
+    try:
+        resp = session.post(LIST_URL, data=data, headers=headers, retry=True)
+    except requests.RequestException as e:
+        print(f"[WARN] list.json 第 {data.get('pageNo')} 页请求失败: {e}")
+        return None
+    print(f"[HTTP] list.json 第 {data.get('pageNo')} 页 status = {resp.status_code}")
     if resp.status_code != 200:
-        print("[ERROR] list.json HTTP 请求失败")
+        print("[WARN] list.json HTTP 非 200。")
         return None
 
     try:
         j = resp.json()
     except Exception as e:
-        print("[ERROR] list.json 返回不是 JSON:", e)
+        print("[WARN] list.json JSON 解析失败:", e)
+        return None
+
+    return (j.get("data") or {}).get("page") or {}
+
+
+def page_total_count(page: dict, page_size: int) -> int | None:
+    """从 list.json 的 page 字典读取总条数；接口未返回时为 None。"""
+    for key in ("totalSize", "totalCount", "total"):
+        try:
+            v = int(page.get(key))
+            if v >= 0:
+                return v
+        except (TypeError, ValueError):
+            continue
+    try:
+        pages = int(page.get("totalPage"))
+        if pages >= 0:
+            return pages * page_size
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def query_package_id_from_order_id(
+    session: requests.Session,
+    headers: dict,
+    order_id: str,
+) -> str | None:
+    """Mode 2：用 list.json 在【待审核】中查询一个 orderId -> packageId"""
+    data = build_list_payload(1, 50, isSearch=1, searchType="orderId", orderId=order_id)
+
+    print(f"[INFO] list.json 查询 orderId = {order_id}")
+    page = fetch_list_page(session, headers, data)
+    if page is None:
+        print("[ERROR] list.json 请求失败")
         return None
 
-    page = j.get("data", {}).get("page", {})
     rows = page.get("list", []) or []
 
     if not rows:
@@ -150,81 +257,362 @@ def query_package_id_from_order_id(
     return None
 
 
-def get_all_pending_packages(session: requests.Session, headers: dict) -> List[dict]:
-    """Mode 1：用 list.json 分页获取所有【待审核】包裹。"""
-    url = "https://www.dianxiaomi.com/api/package/list.json"
-    page_no = 1
-    all_rows: List[dict] = []
+def _merge_package_rows(pages: list[list[dict]]) -> List[dict]:
+    """按页顺序合并，并按 idStr 去重（分页期间有新单进入时，相邻页可能重叠）。"""
+    merged: List[dict] = []
+    seen = set()
+    for rows in pages:
+        for r in rows:
+            pkg = r.get("idStr") or str(r.get("id"))
+            if pkg in seen:
+                continue
+            seen.add(pkg)
+            merged.append(r)
+    return merged
 
-    print("=== 获取所有【待审核】订单 (list.json 分页) ===")
 
-    while True:
-        data = {
-            "pageNo": page_no,
-            "pageSize": MAX_ORDERS,
-            "shopId": -1,
-            "state": "paid",  # 待审核
-            "platform": "",
-            "isSearch": 0,
-            "searchType": "",
-            "authId": -1,
-            "startTime": "",
-            "endTime": "",
-            "country": "",
-            "orderField": "order_pay_time",
-            "isVoided": 0,
-            "isRemoved": 0,
-            "printJh": -1,
-            "printMd": -1,
-            "commitPlatform": "",
-            "productStatus": "",
-            "jhComment": -1,
-            "storageId": 0,
-            "isOversea": -1,
-            "isFree": 0,
-            "isBatch": 0,
-            "custom": -1,
-            "timeOut": 0,
-            "refundStatus": 0,
-            "buyerAccount": "",
-            "forbiddenStatus": -1,
-            "forbiddenReason": 0,
-            "behindTrack": -1,
-            "orderId": "",
-        }
+class ListPageError(RuntimeError):
+    """list.json 某一页获取失败（已重试）；分页结果不完整，调用方不能把它当成完整的待审核列表。"""
 
-        print(f"[INFO] list.json 请求第 {page_no} 页...")
-        resp = session.post(url, data=data, headers=headers)
-        print(f"[HTTP] list.json status = {resp.status_code}")
-        if resp.status_code != 200:
-            print("[WARN] list.json HTTP 非 200，停止。")
-            break
 
-        try:
-            j = resp.json()
-        except Exception as e:
-            print("[WARN] list.json JSON 解析失败:", e)
-            break
+def _fetch_page_rows(session: requests.Session, headers: dict, page_no: int, filters: dict) -> list[dict]:
+    """顺序获取一页（传输层已带重试），失败时抛出 ListPageError。"""
+    page = fetch_list_page(session, headers, build_list_payload(page_no, **filters))
+    if page is None:
+        raise ListPageError(f"list.json 第 {page_no} 页获取失败，待审核列表不完整")
+    return page.get("list", []) or []
+
+
+def get_all_pending_packages(session: requests.Session, headers: dict, **filters) -> List[dict]:
+    """\
+    Mode 1：用 list.json 分页获取所有【待审核】包裹。
+      - 先取第 1 页，读取总条数
+      - 其余页以 LIST_CONCURRENCY 并发获取，按页序合并并按 idStr 去重
+      - 最后一页仍是满页（分页期间有新进单 / 接口未返回总条数）时继续逐页获取，直到出现不满一页
+      - 任何一页重试后仍失败都抛出 ListPageError，不返回残缺列表
+    filters 透传给 build_list_payload（如 startTime，用于增量同步）。
+    """
+    print("=== 获取所有【待审核】订单 (list.json 分页) ===")
 
-        page = j.get("data", {}).get("page", {})
-        rows = page.get("list", []) or []
+    first_page = fetch_list_page(session, headers, build_list_payload(1, **filters))
+    if first_page is None:
+        raise ListPageError("list.json 第 1 页获取失败，无法获取待审核列表")
+
+    first_rows = first_page.get("list", []) or []
+    print(f"[INFO] 第 1 页得到 {len(first_rows)} 条。")
+    pages: list[list[dict]] = [first_rows]
+    next_page = 2
+
+    total = page_total_count(first_page, MAX_ORDERS)
+    if len(first_rows) >= MAX_ORDERS and total is not None:
+        n_pages = -(-total // MAX_ORDERS)
+        print(f"[INFO] 共 {total} 条，{n_pages} 页；其余页并发获取 (并发 {LIST_CONCURRENCY})。")
+        page_nos = list(range(2, n_pages + 1))
+        with ThreadPoolExecutor(max_workers=LIST_CONCURRENCY) as pool:
+            results = list(pool.map(
+                lambda n: fetch_list_page(_worker_session(), headers, build_list_payload(n, **filters)),
+                page_nos,
+            ))
+        for n, page in zip(page_nos, results):
+            if page is None:
+                # 并发失败的页再顺序重试一次
+                print(f"[WARN] 第 {n} 页获取失败，重试...")
+                pages.append(_fetch_page_rows(session, headers, n, filters))
+            else:
+                pages.append(page.get("list", []) or [])
+        next_page = n_pages + 1
+    elif len(first_rows) >= MAX_ORDERS:
+        print("[INFO] 接口未返回总条数，逐页获取。")
+
+    while len(pages[-1]) >= MAX_ORDERS:
+        rows = _fetch_page_rows(session, headers, next_page, filters)
         if not rows:
             print("[INFO] 本页无数据，结束分页。")
             break
-
-        print(f"[INFO] 本页得到 {len(rows)} 条。")
-        all_rows.extend(rows)
-
-        if len(rows) < MAX_ORDERS:
+        print(f"[INFO] 第 {next_page} 页得到 {len(rows)} 条。")
+        pages.append(rows)
+        next_page += 1
+    else:
+        if len(pages) > 1:
             print("[INFO] 最后一页 (< pageSize)。")
-            break
-
-        page_no += 1
 
+    all_rows = _merge_package_rows(pages)
     print(f"[INFO] 共获取【待审核】包裹 {len(all_rows)} 条。")
     return all_rows
 
 
+# ================== Pending snapshot (incremental sync) ==================
+
+# list.json 包裹行中付款时间可能的字段名（毫秒时间戳或 "YYYY-MM-DD HH:MM:SS"）
+_PAY_TIME_KEYS = ("orderPayTime", "payTime", "paidTime", "orderPaidTime")
+
+
+def package_pay_time_ms(row: dict) -> int | None:
+    for k in _PAY_TIME_KEYS:
+        v = row.get(k)
+        if v in (None, ""):
+            continue
+        try:
+            n = int(float(v))
+            return n if n > 10**11 else n * 1000  # 秒 → 毫秒
+        except (TypeError, ValueError):
+            pass
+        try:
+            return int(time.mktime(time.strptime(str(v)[:19], "%Y-%m-%d %H:%M:%S")) * 1000)
+        except ValueError:
+            continue
+    return None
+
+
+def compact_package(row: dict) -> dict:
+    """快照中保存的精简包裹记录（idStr / orderId / 付款时间 / 商品明细）。"""
+    return {
+        "idStr": row.get("idStr") or str(row.get("id")),
+        "orderId": str(row.get("orderId") or "").strip(),
+        "payTime": package_pay_time_ms(row),
+        "items": [{"sku": sku, "qty": qty} for sku, qty in extract_skus_from_package(row)],
+    }
+
+
+def load_pending_snapshot() -> dict | None:
+    if not os.path.exists(PENDING_SNAPSHOT_PATH):
+        return None
+    try:
+        with open(PENDING_SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+            snap = json.load(f)
+        if not isinstance(snap.get("packages"), dict):
+            return None
+        return snap
+    except Exception as e:
+        print("[WARN] 读取待审核快照失败，将全量同步:", e)
+        return None
+
+
+def save_pending_snapshot(snap: dict) -> None:
+    tmp = PENDING_SNAPSHOT_PATH + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snap, f, ensure_ascii=False)
+        os.replace(tmp, PENDING_SNAPSHOT_PATH)
+    except Exception as e:
+        print("[WARN] 保存待审核快照失败:", e)
+
+
+def fetch_pending_total(session: requests.Session, headers: dict) -> int | None:
+    """只取 1 条记录，读取【待审核】总数（用于廉价地判断是否有包裹离开待审核）。"""
+    page = fetch_list_page(session, headers, build_list_payload(1, 1))
+    if page is None:
+        return None
+    return page_total_count(page, 1)
+
+
+def _full_snapshot(session: requests.Session, headers: dict, old: dict | None = None) -> dict:
+    """全量分页拉取并按 idStr 与旧快照对账（打印新增 / 移除数量）。"""
+    rows = get_all_pending_packages(session, headers)
+    packages = {}
+    for r in rows:
+        rec = compact_package(r)
+        packages[rec["idStr"]] = rec
+    if old:
+        added = len(packages.keys() - old.keys())
+        removed = len(old.keys() - packages.keys())
+        print(f"[INFO] 待审核快照对账: 新增 {added} 个，移除 {removed} 个。")
+    now = time.time()
+    return {"synced_at": now, "full_synced_at": now, "packages": packages}
+
+
+def sync_pending_packages(
+    session: requests.Session,
+    headers: dict,
+    full: bool = False,
+) -> List[dict]:
+    """\
+    同步本地【待审核】快照并返回全部待审核包裹（精简记录，按付款时间排序）：
+      - 无快照 / 距上次全量超过 PENDING_SNAPSHOT_FULL_SYNC_SEC / full=True：全量分页拉取，按 idStr 对账
+      - 否则只用 startTime（按 order_pay_time）拉取上次最新付款时间之后的新包裹
+      - 再用一次 pageSize=1 的请求读取待审核总数；与快照数量不一致（有包裹被审核/取消）时全量重建
+      - 总数不变但有包裹进出的情况由定期全量同步纠正；分页不完整时抛出 ListPageError，快照保持不变
+    导出、审核校验、映射覆盖检查、Mode 2 orderId 索引都通过本函数获取待审核列表。
+    """
+    snap = load_pending_snapshot()
+    old = (snap or {}).get("packages") or {}
+    now = time.time()
+    if full or (snap is not None and now - float(snap.get("full_synced_at", 0)) > PENDING_SNAPSHOT_FULL_SYNC_SEC):
+        snap = None
+
+    pay_times = [p["payTime"] for p in (snap or {}).get("packages", {}).values() if p.get("payTime")]
+    if snap is None or not pay_times:
+        print("[INFO] 待审核快照: 全量同步。")
+        snap = _full_snapshot(session, headers, old)
+    else:
+        since_ms = max(pay_times) - PENDING_SNAPSHOT_OVERLAP_SEC * 1000
+        start_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(since_ms / 1000))
+        print(f"[INFO] 待审核快照: 增量同步 startTime={start_time}（快照 {len(snap['packages'])} 个包裹）")
+        new_rows = get_all_pending_packages(session, headers, startTime=start_time)
+        added = 0
+        for r in new_rows:
+            rec = compact_package(r)
+            if rec["idStr"] not in snap["packages"]:
+                added += 1
+            snap["packages"][rec["idStr"]] = rec
+        print(f"[INFO] 新增 {added} 个包裹。")
+
+        total = fetch_pending_total(session, headers)
+        if total is None or total != len(snap["packages"]):
+            print(f"[INFO] 待审核总数 {total} 与快照 {len(snap['packages'])} 不一致，全量重建快照。")
+            snap = _full_snapshot(session, headers, old)
+        snap["synced_at"] = now
+
+    save_pending_snapshot(snap)
+    packages = list(snap["packages"].values())
+    packages.sort(key=lambda p: p.get("payTime") or 0)
+    print(f"[INFO] 待审核快照共 {len(packages)} 个包裹。")
+    return packages
+
+
+def remove_from_pending_snapshot(package_ids: list[str]) -> None:
+    """审核成功（已离开【待审核】）的包裹从快照中移除，避免下次同步触发全量重建。"""
+    snap = load_pending_snapshot()
+    if snap is None:
+        return
+    removed = 0
+    for pkg in package_ids:
+        if snap["packages"].pop(str(pkg), None) is not None:
+            removed += 1
+    if removed:
+        save_pending_snapshot(snap)
+
+
+# ================== Mapping coverage ==================
+
+# list.json 每个包裹行中商品明细可能出现的字段名（不同页面/版本略有差异）
+_ITEM_LIST_KEYS = ("productList", "orderItemList", "itemList", "items", "productVos", "dxmPackageItemList")
+_ITEM_SKU_KEYS = ("productSku", "displaySku", "sku", "skuCode", "productSkuCode")
+_ITEM_QTY_KEYS = ("productCount", "quantity", "qty", "num", "count")
+
+
+def extract_skus_from_package(row: dict) -> list[tuple[str, int]]:
+    """\
+    从 list.json 的单个包裹行中提取 (SKU, 数量) 列表。
+    只取第一个存在的明细字段：同一批商品可能在多个字段里重复出现，合并会把数量算成两倍。
+    """
+    items: list = next((row[k] for k in _ITEM_LIST_KEYS if isinstance(row.get(k), list) and row[k]), [])
+
+    out: list[tuple[str, int]] = []
+    for it in items:
+        if not isinstance(it, dict):
+            continue
+        sku = next((str(it[k]).strip() for k in _ITEM_SKU_KEYS if it.get(k)), "")
+        if not sku:
+            continue
+        qty = 1
+        for k in _ITEM_QTY_KEYS:
+            try:
+                qty = int(float(it[k]))
+                break
+            except (KeyError, TypeError, ValueError):
+                continue
+        out.append((sku, qty))
+    return out
+
+
+def check_mapping_coverage(rows: List[dict]) -> list[dict]:
+    """\
+    导出前的映射覆盖检查：
+      - 从待审核包裹中提取 SKU
+      - 与 Mapping_Data 索引做关联（本地 Mapping 服务可用时直接查询，否则只读 xlsx 的 商品選項貨號 列）
+      - 映射行缺 商品链接 或 Spec ID 的也算缺映射（加购时同样会失败）
+      - 返回缺映射的 SKU 列表 [{SKU, 数量, 包裹数}]
+    """
+    demand: dict[str, dict] = {}
+    no_items = 0
+    for r in rows:
+        items = extract_skus_from_package(r)
+        if not items:
+            no_items += 1
+            continue
+        per_package: dict[str, int] = {}
+        for sku, qty in items:
+            key = normalize_key(sku)
+            per_package[key] = per_package.get(key, 0) + qty
+        # 同一包裹里同一 SKU 出现多行时，包裹数只算一次
+        for key, qty in per_package.items():
+            d = demand.setdefault(key, {"SKU": key, "数量": 0, "包裹数": 0})
+            d["数量"] += qty
+            d["包裹数"] += 1
+
+    if no_items:
+        print(f"[WARN] {no_items} 个包裹未能从 list.json 中解析到 SKU 明细（覆盖检查不含这些包裹）。")
+    if not demand:
+        return []
+
+    found = lookup_skus(list(demand))
+    if found is not None:
+        mapped = {k for k, row in found.items() if is_complete_mapping(row)}
+    else:
+        if not os.path.exists(MAPPING_PATH):
+            print(f"[WARN] 找不到 Mapping_Data 文件，跳过覆盖检查: {MAPPING_PATH}")
+            return []
+        mapped = load_mapping_keys(MAPPING_PATH, complete_only=True)
+
+    missing = [d for k, d in demand.items() if k not in mapped]
+    missing.sort(key=lambda d: (-d["包裹数"], d["SKU"]))
+
+    print(f"[INFO] 映射覆盖检查: 共 {len(demand)} 个 SKU，缺映射 {len(missing)} 个。")
+    for d in missing:
+        print(f"  [WARN] 无映射 SKU: {d['SKU']} (数量 {d['数量']}, 包裹 {d['包裹数']})")
+    return missing
+
+
+def queue_unmapped_for_scrape(missing: list[dict]) -> None:
+    """把缺映射 SKU 追加到待抓取队列工作簿（已在队列中的 SKU 不重复追加）。"""
+    if not missing:
+        return
+    new_df = pd.DataFrame(missing)
+    new_df["商品链接"] = ""
+    new_df["发现时间"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    if os.path.exists(UNMAPPED_QUEUE_PATH):
+        old_df = read_excel(UNMAPPED_QUEUE_PATH, dtype=str)
+        queued = set(old_df.get("SKU", pd.Series(dtype=str)).astype(str).str.strip().str.upper())
+        new_df = new_df[~new_df["SKU"].isin(queued)]
+        out_df = pd.concat([old_df, new_df], ignore_index=True)
+    else:
+        os.makedirs(os.path.dirname(UNMAPPED_QUEUE_PATH), exist_ok=True)
+        out_df = new_df
+
+    write_excel(out_df, UNMAPPED_QUEUE_PATH)
+    print(f"[INFO] 已加入待抓取队列 {len(new_df)} 个 SKU: {UNMAPPED_QUEUE_PATH}")
+
+
+def run_coverage_check_only() -> list[dict]:
+    """只做映射覆盖检查，不导出、不审核。"""
+    session, headers = make_session()
+    rows = sync_pending_packages(session, headers)
+    missing = check_mapping_coverage(rows)
+    if QUEUE_UNMAPPED_FOR_SCRAPE:
+        queue_unmapped_for_scrape(missing)
+    return missing
+
+
+def run_audit_exported_pending() -> list[dict]:
+    """只审核：当前仍在【待审核】且已在导出台账中的包裹（未导出过拣货单的包裹不会被审核）。"""
+    session, headers = make_session()
+    rows = sync_pending_packages(session, headers)
+    pending = [r.get("idStr") or str(r.get("id")) for r in rows]
+    _, exported = split_already_exported(pending, load_export_ledger())
+    not_exported = len(pending) - len(exported)
+    if not_exported:
+        print(f"[INFO] {not_exported} 个待审核包裹尚未导出拣货单，本次不审核。")
+    if not exported:
+        print("[INFO] 没有已导出且待审核的包裹。")
+        return []
+    if DRY_RUN:
+        print(f"[INFO] DRY_RUN = True，{len(exported)} 个包裹不会被审核。")
+        return []
+    return audit_packages(exported)
+
+
 # ================== Excel helpers (Mode 2) ==================
 
 
@@ -259,64 +647,175 @@ def find_latest_order_ids_workbook() -> str:
 
 def extract_order_ids_from_workbook(xlsx_path: str) -> list[str]:
     """\
-    使用 pandas 读取 Excel：
+    用 openpyxl 只读模式流式读取 Excel（内存与行数无关，几十万行的订单导出也可以）：
       - 可以读取处于“打开状态”的 Excel（只要没有被独占写锁）
       - 自动寻找 'Order No' 列；找不到则用第一列
+      - 只解析这一列，逐行去重
     """
     try:
-        df = pd.read_excel(xlsx_path, dtype=str)
+        header = read_header_row(xlsx_path)
     except Exception as e:
         raise RuntimeError(f"无法读取 Excel: {e}")
 
-    df.columns = [str(c).strip() for c in df.columns]
-
-    target_col = None
-    for col in df.columns:
+    target_idx = None
+    for i, col in enumerate(header):
         l = col.lower()
         if "order" in l and "no" in l:
-            target_col = col
+            target_idx = i
             print(f"[INFO] 检测到订单号列: {col}")
             break
 
-    if target_col is None:
-        target_col = df.columns[0]
-        print(f"[WARN] 未检测到账单列，默认使用第一列: {target_col}")
-
-    order_ids_raw = (
-        df[target_col].dropna().astype(str).str.strip().tolist()
-    )
+    if target_idx is None:
+        target_idx = 0
+        print(f"[WARN] 未检测到账单列，默认使用第一列: {header[0] if header else ''}")
 
     cleaned: list[str] = []
     seen = set()
-    for oid in order_ids_raw:
-        if not oid:
-            continue
-        low = oid.lower()
-        if low in ("order id", "order no", "订单号"):
-            continue
-        if oid not in seen:
-            seen.add(oid)
-            cleaned.append(oid)
+    try:
+        for oid in iter_column(xlsx_path, target_idx):
+            if oid.lower() in ("order id", "order no", "订单号"):
+                continue
+            if oid not in seen:
+                seen.add(oid)
+                cleaned.append(oid)
+    except Exception as e:
+        raise RuntimeError(f"无法读取 Excel: {e}")
 
     print(f"[INFO] 从工作簿读取到 {len(cleaned)} 个唯一 orderId。")
     return cleaned
 
 
+def build_order_index(rows: List[dict]) -> dict[str, str]:
+    """由 list.json 包裹行构建 orderId -> packageId 索引。"""
+    index: dict[str, str] = {}
+    for r in rows:
+        oid = str(r.get("orderId") or "").strip()
+        pkg = r.get("idStr") or str(r.get("id") or "")
+        if oid and pkg and oid not in index:
+            index[oid] = pkg
+    return index
+
+
+def load_order_index_cache() -> dict[str, str] | None:
+    """读取未过期的 orderId 索引缓存；不存在 / 已过期 / 损坏时返回 None。"""
+    if not os.path.exists(ORDER_INDEX_CACHE_PATH):
+        return None
+    try:
+        with open(ORDER_INDEX_CACHE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print("[WARN] 读取 orderId 索引缓存失败:", e)
+        return None
+
+    age = time.time() - float(data.get("built_at", 0))
+    if age > ORDER_INDEX_TTL_SEC:
+        return None
+    index = data.get("index") or {}
+    print(f"[INFO] 使用 {int(age)} 秒前的 orderId 索引缓存 ({len(index)} 条)。")
+    return index
+
+
+def save_order_index_cache(index: dict[str, str], built_at: float | None = None) -> None:
+    """built_at 为空表示刚重建；补充/剪枝旧索引时传入原 built_at，不延长缓存有效期。"""
+    tmp = ORDER_INDEX_CACHE_PATH + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"built_at": built_at or time.time(), "index": index}, f, ensure_ascii=False)
+        os.replace(tmp, ORDER_INDEX_CACHE_PATH)
+    except Exception as e:
+        print("[WARN] 保存 orderId 索引缓存失败:", e)
+
+
+def prune_order_index_cache(package_ids: list[str]) -> None:
+    """已导出 / 已审核的包裹从 orderId 索引缓存中移除，避免下次 Mode 2 解析到已处理的包裹。"""
+    if not package_ids or not os.path.exists(ORDER_INDEX_CACHE_PATH):
+        return
+    try:
+        with open(ORDER_INDEX_CACHE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print("[WARN] 读取 orderId 索引缓存失败:", e)
+        return
+    drop = {str(p) for p in package_ids}
+    index = data.get("index") or {}
+    kept = {oid: pkg for oid, pkg in index.items() if pkg not in drop}
+    if len(kept) != len(index):
+        save_order_index_cache(kept, built_at=float(data.get("built_at", 0)))
+
+
+def _drop_stale_hits(index: dict[str, str]) -> dict[str, str]:
+    """用本地待审核快照核对缓存命中：快照里已没有的包裹（已审核/取消）不再信任。"""
+    snap = load_pending_snapshot()
+    if snap is None:
+        return index
+    pending = snap["packages"]
+    kept = {oid: pkg for oid, pkg in index.items() if pkg in pending}
+    if len(kept) != len(index):
+        print(f"[INFO] orderId 索引缓存中有 {len(index) - len(kept)} 个包裹已不在待审核快照中，已忽略。")
+    return kept
+
+
+def fetch_order_index(session: requests.Session, headers: dict) -> dict[str, str]:
+    """同步【待审核】快照，构建并缓存 orderId 索引。"""
+    rows = sync_pending_packages(session, headers)
+    index = build_order_index(rows)
+    save_order_index_cache(index)
+    return index
+
+
 def resolve_package_ids_from_order_ids(
     session: requests.Session,
     headers: dict,
     order_ids: list[str],
 ) -> list[str]:
+    """\
+    批量把 orderId 转为【待审核】packageId：
+      - 订单数较少时逐单查询 list.json
+      - 否则用 orderId 索引（未过期的缓存，或拉取一次完整待审核列表）一次性解析
+      - 缓存命中先与本地待审核快照核对；未命中的订单（可能是新进单）
+        数量不多时只逐单查询这些订单，否则刷新一次索引后再解析
+    """
+    order_ids = [oid.strip() for oid in order_ids if oid and oid.strip()]
+
+    cached = load_order_index_cache()
+    if len(order_ids) <= ORDER_INDEX_MIN_ORDERS and cached is None:
+        lookup = {}
+        for oid in order_ids:
+            pkg = query_package_id_from_order_id(session, headers, oid)
+            if pkg:
+                lookup[oid] = pkg
+    else:
+        if cached is None:
+            lookup = fetch_order_index(session, headers)
+        else:
+            lookup = _drop_stale_hits(cached)
+            missed = [oid for oid in order_ids if oid not in lookup]
+            if not missed:
+                print("[INFO] 全部订单均在缓存索引中命中。")
+            elif len(missed) <= ORDER_INDEX_MIN_ORDERS:
+                print(f"[INFO] 缓存索引中有 {len(missed)} 个订单未命中，逐单查询...")
+                for oid in missed:
+                    pkg = query_package_id_from_order_id(session, headers, oid)
+                    if pkg:
+                        lookup[oid] = pkg
+            else:
+                print(f"[INFO] 缓存索引中有 {len(missed)} 个订单未命中，刷新 orderId 索引...")
+                lookup = fetch_order_index(session, headers)
+
     package_ids: list[str] = []
     seen = set()
+    not_pending = 0
     for oid in order_ids:
-        oid = oid.strip()
-        if not oid:
+        pkg = lookup.get(oid)
+        if not pkg:
+            not_pending += 1
             continue
-        pkg = query_package_id_from_order_id(session, headers, oid)
-        if pkg and pkg not in seen:
+        if pkg not in seen:
             seen.add(pkg)
             package_ids.append(pkg)
+
+    if not_pending:
+        print(f"[INFO] 有 {not_pending} 个 orderId 不在【待审核】中。")
     print(
         f"[INFO] 在待审核中找到 {len(package_ids)} 个包裹 (由工作簿转换而来)。"
     )
@@ -398,96 +897,168 @@ def poll_check_process(
     session: requests.Session,
     headers: dict,
     uuid: str,
-    max_tries: int = 20,
-    interval: int = 2,
+    timeout: float = 40.0,
+    min_interval: float = 0.5,
+    max_interval: float = 5.0,
+    backoff: float = 1.5,
+    stall_timeout: float = 60.0,
+    hard_timeout: float = 900.0,
 ) -> str:
-    """轮询 checkProcess.json，直到拿到下载链接。"""
+    """\
+    自适应轮询 checkProcess.json，直到拿到下载链接：
+      - 从 min_interval 开始，每次按 backoff 倍数退避，最长 max_interval
+      - 根据 num/totalNum 的进度估算剩余时间，预计快完成时提前再查
+      - 基础超时 timeout；只要进度还在前进，截止时间就会顺延
+        （距上次进度变化超过 stall_timeout 且已过截止时间才放弃，最长 hard_timeout）
+    """
     url = "https://www.dianxiaomi.com/checkProcess.json"
     payload = {"uuid": uuid}
 
-    for i in range(1, max_tries + 1):
-        print(f"[INFO] 第 {i}/{max_tries} 次检查导出进度...")
-        resp = session.post(url, data=payload, headers=headers)
-        print(f"[HTTP] checkProcess.json status = {resp.status_code}")
-        if resp.status_code != 200:
-            time.sleep(interval)
-            continue
+    start = time.monotonic()
+    deadline = start + timeout
+    interval = min_interval
+    last_num = None
+    last_progress_at = start
+    first_sample = None  # (t, num)：用于估算速度
+    tries = 0
+
+    while True:
+        tries += 1
+        now = time.monotonic()
+        elapsed = now - start
+        print(f"[INFO] 第 {tries} 次检查导出进度 (已等待 {elapsed:.1f}s)...")
 
+        eta = None
+        data = None
         try:
-            data = resp.json()
-        except Exception as e:
-            print("[WARN] checkProcess JSON 解析失败:", e)
-            time.sleep(interval)
-            continue
+            resp = session.post(url, data=payload, headers=headers, retry=True)
+        except requests.RequestException as e:
+            # 网络错误当作“本次没拿到进度”，继续按截止时间轮询
+            print("[WARN] checkProcess 请求失败:", e)
+            resp = None
+        if resp is not None:
+            print(f"[HTTP] checkProcess.json status = {resp.status_code}")
+        if resp is not None and resp.status_code == 200:
+            try:
+                data = resp.json()
+            except Exception as e:
+                print("[WARN] checkProcess JSON 解析失败:", e)
+
+        if data is not None:
+            print("[DEBUG] checkProcess 返回:", data)
+            process_msg = data.get("processMsg") or {}
+            code = process_msg.get("code")
+            msg = process_msg.get("msg")
+            total_num = process_msg.get("totalNum")
+            num = process_msg.get("num")
+            print(f"[INFO] code={code}, num={num}, totalNum={total_num}, msg={msg}")
+
+            if code == 1 and isinstance(msg, str) and msg.startswith("http"):
+                print(f"[OK] 导出完成，拿到下载链接。（用时 {time.monotonic() - start:.1f}s）")
+                metrics.record("checkProcess.wait", time.monotonic() - start, tries=tries)
+                return msg
+
+            try:
+                num_f = float(num)
+                total_f = float(total_num)
+            except (TypeError, ValueError):
+                num_f = total_f = None
+
+            if num_f is not None:
+                now = time.monotonic()
+                if first_sample is None:
+                    first_sample = (now, num_f)
+                if last_num is None or num_f > last_num:
+                    last_num = num_f
+                    last_progress_at = now
+                    # 进度在前进：截止时间至少顺延一个 stall_timeout
+                    deadline = max(deadline, now + stall_timeout)
+
+                t0, n0 = first_sample
+                if total_f and num_f > n0 and now > t0:
+                    rate = (num_f - n0) / (now - t0)
+                    eta = max(0.0, (total_f - num_f) / rate)
+                    print(f"[INFO] 进度 {num_f:.0f}/{total_f:.0f}，预计剩余 {eta:.1f}s")
+                    deadline = max(deadline, now + eta * 1.5 + max_interval)
+
+        now = time.monotonic()
+        if now - start >= hard_timeout:
+            break
+        if now >= deadline and now - last_progress_at >= stall_timeout:
+            break
+        if now >= deadline and last_num is None:
+            break
 
-        print("[DEBUG] checkProcess 返回:", data)
-        process_msg = data.get("processMsg") or {}
-        code = process_msg.get("code")
-        msg = process_msg.get("msg")
-        total_num = process_msg.get("totalNum")
-        num = process_msg.get("num")
-        print(f"[INFO] code={code}, num={num}, totalNum={total_num}, msg={msg}")
+        sleep_s = interval if eta is None else max(min_interval, min(interval, eta))
+        sleep_s = min(sleep_s, max(0.0, start + hard_timeout - now))
+        pause(sleep_s)
+        metrics.record("checkProcess.sleep", sleep_s)
+        interval = min(max_interval, interval * backoff)
 
-        if code == 1 and isinstance(msg, str) and msg.startswith("http"):
-            print("[OK] 导出完成，拿到下载链接。")
-            return msg
+    raise RuntimeError(
+        f"checkProcess.json 检查 {tries} 次（{time.monotonic() - start:.0f}s）仍未拿到下载链接（超时或进度停滞）。"
+    )
 
-        time.sleep(interval)
 
-    raise RuntimeError("checkProcess.json 多次检查仍未拿到下载链接。")
+PICKLIST_META_COLS = ["仓库", "商品编码", "名称", "货架位"]
+PICKLIST_NOTE_COLS = ["拣货备注", "客服备注"]
+# 汇总只用到这些列，读取拣货单时其余列不解析
+PICKLIST_COLS = ["SKU", "数量", *PICKLIST_META_COLS, *PICKLIST_NOTE_COLS]
 
 
-def summarise_picklist_by_sku(xlsx_path: str) -> None:
+def summarise_picklist_df(df: pd.DataFrame) -> pd.DataFrame | None:
     """\
-    按 SKU 汇总拣货单：
+    按 SKU 汇总拣货单（内存中，一次 groupby）：
       - 同一 SKU 的数量求和
       - 其它信息（仓库 / 商品编码 / 名称 / 货架位 / 拣货备注 / 客服备注）
-        取该 SKU 的第一行作为代表
-      - 覆盖写回到原始文件 xlsx_path
+        取该 SKU 的第一条非空值
+    如果没有 SKU/数量 列，返回 None。
+    """
+    df = df.rename(columns=lambda c: str(c))
+    if "SKU" not in df.columns or "数量" not in df.columns:
+        return None
+
+    df = df.assign(
+        SKU=df["SKU"].astype(str).fillna("").str.strip(),
+        数量=pd.to_numeric(df["数量"], errors="coerce").fillna(0),
+    )
+
+    meta_cols = [c for c in PICKLIST_META_COLS + PICKLIST_NOTE_COLS if c in df.columns]
+    agg = {c: "first" for c in meta_cols}
+    agg["数量"] = "sum"
+    summary = df.groupby("SKU", sort=True, as_index=False).agg(agg)
+
+    out_cols = ["SKU"]
+    out_cols += [c for c in PICKLIST_META_COLS if c in summary.columns]
+    out_cols.append("数量")
+    out_cols += [c for c in PICKLIST_NOTE_COLS if c in summary.columns]
+    return summary[out_cols]
+
+
+def summarise_picklist_by_sku(xlsx_path: str) -> None:
+    """\
+    按 SKU 汇总已在磁盘上的拣货单，并覆盖写回 xlsx_path。
     如果文件中没有 SKU/数量 列，则什么都不做。
     """
     try:
-        df = pd.read_excel(xlsx_path)
+        df = read_excel(xlsx_path, usecols=PICKLIST_COLS)
     except Exception as e:
         print(f"[WARN] 无法读取 Excel 做汇总: {e}")
         return
 
-    cols = [str(c) for c in df.columns]
-    if "SKU" not in cols or "数量" not in cols:
+    summary = summarise_picklist_df(df)
+    if summary is None:
         print("[WARN] Excel 中没有 SKU / 数量 列，跳过汇总。")
         return
 
-    df["SKU"] = df["SKU"].astype(str).fillna("").str.strip()
-    df["数量"] = pd.to_numeric(df["数量"], errors="coerce").fillna(0)
-
-    qty_df = df.groupby("SKU", as_index=False)["数量"].sum()
-
-    prefer_cols = ["仓库", "商品编码", "名称", "货架位", "拣货备注", "客服备注"]
-    keep_cols = ["SKU"] + [c for c in prefer_cols if c in df.columns]
-
-    first_df = df.sort_values("SKU").drop_duplicates("SKU", keep="first")[keep_cols]
-
-    summary = first_df.merge(qty_df, on="SKU", how="left")
-
-    out_cols = ["SKU"]
-    for c in ["仓库", "商品编码", "名称", "货架位"]:
-        if c in summary.columns:
-            out_cols.append(c)
-    out_cols.append("数量")
-    for c in ["拣货备注", "客服备注"]:
-        if c in summary.columns:
-            out_cols.append(c)
-
-    summary = summary[out_cols]
-
-    summary.to_excel(xlsx_path, index=False)
+    write_excel(summary, xlsx_path, sidecar=True)
     print(f"[INFO] 已按 SKU 汇总并覆盖原拣货单: {xlsx_path}")
 
 
-def download_excel(session: requests.Session, url: str) -> str:
+def download_picklist(session: requests.Session, url: str) -> tuple[str, pd.DataFrame | None]:
     """\
-    下载 Excel 文件到 DOWNLOAD_DIR，返回本地路径。
-    下载完成后，自动按 SKU 做汇总，并覆盖原文件。
+    下载 DXM 导出的拣货单，在内存中解析并按 SKU 汇总，只写一次磁盘。
+    返回 (本地路径, 汇总后的 DataFrame)；无法解析/汇总时保存原始文件，DataFrame 为 None。
     """
     if not os.path.exists(DOWNLOAD_DIR):
         os.makedirs(DOWNLOAD_DIR, exist_ok=True)
@@ -504,21 +1075,185 @@ def download_excel(session: requests.Session, url: str) -> str:
         "Referer": "https://www.dianxiaomi.com/",
     }
 
-    with session.get(url, headers=dl_headers, stream=True) as r:
-        r.raise_for_status()
+    r = session.get(url, headers=dl_headers)
+    r.raise_for_status()
+    content = r.content
+
+    summary = None
+    try:
+        with metrics.timer("picklist.parse_summarise", bytes=len(content)):
+            summary = summarise_picklist_df(read_excel(io.BytesIO(content), usecols=PICKLIST_COLS))
+        if summary is None:
+            print("[WARN] Excel 中没有 SKU / 数量 列，跳过汇总。")
+    except Exception as e:
+        print(f"[WARN] 汇总拣货单时出错（保留原文件）: {e}")
+
+    if summary is not None:
+        with metrics.timer("picklist.write", rows=len(summary)):
+            write_excel(summary, local_path, sidecar=True)
+        print(f"[OK] 已下载并按 SKU 汇总拣货单: {local_path}")
+    else:
         with open(local_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+            f.write(content)
+        print("[OK] Excel 文件已下载:", local_path)
+
+    return local_path, summary
+
+
+def download_excel(session: requests.Session, url: str) -> str:
+    """\
+    下载 Excel 文件到 DOWNLOAD_DIR，返回本地路径。
+    下载内容在内存中按 SKU 汇总后只写一次文件。
+    """
+    return download_picklist(session, url)[0]
+
+
+# ================== Export pipeline ==================
+
+
+class PartialExportError(RuntimeError):
+    """部分导出批次失败；成功批次已写入导出台账，picklists 为这些批次的拣货单。"""
+
+    def __init__(self, msg: str, picklists: list[tuple[str, pd.DataFrame | None]]):
+        super().__init__(msg)
+        self.picklists = picklists
+
+
+def export_chunks_pipelined(
+    session: requests.Session,
+    headers: dict,
+    package_ids: List[str],
+) -> tuple[list[dict], list[str]]:
+    """\
+    流水线导出：
+      1) 先为所有批次提交 exportPickData 任务（DXM 服务端并行生成）
+      2) 再并发轮询 checkProcess，哪个批次先完成就先下载哪个
+    总耗时约等于最慢的单个任务，而不是各批次之和。
+    返回 (results, errors)：
+      - results 为成功批次（按批次顺序）的 {"path", "df", "uuid", "package_ids"}（df 为汇总后的拣货单，可能为 None）
+      - errors 为失败批次的说明；调用方先把成功批次记入台账，再报告失败
+    """
+    chunks = list(chunk_list(package_ids, MAX_ORDERS))
+
+    # exportPickData 不是幂等请求：某批提交失败时继续提交其它批次，已提交的任务照常下载
+    submitted: list[tuple[int, str, list[str]]] = []
+    errors: list[str] = []
+    for idx, chunk in enumerate(chunks, start=1):
+        print(f"\n--- 提交导出批次 {idx}/{len(chunks)}, 数量 {len(chunk)} ---")
+        try:
+            submitted.append((idx, call_export_pick_data(session, headers, chunk, is_all=0), chunk))
+        except Exception as e:
+            print(f"[ERROR] 导出批次 {idx} 提交失败: {e}")
+            errors.append(f"批次 {idx}: {e}")
+
+    def _finish(uuid: str, chunk: list[str], s: requests.Session | None = None) -> dict:
+        s = s or _worker_session()
+        url = poll_check_process(s, headers, uuid)
+        path, df = download_picklist(s, url)
+        return {"path": path, "df": df, "uuid": uuid, "package_ids": chunk}
+
+    results: list[dict] = []
+    if len(submitted) == 1:
+        idx, uuid, chunk = submitted[0]
+        try:
+            results.append(_finish(uuid, chunk, session))
+        except Exception as e:
+            errors.append(f"批次 {idx}: {e}")
+        return results, errors
 
-    print("[OK] Excel 文件已下载:", local_path)
+    print(f"\n[INFO] 已提交 {len(submitted)} 个导出任务，开始并发轮询/下载 (并发 {EXPORT_CONCURRENCY})...")
+    with ThreadPoolExecutor(max_workers=EXPORT_CONCURRENCY) as pool:
+        futures = [(idx, pool.submit(_finish, u, c)) for idx, u, c in submitted]
 
+    # 所有批次都结束后再汇总错误，已下载成功的批次照常返回
+    for idx, fut in futures:
+        try:
+            results.append(fut.result())
+        except Exception as e:
+            errors.append(f"批次 {idx}: {e}")
+    return results, errors
+
+
+def consolidate_picklists(
+    results: list[dict],
+) -> tuple[str, pd.DataFrame] | None:
+    """\
+    把同一次导出的多个批次拣货单合并为一个按 SKU 汇总的工作簿：
+      - 写到 DOWNLOAD_DIR/DXM_picklist_merged_<时间>.xlsx
+      - 各批次原始文件移到 CHUNKS_DIR
+    任一批次没有可用的汇总数据时不合并（返回 None，保留各批次文件）。
+    """
+    if any(r["df"] is None for r in results):
+        print("[WARN] 有批次拣货单无法解析，跳过合并，保留各批次文件。")
+        return None
+
+    merged = summarise_picklist_df(pd.concat([r["df"] for r in results], ignore_index=True))
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    merged_path = os.path.join(DOWNLOAD_DIR, f"DXM_picklist_merged_{ts}.xlsx")
+    write_excel(merged, merged_path, sidecar=True)
+    print(f"[OK] 已合并 {len(results)} 个批次拣货单（{len(merged)} 个 SKU）: {merged_path}")
+
+    os.makedirs(CHUNKS_DIR, exist_ok=True)
+    for r in results:
+        path = r["path"]
+        try:
+            dst = os.path.join(CHUNKS_DIR, os.path.basename(path))
+            if os.path.exists(dst):
+                base_n, ext_n = os.path.splitext(os.path.basename(path))
+                dst = os.path.join(CHUNKS_DIR, f"{base_n}_{ts}{ext_n}")
+            os.replace(path, dst)
+            move_sidecars(path, dst)
+            r["path"] = dst
+        except Exception as e:
+            print(f"[WARN] 移动批次文件失败（add_to_cart 可能会拾取它）: {path}: {e}")
+
+    return merged_path, merged
+
+
+# ================== Export ledger ==================
+
+
+def load_export_ledger() -> dict:
+    """读取导出台账（packageId -> {exported_at, uuid, file}），并清理超过保留天数的记录。"""
+    if not os.path.exists(EXPORT_LEDGER_PATH):
+        return {}
     try:
-        summarise_picklist_by_sku(local_path)
+        with open(EXPORT_LEDGER_PATH, "r", encoding="utf-8") as f:
+            ledger = json.load(f)
     except Exception as e:
-        print(f"[WARN] 汇总拣货单时出错（保留原文件）: {e}")
+        print("[WARN] 读取导出台账失败，将视为空台账:", e)
+        return {}
+
+    cutoff = time.time() - EXPORT_LEDGER_KEEP_DAYS * 86400
+    return {k: v for k, v in ledger.items() if float(v.get("exported_at_epoch", 0)) >= cutoff}
+
 
-    return local_path
+def save_export_ledger(ledger: dict) -> None:
+    tmp = EXPORT_LEDGER_PATH + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(ledger, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, EXPORT_LEDGER_PATH)
+    except Exception as e:
+        print("[WARN] 保存导出台账失败:", e)
+
+
+def record_exported(ledger: dict, package_ids: list[str], uuid: str, file_path: str) -> None:
+    now = time.time()
+    for pkg in package_ids:
+        ledger[str(pkg)] = {
+            "exported_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+            "exported_at_epoch": now,
+            "uuid": uuid,
+            "file": file_path,
+        }
+
+
+def split_already_exported(package_ids: list[str], ledger: dict) -> tuple[list[str], list[str]]:
+    """返回 (未导出过的, 已导出过的)。"""
+    fresh = [p for p in package_ids if str(p) not in ledger]
+    done = [p for p in package_ids if str(p) in ledger]
+    return fresh, done
 
 
 # ================== 审核 batchAudit ==================
@@ -539,14 +1274,14 @@ def call_batch_audit(
     resp = session.post(url, data=payload, headers=headers)
     print(f"[HTTP] batchAudit.json status = {resp.status_code}")
     if resp.status_code != 200:
-        raise RuntimeError("batchAudit.json 调用失败")
+        raise RuntimeError(f"batchAudit.json 调用失败 (HTTP {resp.status_code})")
 
     try:
         data = resp.json()
     except Exception as e:
         print("[ERROR] 解析 batchAudit JSON 失败:", e)
         print(resp.text[:500])
-        return
+        return None
 
     print("[PARSED JSON]", data)
     code = data.get("code")
@@ -555,6 +1290,89 @@ def call_batch_audit(
         print("[OK] 批量审核成功, msg =", msg)
     else:
         print("[WARN] 批量审核返回异常, code =", code, "msg =", msg)
+    return data
+
+
+def run_audit_chunks(
+    session: requests.Session,
+    headers: dict,
+    package_ids: List[str],
+) -> list[dict]:
+    """\
+    按 MAX_ORDERS 分批并发调用 batchAudit.json（最多 AUDIT_CONCURRENCY 批同时进行）。
+    返回每个包裹一条 {packageId, 批次, code, msg}；批次请求异常时 code 为 None、msg 为异常信息。
+    batchAudit 不是幂等请求，失败的批次不会自动重试。
+    """
+    chunks = list(chunk_list(package_ids, MAX_ORDERS))
+
+    def _audit(idx: int, chunk: list[str]) -> list[dict]:
+        print(f"\n--- 审核批次 {idx}/{len(chunks)}, 数量 {len(chunk)} ---")
+        try:
+            data = call_batch_audit(_worker_session(), headers, chunk)
+            code = data.get("code") if data else None
+            msg = data.get("msg") if data else "无法解析 batchAudit 响应"
+        except Exception as e:
+            print(f"[ERROR] 审核批次 {idx} 失败: {e}")
+            code, msg = None, str(e)
+        return [{"packageId": str(p), "批次": idx, "code": code, "msg": msg} for p in chunk]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(AUDIT_CONCURRENCY, len(chunks)))) as pool:
+        futures = [pool.submit(_audit, i, c) for i, c in enumerate(chunks, start=1)]
+    rows: list[dict] = []
+    for fut in futures:
+        rows.extend(fut.result())
+    return rows
+
+
+def verify_audit(
+    session: requests.Session,
+    headers: dict,
+    rows: list[dict],
+) -> bool:
+    """\
+    审核完成后用一次全量待审核同步（分页并发）核对结果，而不是逐包裹查询：
+    仍在【待审核】中的包裹即审核未生效。结果写入每行的 审核后状态 / 结果。
+    待审核列表不完整（任何一页失败）时不做判断，全部标记为 未校验，快照也不会被覆盖。
+    返回是否完成了校验。
+    """
+    try:
+        still_pending = {p["idStr"] for p in sync_pending_packages(session, headers, full=True)}
+    except ListPageError as e:
+        print("[WARN] 审核结果校验失败（待审核列表不完整）:", e)
+        still_pending = None
+    except Exception as e:
+        print("[WARN] 审核结果校验失败（无法获取待审核列表）:", e)
+        still_pending = None
+
+    for r in rows:
+        if still_pending is None:
+            r["审核后状态"] = "未校验"
+            r["结果"] = "OK" if r["code"] == 0 else "FAILED"
+        elif r["packageId"] in still_pending:
+            r["审核后状态"] = "仍在待审核"
+            r["结果"] = "FAILED"
+        else:
+            r["审核后状态"] = "已离开待审核"
+            r["结果"] = "OK"
+    return still_pending is not None
+
+
+def write_audit_report(rows: list[dict]) -> str | None:
+    if not rows:
+        return None
+    os.makedirs(AUDIT_REPORT_DIR, exist_ok=True)
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(AUDIT_REPORT_DIR, f"DXM_audit_report_{ts}.xlsx")
+
+    ledger = load_export_ledger()
+    df = pd.DataFrame(rows)
+    df["导出文件"] = df["packageId"].map(lambda p: os.path.basename(ledger.get(p, {}).get("file", "")))
+    try:
+        write_excel(df, path)
+    except Exception as e:
+        print("[WARN] 写入审核报告失败:", e)
+        return None
+    return path
 
 
 # ================== PUBLIC API (for pipeline) ==================
@@ -563,20 +1381,42 @@ def call_batch_audit(
 def export_from_dxm(
     mode: int = 1,
     workbook_path: str | None = None,
+    reinclude_exported: bool | None = None,
 ) -> tuple[list[str], list[str]]:
     """\
     供外部调用的主函数:
       mode=1: 导出所有【待审核】订单
       mode=2: 从订单工作簿读取 orderId，再导出对应【待审核】订单
 
+    已在导出台账中的包裹默认不再导出（避免重复拣货单 / 重复加购），
+    reinclude_exported=True（或 REEXPORT_EXPORTED=True）时全部重新导出。
+
     返回:
       (downloaded_files, package_ids)
+      package_ids 为全部待审核包裹（含已导出过的），供后续审核使用。
     """
+    picklists, package_ids = export_picklists_from_dxm(mode, workbook_path, reinclude_exported)
+    return [path for path, _ in picklists], package_ids
+
+
+def export_picklists_from_dxm(
+    mode: int = 1,
+    workbook_path: str | None = None,
+    reinclude_exported: bool | None = None,
+) -> tuple[list[tuple[str, pd.DataFrame | None]], list[str]]:
+    """\
+    同 export_from_dxm，但同时返回内存中的汇总拣货单，供 pipeline.py 直接交给加购步骤：
+      ([(拣货单路径, 汇总 DataFrame 或 None), ...], package_ids)
+    """
+    if reinclude_exported is None:
+        reinclude_exported = REEXPORT_EXPORTED
+
     session, headers = make_session()
 
     if mode == 1:
         print("=== MODE 1: 导出所有【待审核】订单 ===")
-        rows = get_all_pending_packages(session, headers)
+        with metrics.timer("dxm.sync_pending"):
+            rows = sync_pending_packages(session, headers)
 
         package_ids: list[str] = []
         seen = set()
@@ -590,6 +1430,14 @@ def export_from_dxm(
             print("[INFO] 当前没有任何订单在【待审核】，无需导出。")
             return [], []
 
+        if CHECK_MAPPING_COVERAGE:
+            try:
+                missing = check_mapping_coverage(rows)
+                if QUEUE_UNMAPPED_FOR_SCRAPE:
+                    queue_unmapped_for_scrape(missing)
+            except Exception as e:
+                print(f"[WARN] 映射覆盖检查失败（不影响导出）: {e}")
+
     elif mode == 2:
         print("=== MODE 2: 从订单工作簿导出【待审核】订单 ===")
         if workbook_path is None:
@@ -612,47 +1460,106 @@ def export_from_dxm(
 
     print(f"[INFO] 此次需要处理 {len(package_ids)} 个包裹。")
 
-    downloaded_files: list[str] = []
-    if DO_EXPORT:
-        for idx, chunk in enumerate(
-            chunk_list(package_ids, MAX_ORDERS), start=1
-        ):
-            print(f"\n--- 导出批次 {idx}, 数量 {len(chunk)} ---")
-            uuid = call_export_pick_data(session, headers, chunk, is_all=0)
-            url = poll_check_process(session, headers, uuid)
-            path = download_excel(session, url)
-            downloaded_files.append(path)
+    ledger = load_export_ledger()
+    to_export = package_ids
+    if not reinclude_exported:
+        to_export, already = split_already_exported(package_ids, ledger)
+        if already:
+            print(f"[INFO] 其中 {len(already)} 个包裹已在之前的运行中导出过（见导出台账），本次跳过导出。")
+
+    picklists: list[tuple[str, pd.DataFrame | None]] = []
+    if DO_EXPORT and not to_export:
+        print("[INFO] 没有需要新导出的包裹。")
+    elif DO_EXPORT:
+        with metrics.timer("dxm.export", packages=len(to_export)):
+            results, errors = export_chunks_pipelined(session, headers, to_export)
+        merged = None
+        if CONSOLIDATE_CHUNKS and len(results) > 1:
+            merged = consolidate_picklists(results)
+        if merged is not None:
+            picklists = [merged]
+        else:
+            picklists = [(r["path"], r["df"]) for r in results]
+
+        for r in results:
+            record_exported(ledger, r["package_ids"], r["uuid"], merged[0] if merged else r["path"])
+        save_export_ledger(ledger)
+        prune_order_index_cache([p for r in results for p in r["package_ids"]])
+
+        if errors:
+            # 成功批次已记入台账（下次不会重复导出），它们的拣货单需要单独加购
+            saved = "; ".join(path for path, _ in picklists) or "无"
+            raise PartialExportError(
+                "部分导出批次失败: " + "; ".join(errors) + f"。已成功导出并记入台账的拣货单: {saved}",
+                picklists,
+            )
     else:
         print("[INFO] DO_EXPORT = False，跳过导出。")
 
-    return downloaded_files, package_ids
+    return picklists, package_ids
 
 
-def audit_packages(package_ids: list[str]) -> None:
+def audit_packages(package_ids: list[str]) -> list[dict]:
     """\
     供外部调用的审核函数:
-      - 按 MAX_ORDERS 分批调用 batchAudit.json
+      - 按 MAX_ORDERS 分批并发调用 batchAudit.json
+      - VERIFY_AUDIT=True 时用一次全量待审核同步核对每个包裹是否已离开【待审核】
+      - 输出逐包裹审核报告到 AUDIT_REPORT_DIR
+
+    返回逐包裹结果列表（packageId / 批次 / code / msg / 审核后状态 / 结果）。
     """
     if not package_ids:
         print("[INFO] audit_packages: package_ids 为空，跳过审核。")
-        return
+        return []
 
     session, headers = make_session()
-    for idx, chunk in enumerate(
-        chunk_list(package_ids, MAX_ORDERS), start=1
-    ):
-        print(f"\n--- 审核批次 {idx}, 数量 {len(chunk)} ---")
-        call_batch_audit(session, headers, chunk)
+    t0 = time.monotonic()
+    with metrics.timer("dxm.audit", packages=len(package_ids)):
+        rows = run_audit_chunks(session, headers, package_ids)
+    print(f"\n[INFO] batchAudit 全部批次完成，用时 {time.monotonic() - t0:.1f}s")
+
+    if VERIFY_AUDIT:
+        print("[INFO] 校验审核结果（重新同步待审核列表）...")
+        # 校验成功时同步已重建快照；校验失败时快照未更新，改为单独移除已审核包裹
+        with metrics.timer("dxm.verify_audit"):
+            verified = verify_audit(session, headers, rows)
+        if not verified:
+            remove_from_pending_snapshot([r["packageId"] for r in rows if r["code"] == 0])
+    else:
+        for r in rows:
+            r["审核后状态"] = "未校验"
+            r["结果"] = "OK" if r["code"] == 0 else "FAILED"
+        remove_from_pending_snapshot([r["packageId"] for r in rows if r["code"] == 0])
+    prune_order_index_cache([r["packageId"] for r in rows if r["code"] == 0])
+
+    ok = sum(1 for r in rows if r["结果"] == "OK")
+    failed = len(rows) - ok
+    print(f"[INFO] 审核结果: 成功 {ok} / 失败 {failed}（共 {len(rows)} 个包裹）")
+    if failed:
+        print("[WARN] 部分包裹审核未生效，请查看审核报告。")
+
+    report = write_audit_report(rows)
+    if report:
+        print(f"[INFO] 审核报告: {report}")
+    return rows
 
 
 # ================== CLI FLOWS ==================
 
 
-def export_and_maybe_audit(mode: int, workbook_path: str | None = None):
+def export_and_maybe_audit(
+    mode: int,
+    workbook_path: str | None = None,
+    reinclude_exported: bool | None = None,
+    do_audit: bool | None = None,
+) -> list[tuple[str, pd.DataFrame | None]]:
     """    CLI 主流程：
       - mode=1: 导出所有【待审核】订单，然后按配置决定是否审核
       - mode=2: 使用 ORDER_IDS_DIR 中最新工作簿（或指定 workbook_path）导出，然后按配置决定是否审核
               当 Mode 2 成功处理完该工作簿后，会自动删除该工作簿，避免重复处理。
+      - reinclude_exported=True: 已导出过（导出台账中）的包裹也重新导出
+      - do_audit: 是否审核（None = 按 DO_AUDIT 配置；DRY_RUN 时总是不审核）
+    返回本次新导出的 [(拣货单路径, 汇总 DataFrame 或 None), ...]（pipeline.py 用它直接加购）。
     """
     wb_to_delete: str | None = None
     if mode == 2:
@@ -662,14 +1569,16 @@ def export_and_maybe_audit(mode: int, workbook_path: str | None = None):
 
     success = False
     try:
-        downloaded_files, package_ids = export_from_dxm(mode, workbook_path=workbook_path)
+        picklists, package_ids = export_picklists_from_dxm(
+            mode, workbook_path=workbook_path, reinclude_exported=reinclude_exported
+        )
 
         if not package_ids:
             print("[INFO] 没有需要审核的包裹。")
             success = True
-            return
+            return picklists
 
-        effective_do_audit = (not DRY_RUN) and DO_AUDIT
+        effective_do_audit = (not DRY_RUN) and (DO_AUDIT if do_audit is None else do_audit)
         if DRY_RUN:
             print("[INFO] DRY_RUN = True，本次不会调用审核。")
 
@@ -679,14 +1588,15 @@ def export_and_maybe_audit(mode: int, workbook_path: str | None = None):
             print("[INFO] 本次不执行审核。")
 
         success = True
+        return picklists
     finally:
         if mode == 2 and wb_to_delete and success:
             delete_processed_order_ids_workbook(wb_to_delete)
 
 
-def run_mode1_all_pending():
+def run_mode1_all_pending(reinclude_exported: bool | None = None):
 
-    export_and_maybe_audit(mode=1)
+    export_and_maybe_audit(mode=1, reinclude_exported=reinclude_exported)
 
 
 def run_mode2_from_workbook():
@@ -708,16 +1618,23 @@ def main():
     print()
     print("1. 导出 + (可选)审核 所有【待审核】订单  (Mode 1)")
     print("2. 从订单工作簿导出 + (可选)审核          (Mode 2)")
-    print("3. 取消")
-    choice = input("请选择 (1/2/3): ").strip()
+    print("3. 仅检查【待审核】订单的映射覆盖（不导出）")
+    print("4. 同 Mode 1，但已导出过的包裹也重新导出")
+    print("5. 取消")
+    choice = input("请选择 (1/2/3/4/5): ").strip()
 
     if choice == "1":
         run_mode1_all_pending()
     elif choice == "2":
         run_mode2_from_workbook()
+    elif choice == "3":
+        run_coverage_check_only()
+    elif choice == "4":
+        run_mode1_all_pending(reinclude_exported=True)
     else:
         print("已取消。")
 
 
 if __name__ == "__main__":
+    metrics.start_run_from_argv("dxm_export")
     main()
@@ -1,10 +1,16 @@
 import os
 import sys
+import json
+import time
 import pandas as pd
 import math
+from concurrent.futures import ProcessPoolExecutor
 from openpyxl import load_workbook
 from openpyxl.worksheet.views import Selection
 
+import metrics
+from excel_io import read_excel, write_excel
+from mapping_service import notify_reload
 from config import (
     SCRAPE_FOLDER as CFG_SCRAPE_FOLDER,
     MAPPING_PATH as CFG_MAPPING_PATH,
@@ -26,6 +32,12 @@ SKU_ID_COL = "SKU ID"
 SPEC_ID_COL = "Spec ID"
 SHOP_COL = "店铺名称"
 
+# 已处理 (done) 工作簿台账：批量模式据此跳过已合并过的文件
+LEDGER_PATH = os.path.join(SCRAPE_FOLDER, "processed_done_workbooks.json")
+
+# 批量模式并行读取工作簿的最大进程数
+MAX_WORKERS = 4
+
 # 如果有警告或错误，则在退出前停一下
 NEED_PAUSE = False
 
@@ -54,6 +66,91 @@ def find_latest_done_workbook(folder: str) -> str:
     return candidates[0][1]
 
 
+def load_processed_ledger(path: str) -> dict:
+    """读取已处理台账（文件名 -> {mtime, size, processed_at, rows}）。文件不存在或损坏则返回空台账。"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        print("[WARN] 读取已处理台账失败，将视为空台账:", e)
+        return {}
+
+
+def save_processed_ledger(path: str, ledger: dict) -> None:
+    """先写临时文件再替换，避免中途中断留下半个 JSON。"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(ledger, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def record_processed(ledger: dict, path: str, rows: int) -> None:
+    """把工作簿当前的 mtime/size 记入台账（须在写回 (done) 文件之后调用）。"""
+    st = os.stat(path)
+    ledger[os.path.basename(path)] = {
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+        "processed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "rows": int(rows),
+    }
+
+
+def _done_workbooks(folder: str) -> list[str]:
+    out = []
+    for fname in os.listdir(folder):
+        if fname.startswith("~$") or not fname.lower().endswith(".xlsx"):
+            continue
+        if os.path.splitext(fname)[0].endswith("(done)"):
+            out.append(os.path.join(folder, fname))
+    return out
+
+
+def load_or_seed_ledger(path: str, folder: str, mapping_path: str) -> dict:
+    """\
+    读取已处理台账；台账文件还不存在（第一次用批量模式）时先建台账：
+    修改时间不晚于 Mapping_Data 的 (done) 工作簿视为以前已经合并过，直接记入台账，
+    避免第一次 --all 把所有历史工作簿重新写回并重复合并。
+    """
+    if os.path.exists(path):
+        return load_processed_ledger(path)
+
+    ledger: dict = {}
+    cutoff = os.path.getmtime(mapping_path) if os.path.exists(mapping_path) else 0
+    for full in _done_workbooks(folder):
+        if os.path.getmtime(full) <= cutoff:
+            record_processed(ledger, full, 0)
+    try:
+        save_processed_ledger(path, ledger)
+    except Exception as e:
+        print("[WARN] 保存已处理台账失败:", e)
+    print(f"[INFO] 首次建立已处理台账: {len(ledger)} 个早于 Mapping_Data 的 (done) 工作簿视为已合并。")
+    return ledger
+
+
+def find_unprocessed_done_workbooks(folder: str, ledger: dict, since: float | None = None) -> list[str]:
+    """
+    返回 folder 中所有尚未合并的 (done).xlsx（按修改时间从旧到新）。
+    台账中没有记录、或记录后文件又被修改过（mtime/size 变化）的都视为未处理。
+    since（时间戳）：只考虑此后修改的工作簿。
+    """
+    candidates = []
+    for full in _done_workbooks(folder):
+        fname = os.path.basename(full)
+        st = os.stat(full)
+        if since is not None and st.st_mtime < since:
+            continue
+        entry = ledger.get(fname)
+        if entry and entry.get("mtime") == st.st_mtime and entry.get("size") == st.st_size:
+            continue
+        candidates.append((st.st_mtime, full))
+
+    candidates.sort(key=lambda x: x[0])
+    return [full for _, full in candidates]
+
+
 def is_empty(value) -> bool:
     if value is None:
         return True
@@ -133,7 +230,7 @@ def append_to_mapping(b_df: pd.DataFrame, mapping_path: str) -> pd.DataFrame:
     if not os.path.exists(mapping_path):
         raise FileNotFoundError(f"未找到 Mapping_Data.xlsx：{mapping_path}")
 
-    map_df = pd.read_excel(mapping_path)
+    map_df = read_excel(mapping_path)
 
     if CODE_COL not in b_df.columns:
         raise KeyError(f"B(done) 缺少列: {CODE_COL}")
@@ -196,6 +293,17 @@ def append_to_mapping(b_df: pd.DataFrame, mapping_path: str) -> pd.DataFrame:
     return map_df
 
 
+def load_and_fill_done_workbook(path: str) -> pd.DataFrame:
+    """
+    批量模式的工作进程：读取单个 (done) 工作簿，填充 商品選項貨號 并写回原文件。
+    在独立进程中执行，多个工作簿的 xlsx 解析可以并行。
+    """
+    df = read_excel(path)
+    df = fill_code_column(df)
+    write_excel(df, path, sidecar=True)
+    return df
+
+
 def set_mapping_view_to_last_rows(path: str):
     """
     用 openpyxl 把 Mapping_Data.xlsx 的视图移动到最后几行，
@@ -229,6 +337,137 @@ def set_mapping_view_to_last_rows(path: str):
         print("[WARN] 设置 Mapping_Data 视图位置失败:", e)
 
 
+def fill_done_workbooks(paths: list[str]) -> tuple[list[pd.DataFrame], list[str]]:
+    """
+    并行读取 + 填充 商品選項貨號 + 写回各 (done) 工作簿。
+    返回 (成功的 DataFrame 列表, 对应路径)；失败的工作簿跳过并提示。
+    """
+    global NEED_PAUSE
+
+    frames: list[pd.DataFrame] = []
+    done_paths: list[str] = []
+    workers = max(1, min(MAX_WORKERS, len(paths), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(zip(paths, pool.map(_safe_load_and_fill, paths)))
+
+    for path, (df, err) in results:
+        if err is not None:
+            print(f"[ERROR] 处理 {os.path.basename(path)} 失败（本次跳过，不记入台账）: {err}")
+            NEED_PAUSE = True
+            continue
+        frames.append(df)
+        done_paths.append(path)
+    return frames, done_paths
+
+
+def merge_done_workbooks(
+    frames: list[pd.DataFrame],
+    done_paths: list[str],
+    open_mapping: bool = True,
+) -> bool:
+    """
+    把已填充的 (done) 工作簿合并后一次性追加到 Mapping_Data.xlsx，并记入已处理台账。
+    返回 Mapping_Data 是否写入成功。
+    """
+    global NEED_PAUSE
+
+    # 合并后一次性追加（同一 商品選項貨號 以较早的工作簿为准，与“不覆盖旧数据”一致）
+    b_df = pd.concat(frames, ignore_index=True)
+    if CODE_COL in b_df.columns:
+        codes = b_df[CODE_COL]
+        has_code = codes.apply(lambda v: not is_empty(v))
+        dup = has_code & codes.astype(str).str.strip().duplicated(keep="first")
+        b_df = b_df[~dup].reset_index(drop=True)
+
+    try:
+        map_df = append_to_mapping(b_df, MAPPING_PATH)
+    except Exception as e:
+        print("[ERROR] 处理 Mapping_Data 时出错:", e)
+        NEED_PAUSE = True
+        return False
+
+    try:
+        write_excel(map_df, MAPPING_PATH)
+        set_mapping_view_to_last_rows(MAPPING_PATH)
+        print(f"[INFO] 已更新 Mapping_Data.xlsx: {MAPPING_PATH}")
+        if notify_reload():
+            print("[INFO] 已通知本地 Mapping 服务重新加载。")
+    except Exception as e:
+        print("[ERROR] 保存 Mapping_Data.xlsx 失败:", e)
+        NEED_PAUSE = True
+        return False
+
+    # Mapping 写入成功后才记入台账
+    ledger = load_processed_ledger(LEDGER_PATH)
+    for path, df in zip(done_paths, frames):
+        record_processed(ledger, path, len(df))
+    try:
+        save_processed_ledger(LEDGER_PATH, ledger)
+        print(f"[INFO] 已记录 {len(done_paths)} 个工作簿到台账。")
+    except Exception as e:
+        print("[WARN] 保存已处理台账失败:", e)
+        NEED_PAUSE = True
+
+    if open_mapping:
+        try:
+            os.startfile(MAPPING_PATH)
+        except Exception as e:
+            print("[WARN] 无法自动打开 Mapping_Data:", e)
+            NEED_PAUSE = True
+    return True
+
+
+def run_batch(since: float | None = None):
+    """
+    批量模式：一次处理 SCRAPE_FOLDER 中所有未处理的 (done) 工作簿。
+      - 第一次运行时先建台账（早于 Mapping_Data 的工作簿视为已合并）
+      - since（时间戳）：只处理此后修改的工作簿
+      - 并行读取并填充各工作簿
+      - 合并后只读写一次 Mapping_Data.xlsx
+      - 成功后把这些工作簿记入已处理台账
+    """
+    global NEED_PAUSE
+
+    print("====================================================")
+    print("  批量模式：合并所有未处理的 (done).xlsx 到 Mapping_Data.xlsx")
+    print("====================================================")
+    print("工作目录:", SCRAPE_FOLDER)
+    print("Mapping:", MAPPING_PATH)
+    print("台账:", LEDGER_PATH)
+
+    ledger = load_or_seed_ledger(LEDGER_PATH, SCRAPE_FOLDER, MAPPING_PATH)
+    paths = find_unprocessed_done_workbooks(SCRAPE_FOLDER, ledger, since=since)
+    if not paths:
+        print("[INFO] 没有未处理的 (done) 工作簿。")
+        return
+
+    print(f"[INFO] 待处理 (done) 工作簿 {len(paths)} 个:")
+    for p in paths:
+        print("   ", os.path.basename(p))
+
+    # 1) 并行读取 + 填充 + 写回
+    with metrics.timer("mapping.fill", workbooks=len(paths)):
+        frames, done_paths = fill_done_workbooks(paths)
+    if not frames:
+        print("[WARN] 没有成功读取的工作簿。")
+        NEED_PAUSE = True
+        return
+
+    # 2) 合并后一次性追加，成功后记入台账
+    with metrics.timer("mapping.merge", workbooks=len(done_paths)):
+        merged = merge_done_workbooks(frames, done_paths)
+    if merged:
+        print("全部处理完成。")
+
+
+def _safe_load_and_fill(path: str):
+    """ProcessPoolExecutor 用：把异常转成返回值，避免一个坏文件中断整批。"""
+    try:
+        return load_and_fill_done_workbook(path), None
+    except Exception as e:
+        return None, str(e)
+
+
 def main():
     global NEED_PAUSE
 
@@ -249,7 +488,7 @@ def main():
 
     # 1) 读取 B(done).xlsx 并填充 商品選項貨號
     try:
-        b_df = pd.read_excel(b_path)
+        b_df = read_excel(b_path)
     except Exception as e:
         print("[ERROR] 读取 B(done).xlsx 失败:", e)
         NEED_PAUSE = True
@@ -263,7 +502,7 @@ def main():
         return
 
     try:
-        b_df.to_excel(b_path, index=False)
+        write_excel(b_df, b_path, sidecar=True)
         print(f"[INFO] 已写回更新后的 B(done) 文件: {b_path}")
     except Exception as e:
         print("[ERROR] 保存 B(done).xlsx 失败:", e)
@@ -280,14 +519,24 @@ def main():
 
     # 保存 Mapping_Data，并把视图定位到最后几行
     try:
-        map_df.to_excel(MAPPING_PATH, index=False)
+        write_excel(map_df, MAPPING_PATH)
         set_mapping_view_to_last_rows(MAPPING_PATH)
         print(f"[INFO] 已更新 Mapping_Data.xlsx: {MAPPING_PATH}")
+        if notify_reload():
+            print("[INFO] 已通知本地 Mapping 服务重新加载。")
     except Exception as e:
         print("[ERROR] 保存 Mapping_Data.xlsx 失败:", e)
         NEED_PAUSE = True
         return
 
+    # 记入台账，批量模式不再重复合并该工作簿
+    try:
+        ledger = load_processed_ledger(LEDGER_PATH)
+        record_processed(ledger, b_path, len(b_df))
+        save_processed_ledger(LEDGER_PATH, ledger)
+    except Exception as e:
+        print("[WARN] 保存已处理台账失败:", e)
+
     # 3) 打开两个文件
     try:
         os.startfile(b_path)
@@ -309,4 +558,16 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    metrics.start_run_from_argv("update_mapping")
+    # --all / --batch：合并所有未处理的 (done) 工作簿；默认只处理最新的一个
+    # --since YYYY-MM-DD：批量模式只处理该日期之后修改的工作簿
+    args = sys.argv[1:]
+    if any(a.lower() in ("--all", "--batch") for a in args):
+        since = None
+        if "--since" in args and args.index("--since") + 1 < len(args):
+            since = time.mktime(time.strptime(args[args.index("--since") + 1], "%Y-%m-%d"))
+        run_batch(since=since)
+        if NEED_PAUSE:
+            input("存在警告或错误，请查看上方信息后按回车键退出...")
+    else:
+        main()
@@ -3,15 +3,17 @@ import re
 import time
 import json
 import random
-import msvcrt
 
 import pandas as pd
 import requests
 
+import metrics
+from excel_io import move_sidecars, read_excel, write_excel
+from http_client import load_cookie as load_shared_cookie, make_session, pause
+from mapping_service import lookup_skus
 from config import (
     PICKLIST_FOLDER,
     MAPPING_PATH as CFG_MAPPING_PATH,
-    ALI_COOKIE_PATH,
     USER_AGENT,
     ENABLE_ADD_TO_CART,
     TIMEOUT,
@@ -36,48 +38,29 @@ FINISHED_DIR = os.path.join(BASE_DIR, "Finished_added_to_cart")
 # 1) 环境变量 ALI_COOKIE
 # 2) 脚本同目录下 ali_cookie.txt
 # 3) BASE_DIR 下的 ali_cookie.txt
-# 4) 下面的 COOKIE 常量（不推荐明文写在脚本里）
+# 4) config.py 的 ALI_COOKIE_PATH
+# 5) 下面的 COOKIE 常量（不推荐明文写在脚本里）
 COOKIE = ""  # 可选：在这里直接粘贴 1688 Cookie（不推荐）
 
-_COOKIE_CACHE = None
-
 
 def human_delay(min_s: float = 0.1, max_s: float = 0.3) -> None:
     """在加购请求之间增加一个随机延迟，避免太“机器人”。"""
-    time.sleep(random.uniform(min_s, max_s))
+    pause(random.uniform(min_s, max_s))
 
 
 def get_cookie() -> str:
-    """获取 1688 Cookie。"""
-    global _COOKIE_CACHE
-    if _COOKIE_CACHE is not None:
-        return _COOKIE_CACHE
-
-    # 1) 环境变量
-    env_v = os.environ.get("ALI_COOKIE", "").strip()
-    if env_v:
-        _COOKIE_CACHE = env_v
-        return _COOKIE_CACHE
-
-    # 2) 文件 ali_cookie.txt
+    """获取 1688 Cookie（环境变量 / 文件由 http_client 读取并缓存，每个进程只读一次）。"""
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    candidates = [
+    ck = load_shared_cookie("ali", extra_paths=[
         os.path.join(script_dir, "ali_cookie.txt"),
         os.path.join(BASE_DIR, "ali_cookie.txt"),
-        ALI_COOKIE_PATH,
-    ]
-    for p in candidates:
-        if p and os.path.exists(p):
-            with open(p, "r", encoding="utf-8") as f:
-                txt = f.read().strip()
-            if txt:
-                _COOKIE_CACHE = txt
-                return _COOKIE_CACHE
-
-    # 3) 常量 COOKIE
+    ])
+    if ck:
+        return ck
+
+    # 常量 COOKIE
     if COOKIE and not COOKIE.strip().startswith("PUT_"):
-        _COOKIE_CACHE = COOKIE.strip()
-        return _COOKIE_CACHE
+        return COOKIE.strip()
 
     raise SystemExit(
         "请先配置 1688 Cookie："
@@ -173,6 +156,28 @@ def parse_quantity(v) -> int:
     return q
 
 
+def as_text_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """把内存中的 DataFrame 转成与 read_excel(dtype=str) 相同的形态（空值保持 NaN，整数不带 .0）。"""
+    def _text(v):
+        if pd.isna(v):
+            return v
+        if isinstance(v, float) and v.is_integer():
+            return str(int(v))
+        return str(v)
+
+    return df.apply(lambda col: col.map(_text)).astype(object)
+
+
+def clean_cell(v) -> str:
+    """把单元格值转成去空白字符串；None / NaN / 'nan' 视为空。"""
+    if v is None:
+        return ""
+    s = str(v).strip()
+    if s.lower() in ("nan", "none"):
+        return ""
+    return s
+
+
 def extract_offer_id(url: str) -> str:
     """从商品链接中提取 offerId / cargoIdentity"""
     if not url:
@@ -260,17 +265,45 @@ def warmup_purchase_render(session: requests.Session) -> None:
 # 映射逻辑（DXM 导出 → Mapping_Data → 1688 所需字段）
 # =============================================================================
 
+# 主供应商字段
+PRIMARY_FIELDS = ["商品链接", "商品ID", "属性SKU", "SKU ID", "Spec ID", "主供应商"]
+
+# 副供应商字段（Mapping_Data 中 .1 后缀的列）：主供应商加购失败时自动改用
+SECONDARY_FIELDS = ["商品链接.1", "商品ID.1", "属性SKU.1", "SKU ID.1", "Spec ID.1", "副供应商"]
+
+# Mapping_Data 主键列的几种写法
+MAPPING_KEY_COLS = ["商品選項貨號", "商品选項貨號", "商品选项货号"]
+# 加购只用到这些列，读取 Mapping_Data 时其余列不解析
+MAPPING_USECOLS = MAPPING_KEY_COLS + PRIMARY_FIELDS + SECONDARY_FIELDS
+
 def load_mapping_dataframe(path: str) -> pd.DataFrame:
     """读取 Mapping_Data.xlsx，并归一化主键列为 'SKU'"""
     if not os.path.exists(path):
         raise SystemExit(f"[FATAL] 找不到 Mapping_Data 文件: {path}")
 
     print(f"[INFO] 正在加载 Mapping_Data: {path}")
-    mdf = pd.read_excel(path, dtype=str)
+    mdf = read_excel(path, usecols=MAPPING_USECOLS, dtype=str)
+    return normalize_mapping_dataframe(mdf)
+
+
+def load_mapping_for_skus(skus: list) -> pd.DataFrame:
+    """优先从本地 Mapping 服务（mapping_service.py）批量查询，服务未启动时回退到读取 xlsx。"""
+    found = lookup_skus(skus)
+    if found is None:
+        return load_mapping_dataframe(MAPPING_PATH)
+
+    print(f"[INFO] 已从本地 Mapping 服务查询 {len(skus)} 个 SKU，命中 {len(found)} 个。")
+    mdf = pd.DataFrame(list(found.values()), dtype=str)
+    if mdf.empty:
+        mdf = pd.DataFrame(columns=["商品選項貨號"], dtype=str)
+    return normalize_mapping_dataframe(mdf)
 
+
+def normalize_mapping_dataframe(mdf: pd.DataFrame) -> pd.DataFrame:
+    """把 Mapping 行归一化为 'SKU' + 主/副供应商字段（全部为去空白字符串）。"""
     # 找到 商品選項貨號 列
     key_col = None
-    for cand in ["商品選項貨號", "商品选項貨號", "商品选项货号"]:
+    for cand in MAPPING_KEY_COLS:
         if cand in mdf.columns:
             key_col = cand
             break
@@ -279,7 +312,7 @@ def load_mapping_dataframe(path: str) -> pd.DataFrame:
 
     mdf.rename(columns={key_col: "SKU"}, inplace=True)
 
-    need_cols = ["SKU", "商品链接", "商品ID", "属性SKU", "SKU ID", "Spec ID", "主供应商"]
+    need_cols = ["SKU"] + PRIMARY_FIELDS + SECONDARY_FIELDS
     for col in need_cols:
         if col not in mdf.columns:
             mdf[col] = ""
@@ -307,8 +340,9 @@ def apply_mapping_if_needed(df: pd.DataFrame) -> pd.DataFrame:
 
     print("[INFO] 当前工作簿看起来是 Dianxiaomi 导出的原始拣货表，将根据 Mapping_Data 做映射。")
 
-    # 读取 Mapping_Data
-    mapping_df = load_mapping_dataframe(MAPPING_PATH)
+    # 读取 Mapping_Data（本地服务可用时只查询本表用到的 SKU）
+    skus = df["SKU"].astype(str).str.strip().unique().tolist()
+    mapping_df = load_mapping_for_skus(skus)
 
     # ==== 统一 SKU 大小写，避免大小写不一致导致无法映射 ====
     df["SKU"] = df["SKU"].astype(str).fillna("").str.strip().str.upper()
@@ -323,7 +357,7 @@ def apply_mapping_if_needed(df: pd.DataFrame) -> pd.DataFrame:
 
     merged = joined.copy()
 
-    for field in ["商品链接", "商品ID", "属性SKU", "SKU ID", "Spec ID", "主供应商"]:
+    for field in PRIMARY_FIELDS + SECONDARY_FIELDS:
         map_col = field + "_map"
         if map_col in merged.columns:
             merged[field] = merged[field].astype(str).fillna("")
@@ -351,7 +385,7 @@ def apply_mapping_if_needed(df: pd.DataFrame) -> pd.DataFrame:
             print("  [WARN] 无映射 SKU:", sku)
 
     # 确保映射字段存在且为字符串
-    for col in ["商品链接", "商品ID", "属性SKU", "SKU ID", "Spec ID", "主供应商"]:
+    for col in PRIMARY_FIELDS + SECONDARY_FIELDS:
         if col not in merged.columns:
             merged[col] = ""
         merged[col] = merged[col].astype(str).fillna("").str.strip()
@@ -359,7 +393,9 @@ def apply_mapping_if_needed(df: pd.DataFrame) -> pd.DataFrame:
     # 对未映射行做一个可见标记（后续解析 offerId 会失败，从而 FAILED）
     merged.loc[no_match_mask, "商品链接"] = "NO MAPPING SKU"
 
+    n_secondary = int((merged["商品链接.1"].map(clean_cell) != "").sum())
     print("[INFO] 已根据 Mapping_Data 完成字段填充：商品链接 / 商品ID / 属性SKU / SKU ID / Spec ID / 主供应商")
+    print(f"[INFO] 其中 {n_secondary} 行配置了副供应商，主供应商失败时将自动改用副供应商。")
     return merged
 
 
@@ -368,23 +404,101 @@ def apply_mapping_if_needed(df: pd.DataFrame) -> pd.DataFrame:
 # 主处理逻辑
 # =============================================================================
 
-def process_workbook(plan_path: str, purchase_type: str = ""):
+def add_to_cart_once(
+    session: requests.Session,
+    headers: dict,
+    link: str,
+    spec_id: str,
+    qty: int,
+    purchase_type: str = "",
+    label: str = "",
+) -> tuple[str, str]:
+    """对单个供应商（商品链接 + Spec ID）尝试一次加购。
+
+    返回 (status, remark)，status 为 SUCCESS / FAILED / DRY_RUN。
+    """
+    if not spec_id:
+        return "FAILED", "Spec ID 为空"
+
+    offer_id = extract_offer_id(link)
+    if not offer_id:
+        return "FAILED", "无法从商品链接解析商品ID"
+
+    print(f"  {label}offerId={offer_id}, specId={spec_id}, qty={qty}")
+
+    data = build_post_data(offer_id, spec_id, qty, purchase_type=purchase_type)
+
+    # 如果在 config.py 中关闭 ENABLE_ADD_TO_CART，则仅做模拟，不发出真实请求
+    if not ENABLE_ADD_TO_CART:
+        print("  [DRY-RUN] 已跳过实际加购请求（ENABLE_ADD_TO_CART=False）")
+        return "DRY_RUN", "配置中禁用加购（未调用 1688 接口）"
+
+    # 加一点点人类延迟
+    human_delay()
+
+    try:
+        resp = session.post(
+            ADD_TO_CART_URL,
+            headers=headers,
+            data=data,
+            timeout=TIMEOUT,
+        )
+    except requests.RequestException as e:
+        print("  [FAIL] 请求出错:", e)
+        return "FAILED", f"请求异常: {e}"
+
+    text = resp.text.strip()
+    short_text = text[:180].replace("\n", " ")
+
+    if resp.status_code == 200:
+        try:
+            j = resp.json()
+        except ValueError:
+            j = None
+
+        success = isinstance(j, dict) and j.get("success") is True
+        if success:
+            print("  [OK] 加购成功")
+            return "SUCCESS", "加入购物车成功"
+        print("  [FAIL] 状态200但未检测到 success 字段，响应片段:", short_text)
+        return "FAILED", short_text
+
+    print(f"  [FAIL] HTTP {resp.status_code}, 响应片段: {short_text}")
+    return "FAILED", short_text
+
+
+def process_workbook(
+    plan_path: str,
+    purchase_type: str = "",
+    df: pd.DataFrame | None = None,
+    interactive: bool = True,
+) -> str:
     """核心处理函数：
       - 读取 DXM 导出拣货表（或已手工整理的 1688 表）
       - 如需则按 Mapping_Data 映射
       - 调用 1688 加购物车接口
       - 输出 (done) 结果表，并根据状态排序
       - 将原始表 + 结果表移动到 Finished_added_to_cart
-    提示：管线脚本可以直接 import 后调用本函数（不经过 CLI 确认）。"""
+    提示：管线脚本可以直接 import 后调用本函数（不经过 CLI 确认）。
+
+    df: 已在内存中的拣货表（pipeline.py 传入 DXM 汇总结果），此时不再从 plan_path 读盘；
+        plan_path 仍用于命名 (done) 结果表和归档。
+    interactive=False: 结束时不询问是否打开结果文件。
+    返回结果表的最终路径。"""
 
     print("====================================================")
     print("正在处理工作簿:", plan_path)
     print("====================================================")
 
-    df = pd.read_excel(plan_path, dtype=str)
+    if df is None:
+        with metrics.timer("cart.read_excel"):
+            df = read_excel(plan_path, dtype=str)
+    else:
+        df = as_text_frame(df)
 
     # 1) 如果需要，做 Mapping_Data 映射
-    df = apply_mapping_if_needed(df)
+    with metrics.timer("cart.mapping", rows=len(df)):
+        df = apply_mapping_if_needed(df)
 
     # 2) 找出关键列：商品链接、Spec ID、数量
     link_col = find_column_by_exact_name(df.columns, "商品链接")
@@ -402,12 +516,18 @@ def process_workbook(plan_path: str, purchase_type: str = ""):
 
     status_col, remark_col = ensure_status_columns(df)
     headers = make_headers()
-    session = requests.Session()
+    # 加购 POST 不是幂等请求：共享 Session 只提供连接池和超时，不会自动重试
+    session = make_session()
 
     # 可选：预热 purchaseRender（如果你想完全仿照软件行为，可以取消注释）
     # warmup_purchase_render(session)
 
     # 4) 加入购物车循环
+    supplier_col = "加购供应商"
+    if supplier_col not in df.columns:
+        df[supplier_col] = ""
+
+    t_loop = time.perf_counter()
     for idx, row in df.iterrows():
         url = row[link_col]
         spec_id_val = row[spec_col]
@@ -425,13 +545,7 @@ def process_workbook(plan_path: str, purchase_type: str = ""):
         goods_id_val = row.get("商品ID", "")
         goods_id_str = str(goods_id_val).strip() if goods_id_val is not None else ""
 
-        # 先检查 Spec ID 是否为空
-        if spec_id_val is None:
-            df.at[idx, status_col] = "FAILED"
-            df.at[idx, remark_col] = "Spec ID 为空"
-            continue
-
-        spec_id = str(spec_id_val).strip()
+        spec_id = clean_cell(spec_id_val)
 
         # 如果 商品链接 / 商品ID / Spec ID 任意一个为 “备货/備貨”，标记为 FAILED, 备注=备货
         if link_str in ("备货", "備貨") or goods_id_str in ("备货", "備貨") or spec_id in ("备货", "備貨"):
@@ -440,12 +554,7 @@ def process_workbook(plan_path: str, purchase_type: str = ""):
             continue
         # ========== “备货” 逻辑结束 ==========
 
-        if not spec_id:
-            df.at[idx, status_col] = "FAILED"
-            df.at[idx, remark_col] = "Spec ID 为空"
-            continue
-
-        # 数量
+        # 数量（与供应商无关，数量错误时不做副供应商重试）
         try:
             qty = parse_quantity(qty_val)
         except ValueError as e:
@@ -453,63 +562,33 @@ def process_workbook(plan_path: str, purchase_type: str = ""):
             df.at[idx, remark_col] = f"数量错误: {e}"
             continue
 
-        offer_id = extract_offer_id(url)
-        if not offer_id:
-            df.at[idx, status_col] = "FAILED"
-            df.at[idx, remark_col] = "无法从商品链接解析商品ID"
-            continue
-
-        print(f"行 {idx}: SKU={sku_str}, offerId={offer_id}, specId={spec_id}, qty={qty}")
-
-        data = build_post_data(offer_id, spec_id, qty, purchase_type=purchase_type)
-
-        # 如果在 config.py 中关闭 ENABLE_ADD_TO_CART，则仅做模拟，不发出真实请求
-        if not ENABLE_ADD_TO_CART:
-            print("  [DRY-RUN] 已跳过实际加购请求（ENABLE_ADD_TO_CART=False）")
-            df.at[idx, status_col] = "DRY_RUN"
-            df.at[idx, remark_col] = "配置中禁用加购（未调用 1688 接口）"
-            continue
-
-        # 加一点点人类延迟
-        human_delay()
-
-        try:
-            resp = session.post(
-                ADD_TO_CART_URL,
-                headers=headers,
-                data=data,
-                timeout=TIMEOUT,
+        print(f"行 {idx}: SKU={sku_str}")
+        status, remark = add_to_cart_once(
+            session, headers, link_str, spec_id, qty,
+            purchase_type=purchase_type, label="[主] ",
+        )
+        supplier = "主供应商" if status != "FAILED" else ""
+
+        # ========== 主供应商失败 → 自动改用副供应商 ==========
+        sec_link = clean_cell(row.get("商品链接.1", ""))
+        sec_spec = clean_cell(row.get("Spec ID.1", ""))
+        if status == "FAILED" and sec_link and sec_spec:
+            print(f"  [FAILOVER] 主供应商失败（{remark}），改用副供应商重试")
+            sec_status, sec_remark = add_to_cart_once(
+                session, headers, sec_link, sec_spec, qty,
+                purchase_type=purchase_type, label="[副] ",
             )
-        except requests.RequestException as e:
-            print("  [FAIL] 请求出错:", e)
-            df.at[idx, status_col] = "FAILED"
-            df.at[idx, remark_col] = f"请求异常: {e}"
-            continue
-
-        text = resp.text.strip()
-        short_text = text[:180].replace("\n", " ")
-
-        if resp.status_code == 200:
-            try:
-                j = resp.json()
-            except ValueError:
-                j = None
-
-            success = isinstance(j, dict) and j.get("success") is True
-            if success:
-                print("  [OK] 加购成功")
-                df.at[idx, status_col] = "SUCCESS"
-                df.at[idx, remark_col] = "加入购物车成功"
+            if sec_status == "FAILED":
+                remark = f"{remark}；副供应商也失败: {sec_remark}"
             else:
-                print("  [FAIL] 状态200但未检测到 success 字段，响应片段:", short_text)
-                df.at[idx, status_col] = "FAILED"
-                df.at[idx, remark_col] = short_text
-        else:
-            print(f"  [FAIL] HTTP {resp.status_code}, 响应片段: {short_text}")
-            df.at[idx, status_col] = "FAILED"
-            df.at[idx, remark_col] = short_text
+                status = sec_status
+                supplier = "副供应商"
+                remark = f"{sec_remark}（副供应商；主供应商失败: {remark}）"
 
-        time.sleep(0.0)
+        df.at[idx, status_col] = status
+        df.at[idx, remark_col] = remark
+        df.at[idx, supplier_col] = supplier
+    metrics.record("cart.loop", time.perf_counter() - t_loop, rows=len(df))
 
     # 5) 排序：
     #  0. FAILED + Spec ID 为空
@@ -548,9 +627,13 @@ def process_workbook(plan_path: str, purchase_type: str = ""):
         "SKU ID",
         "Spec ID",
         "主供应商",
+        "商品链接.1",
+        "Spec ID.1",
+        "副供应商",
         "拣货备注",
         status_col,
         remark_col,
+        supplier_col,
     ]
     for col in final_cols:
         if col not in df.columns:
@@ -559,7 +642,8 @@ def process_workbook(plan_path: str, purchase_type: str = ""):
 
     base, ext = os.path.splitext(plan_path)
     out_path = base + "(done)" + ext
-    df.to_excel(out_path, index=False)
+    with metrics.timer("cart.write", rows=len(df)):
+        write_excel(df, out_path, sidecar=True)
     print("全部处理完成，结果已保存到:", out_path)
 
     # 7) 把原始表和结果表移动到 Finished_added_to_cart 目录
@@ -578,6 +662,7 @@ def process_workbook(plan_path: str, purchase_type: str = ""):
                 base_n, ext_n = os.path.splitext(name)
                 dst = os.path.join(FINISHED_DIR, f"{base_n}_{ts}{ext_n}")
             os.replace(src_path, dst)
+            move_sidecars(src_path, dst)
             print("已移动文件到已完成文件夹:", dst)
             return dst
 
@@ -590,6 +675,8 @@ def process_workbook(plan_path: str, purchase_type: str = ""):
 
     # 8) 完成后让用户选择是否打开结果文件
     final_result_path = dest_out or out_path
+    if not interactive:
+        return final_result_path
     try:
         print("\n处理已全部完成。")
         print("按任意键（除 N/n）打开结果文件；按 N/n 后回车退出不打开。")
@@ -609,6 +696,7 @@ def process_workbook(plan_path: str, purchase_type: str = ""):
             print("程序结束。")
     except Exception as e:
         print("[WARN] 处理用户选择时出错:", e)
+    return final_result_path
 
 
 def main(purchase_type: str = ""):
@@ -687,6 +775,8 @@ def main(purchase_type: str = ""):
 
         # ---- Loose confirmation: press Y/y (no Enter needed) ----
         try:
+            import msvcrt  # 仅 Windows；其它系统 ImportError 时回退到 input()
+
             key = msvcrt.getch().decode("utf-8", errors="ignore")
         except Exception:
             key = input().strip()[:1] or "n"
@@ -710,6 +800,7 @@ def main(purchase_type: str = ""):
 if __name__ == "__main__":
     import sys
 
+    metrics.start_run_from_argv("add_to_cart")
     mode = ""
     if len(sys.argv) > 1:
         arg = sys.argv[1].lower().strip()
@@ -0,0 +1,412 @@
+"""Micro benchmarks for the 1688 / DXM automation scripts.
+
+Run all benchmarks:
+
+    python benchmarks.py
+
+Run one benchmark:
+
+    python benchmarks.py summarise
+
+End-to-end run of the real scripts against the local mock server (mock_server.py):
+
+    python benchmarks.py e2e
+    set MOCK_PROFILE=realistic & set MOCK_PACKAGES=1000 & python benchmarks.py e2e   (Windows)
+
+Excel reader engines (calamine / openpyxl), full read vs usecols pruning:
+
+    python benchmarks.py excel
+    python benchmarks.py sidecar      (xlsx vs columnar sidecar write / read)
+    python benchmarks.py stream       (peak memory: streaming one column vs whole-sheet DataFrame)
+
+Start-up cost of each entry point (fresh interpreter per measurement):
+
+    python benchmarks.py imports
+
+Only synthetic data is used; nothing is sent to DXM or 1688.
+"""
+
+import io
+import os
+import sys
+import time
+import subprocess
+import random
+import tempfile
+from contextlib import ExitStack
+from unittest import mock
+
+import pandas as pd
+
+
+def _timeit(fn, repeat: int = 1) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def make_picklist(n_lines: int, n_skus: int | None = None, seed: int = 7) -> pd.DataFrame:
+    """构造与 DXM exportPickData 拣货单列结构一致的随机数据。"""
+    rnd = random.Random(seed)
+    n_skus = n_skus or max(1, n_lines // 4)
+    skus = [f"SKU-{i:06d}" for i in range(n_skus)]
+    rows = []
+    for _ in range(n_lines):
+        sku = rnd.choice(skus)
+        rows.append({
+            "仓库": "默认仓库",
+            "SKU": sku,
+            "商品编码": sku.replace("SKU", "P"),
+            "名称": f"商品 {sku}",
+            "货架位": f"A-{rnd.randint(1, 99):02d}",
+            "数量": rnd.randint(1, 5),
+            "拣货备注": "",
+            "客服备注": "",
+        })
+    return pd.DataFrame(rows)
+
+
+# ======================== summarise ========================
+
+def _legacy_download_and_summarise(content: bytes, path: str) -> None:
+    """旧流程：先把下载内容写盘，再 read_excel → sort/drop_duplicates/merge → to_excel 覆盖。"""
+    with open(path, "wb") as f:
+        f.write(content)
+    df = pd.read_excel(path)
+    df["SKU"] = df["SKU"].astype(str).fillna("").str.strip()
+    df["数量"] = pd.to_numeric(df["数量"], errors="coerce").fillna(0)
+    qty_df = df.groupby("SKU", as_index=False)["数量"].sum()
+    keep_cols = ["SKU", "仓库", "商品编码", "名称", "货架位", "拣货备注", "客服备注"]
+    first_df = df.sort_values("SKU").drop_duplicates("SKU", keep="first")[keep_cols]
+    summary = first_df.merge(qty_df, on="SKU", how="left")
+    summary.to_excel(path, index=False)
+
+
+def _fused_download_and_summarise(content: bytes, path: str) -> dict:
+    """新流程：内存解析 + 一次 groupby + 只写一次。返回各阶段耗时。"""
+    from DXM_export_and_audit import summarise_picklist_df
+
+    t0 = time.perf_counter()
+    df = pd.read_excel(io.BytesIO(content))
+    t1 = time.perf_counter()
+    summary = summarise_picklist_df(df)
+    t2 = time.perf_counter()
+    summary.to_excel(path, index=False)
+    t3 = time.perf_counter()
+    return {"parse": t1 - t0, "agg": t2 - t1, "write": t3 - t2}
+
+
+def bench_summarise(sizes=(1_000, 10_000, 100_000)) -> None:
+    import DXM_export_and_audit  # noqa: F401  预先导入，不计入计时
+
+    print("=== 拣货单 下载+汇总：旧（写盘后再读回）vs 新（内存解析 + 一次 groupby） ===")
+    print(f"{'行数':>8} {'旧(s)':>8} {'新(s)':>8} {'加速':>7} | {'解析':>7} {'汇总':>7} {'写出':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            buf = io.BytesIO()
+            make_picklist(n).to_excel(buf, index=False)
+            content = buf.getvalue()
+            path = os.path.join(tmp, f"pick_{n}.xlsx")
+
+            t_old = _timeit(lambda: _legacy_download_and_summarise(content, path))
+            t0 = time.perf_counter()
+            parts = _fused_download_and_summarise(content, path)
+            t_new = time.perf_counter() - t0
+            print(
+                f"{n:>8} {t_old:>8.2f} {t_new:>8.2f} {t_old / t_new:>6.2f}x | "
+                f"{parts['parse']:>7.2f} {parts['agg']:>7.2f} {parts['write']:>7.2f}"
+            )
+
+
+# ======================== excel engines ========================
+
+# Mapping_Data 中加购用不到的列（图片、备注、采购价等），用来模拟真实工作簿的宽度
+MAPPING_EXTRA_COLS = ["商品名称", "图片", "店铺", "类目", "采购价", "重量(g)", "备注", "更新时间"]
+
+
+def make_mapping(n_rows: int, seed: int = 7) -> pd.DataFrame:
+    """构造与 Mapping_Data.xlsx 列结构相近的随机数据（主键 + 主/副供应商 + 若干加购不用的列）。"""
+    from add_to_cart_http_1688 import PRIMARY_FIELDS, SECONDARY_FIELDS
+
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        pid = str(600000000000 + rnd.randint(0, 10**9))
+        row = {"商品選項貨號": f"SKU-{i:06d}"}
+        for fields in (PRIMARY_FIELDS, SECONDARY_FIELDS):
+            link, offer, attr, sku_id, spec_id, supplier = fields
+            row.update({
+                link: f"https://detail.1688.com/offer/{pid}.html",
+                offer: pid,
+                attr: f"颜色:{rnd.choice('红黄蓝黑白')};尺码:{rnd.choice(['S', 'M', 'L', 'XL'])}",
+                sku_id: str(5000000000000 + rnd.randint(0, 10**9)),
+                spec_id: f"{rnd.getrandbits(128):032x}",
+                supplier: f"供应商{rnd.randint(1, 300)}",
+            })
+        row.update({c: f"{c}-{rnd.randint(0, 10**6)}" for c in MAPPING_EXTRA_COLS})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def bench_excel(sizes=(1_000, 10_000, 50_000)) -> None:
+    import excel_io
+    from add_to_cart_http_1688 import MAPPING_USECOLS
+
+    engines = excel_io.available_engines()
+    print(f"=== Mapping_Data 读取：各引擎 全部列 vs usecols（可用引擎: {', '.join(engines)}；当前: {excel_io.reader_engine()}） ===")
+    header = f"{'行数':>8} {'大小(MB)':>9}"
+    for e in engines:
+        header += f" {e + ' 全部(s)':>16} {e + ' usecols(s)':>18}"
+    print(header)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"mapping_{n}.xlsx")
+            excel_io.write_excel(make_mapping(n), path)
+            line = f"{n:>8} {os.path.getsize(path) / 1e6:>9.1f}"
+            for e in engines:
+                t_full = _timeit(lambda: excel_io.read_excel(path, dtype=str, engine=e))
+                t_cols = _timeit(lambda: excel_io.read_excel(path, usecols=MAPPING_USECOLS, dtype=str, engine=e))
+                line += f" {t_full:>16.2f} {t_cols:>18.2f}"
+            print(line)
+
+
+def bench_sidecar(sizes=(1_000, 10_000, 50_000)) -> None:
+    import excel_io
+
+    fmt = excel_io.sidecar_format()
+    print(f"=== (done) 结果写出 / 读回：xlsx vs 旁路文件（{fmt}；xlsx 达到 {excel_io.STREAMING_WRITE_ROWS} 行时流式写出） ===")
+    print(f"{'行数':>8} {'写xlsx(s)':>10} {'写旁路(s)':>10} {'读xlsx(s)':>10} {'读旁路(s)':>10} {'加速':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            df = make_mapping(n)
+            path = os.path.join(tmp, f"result_{n}(done).xlsx")
+            t_xlsx = _timeit(lambda: excel_io.write_excel(df, path))
+            t_side = _timeit(lambda: excel_io.write_sidecar(df, path))
+            r_xlsx = _timeit(lambda: excel_io.read_excel(path, dtype=str, prefer_sidecar=False))
+            r_side = _timeit(lambda: excel_io.read_excel(path, dtype=str))
+            print(f"{n:>8} {t_xlsx:>10.2f} {t_side:>10.2f} {r_xlsx:>10.2f} {r_side:>10.2f} {r_xlsx / r_side:>6.1f}x")
+
+
+def _peak_mb(fn) -> tuple[float, float]:
+    """执行 fn，返回 (耗时秒, tracemalloc 峰值 MB)。tracemalloc 会让解析变慢，耗时只作横向比较。"""
+    import tracemalloc
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 1e6
+
+
+def bench_stream(sizes=(10_000, 50_000)) -> None:
+    import excel_io
+
+    print("=== 订单导出读取一列：流式 iter_column vs 整表 read_excel（峰值内存） ===")
+    print(f"{'行数':>8} {'流式(s)':>8} {'流式(MB)':>9} {'整表(s)':>8} {'整表(MB)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"orders_{n}.xlsx")
+            df = make_picklist(n)
+            df.insert(0, "Order No", [f"25{i:010d}" for i in range(n)])
+            excel_io.write_excel(df, path)
+            t_s, m_s = _peak_mb(lambda: sum(1 for _ in excel_io.iter_column(path, "Order No")))
+            t_f, m_f = _peak_mb(lambda: excel_io.read_excel(path, dtype=str)["Order No"].dropna().tolist())
+            print(f"{n:>8} {t_s:>8.2f} {m_s:>9.1f} {t_f:>8.2f} {m_f:>9.1f}")
+
+
+# ======================== e2e (mock server) ========================
+
+# mock_server.PROFILES 中的名称；包裹数决定导出 / 审核 / 加购的行数
+E2E_PROFILE = os.environ.get("MOCK_PROFILE", "fast")
+E2E_PACKAGES = int(os.environ.get("MOCK_PACKAGES", "200"))
+E2E_SKUS = int(os.environ.get("MOCK_SKUS", "120"))
+
+
+def _sandbox(stack: ExitStack, tmp: str, server) -> None:
+    """把各脚本的输出目录 / 台账 / 快照指向临时目录，HTTP 指向模拟服务，避免污染真实数据。"""
+    import http_client
+    import DXM_export_and_audit as dxm
+    import add_to_cart_http_1688 as cart
+    import scrape_1688_http_paste_links_open as scraper
+
+    picklists = os.path.join(tmp, "Batch_added_to_cart")
+    scrape_dir = os.path.join(tmp, "ID_Scrape")
+    mapping_path = os.path.join(tmp, "Mapping_Data", "Mapping_Data.xlsx")
+    for d in (picklists, scrape_dir, os.path.join(scrape_dir, "debug_html"), os.path.dirname(mapping_path)):
+        os.makedirs(d, exist_ok=True)
+    pd.DataFrame(server.state.seed_mapping_rows()).to_excel(mapping_path, index=False)
+
+    patches = {
+        dxm: {
+            "DOWNLOAD_DIR": picklists,
+            "CHUNKS_DIR": os.path.join(picklists, "Export_chunks"),
+            "ORDER_IDS_DIR": os.path.join(picklists, "Locate&Audit_UnprocessedOrders_InDXM"),
+            "MAPPING_PATH": mapping_path,
+            "UNMAPPED_QUEUE_PATH": os.path.join(scrape_dir, "unmapped_sku_queue.xlsx"),
+            "ORDER_INDEX_CACHE_PATH": os.path.join(tmp, "dxm_order_index_cache.json"),
+            "PENDING_SNAPSHOT_PATH": os.path.join(tmp, "dxm_pending_snapshot.json"),
+            "EXPORT_LEDGER_PATH": os.path.join(tmp, "dxm_export_ledger.json"),
+            "AUDIT_REPORT_DIR": os.path.join(tmp, "audit_reports"),
+            "lookup_skus": lambda skus: None,  # 不查询真实的 Mapping 服务
+        },
+        cart: {
+            "BASE_DIR": picklists,
+            "FINISHED_DIR": os.path.join(picklists, "Finished_added_to_cart"),
+            "MAPPING_PATH": mapping_path,
+            "lookup_skus": lambda skus: None,
+            "human_delay": lambda *a, **k: None,  # 真实加购的随机间隔不计入吞吐量
+        },
+        scraper: {
+            "BASE_DIR": scrape_dir,
+            "DEBUG_DIR": os.path.join(scrape_dir, "debug_html"),
+        },
+    }
+    for module, attrs in patches.items():
+        for name, value in attrs.items():
+            stack.enter_context(mock.patch.object(module, name, value))
+
+    stack.enter_context(mock.patch.dict(os.environ, {"ALI_COOKIE": "mock=1", "DXM_COOKIE": "mock=1"}))
+    http_client.clear_cookie_cache()
+    stack.callback(http_client.clear_cookie_cache)
+    # 先记下原来的地址再改写，退出时恢复的是原值而不是模拟服务地址
+    stack.callback(http_client.set_base_url, http_client.BASE_URL_OVERRIDE)
+    http_client.set_base_url(server.url)
+
+
+def bench_e2e(profile: str = E2E_PROFILE, packages: int = E2E_PACKAGES, skus: int = E2E_SKUS) -> None:
+    import contextlib
+
+    import metrics
+    from mock_server import MockServer, mock_detail_url, SKUS_PER_OFFER
+    import DXM_export_and_audit as dxm
+    from add_to_cart_http_1688 import process_workbook
+    from scrape_1688_http_paste_links_open import scrape_urls
+
+    print(f"=== 端到端：真实脚本 → 本地模拟服务（profile={profile}，包裹 {packages}，SKU {skus}） ===")
+    server = MockServer(profile, packages=packages, skus=skus, port=0).start()
+    results: list[tuple[str, int, float]] = []
+    log = io.StringIO()
+
+    def stage(name: str, fn, count_rows):
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(log):
+            out = fn()
+        seconds = time.perf_counter() - t0
+        results.append((name, count_rows(out), seconds))
+        return out
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+            _sandbox(stack, tmp, server)
+            t_all = time.perf_counter()
+
+            links = [mock_detail_url(i) for i in range(0, skus, SKUS_PER_OFFER)]
+            stage("scrape", lambda: scrape_urls(links),
+                  lambda path: len(pd.read_excel(path)) if path else 0)
+
+            picklists, package_ids = stage("dxm_export", lambda: dxm.export_picklists_from_dxm(1),
+                                           lambda out: len(out[1]))
+            stage("audit", lambda: dxm.audit_packages(package_ids), len)
+
+            adds_before = server.stats()["cart_adds"]
+            stage("cart",
+                  lambda: [process_workbook(p, df=df, interactive=False) for p, df in picklists],
+                  lambda out: server.stats()["cart_adds"] - adds_before)
+
+            wall = time.perf_counter() - t_all
+    finally:
+        server.stop()
+
+    print(f"{'阶段':<12} {'行数':>8} {'用时(s)':>9} {'行/秒':>9}")
+    for name, rows, seconds in results:
+        print(f"{name:<12} {rows:>8} {seconds:>9.2f} {rows / seconds if seconds else 0:>9.1f}")
+    print(f"{'总计':<12} {'':>8} {wall:>9.2f}")
+
+    print(f"\n{'端点':<28} {'次数':>6} {'错误':>5} {'p50(ms)':>8} {'p95(ms)':>8}")
+    for endpoint, h in sorted(metrics.http_summary().items()):
+        print(f"{endpoint:<28} {h['count']:>6} {h['errors']:>5} {h['p50_ms']:>8.1f} {h['p95_ms']:>8.1f}")
+
+    stats = server.stats()
+    throttled = sum(e["throttled"] for e in stats["endpoints"].values())
+    errors = sum(e["errors"] for e in stats["endpoints"].values())
+    print(f"\n[INFO] 模拟服务注入: 错误 {errors} 次，限流 {throttled} 次；剩余待审核 {stats['pending']} 个包裹。")
+
+
+# ======================== imports ========================
+
+WORK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (名称, python 参数)：每项在新的解释器中运行，计入解释器启动 + 导入时间
+IMPORT_TARGETS = [
+    ("python (空)", ["-c", "pass"]),
+    ("cli.py --help", ["cli.py", "--help"]),
+    ("cli.py status", ["cli.py", "status"]),
+    ("import DXM_export_and_audit", ["-c", "import DXM_export_and_audit"]),
+    ("import add_to_cart_http_1688", ["-c", "import add_to_cart_http_1688"]),
+    ("import scrape_1688_http_paste_links_open", ["-c", "import scrape_1688_http_paste_links_open"]),
+    ("import Update_mapping_from_scrape", ["-c", "import Update_mapping_from_scrape"]),
+    ("import pipeline", ["-c", "import pipeline"]),
+]
+
+
+def _top_imports(stderr: str, skip: set[str], n: int = 3) -> list[tuple[str, float]]:
+    """解析 -X importtime 输出，返回累计耗时最高的顶层 / 第二层导入 [(名称, 毫秒)]（skip 中的除外）。"""
+    top = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line.split("|")
+        name = parts[2].rstrip()
+        if name.startswith("    ") or not parts[1].strip().isdigit():
+            continue  # 缩进两层以上：间接导入，已计入上层的累计时间
+        name = name.strip()
+        if name not in skip:
+            top.append((name, int(parts[1]) / 1000))
+    return sorted(top, key=lambda x: -x[1])[:n]
+
+
+def bench_imports(repeat: int = 3) -> None:
+    print("=== 入口启动时间（新解释器，取最好的一次） ===")
+    print(f"{'目标':<42} {'用时(s)':>8}  最重的导入")
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    for label, args in IMPORT_TARGETS:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            r = subprocess.run([sys.executable, *args], cwd=WORK_DIR, env=env, capture_output=True, text=True)
+            best = min(best, time.perf_counter() - t0)
+        if r.returncode != 0:
+            print(f"{label:<42} {'失败':>8}  {r.stderr.strip().splitlines()[-1] if r.stderr.strip() else ''}")
+            continue
+        r = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=WORK_DIR, env=env, capture_output=True, text=True)
+        skip = {"site", "encodings"} | {a.split()[-1] for a in args if a.startswith("import ")}
+        heavy = ", ".join(f"{name} {ms:.0f}ms" for name, ms in _top_imports(r.stderr, skip))
+        print(f"{label:<42} {best:>8.2f}  {heavy}")
+
+
+BENCHMARKS = {
+    "summarise": bench_summarise,
+    "excel": bench_excel,
+    "sidecar": bench_sidecar,
+    "stream": bench_stream,
+    "e2e": bench_e2e,
+    "imports": bench_imports,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise SystemExit(f"未知 benchmark: {name}（可选: {', '.join(BENCHMARKS)}）")
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""HTTP record / replay cassettes for the shared HTTP client (http_client.py).
+
+Record a real run (every request/response pair, cookies redacted, gzip JSONL):
+
+    set HTTP_CASSETTE_MODE=record
+    python DXM_export_and_audit.py               → cassettes/DXM_export_and_audit_<ts>.jsonl.gz
+
+Replay it offline (no network; poll / delay sleeps are skipped):
+
+    set HTTP_CASSETTE_MODE=replay
+    set HTTP_CASSETTE=cassettes\\DXM_export_and_audit_20260101_120000.jsonl.gz
+    python DXM_export_and_audit.py
+
+Inspect a cassette:
+
+    python cassette.py cassettes\\xxx.jsonl.gz
+"""
+
+import os
+import sys
+import re
+import json
+import gzip
+import time
+import base64
+import threading
+import urllib.parse
+from collections import defaultdict, deque
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+# ======================== CONFIG ========================
+
+WORK_DIR = os.path.dirname(os.path.abspath(__file__))
+CASSETTE_DIR = os.path.join(WORK_DIR, "cassettes")
+
+# 这些请求头 / 响应头的值不写入 cassette
+REDACT_HEADERS = {"cookie", "set-cookie", "authorization", "x-csrf-token", "x-xsrf-token"}
+# 请求体 / 查询参数中这些字段的值不写入 cassette（1688 表单中的 token）
+REDACT_FIELDS = {"_csrf_token", "_tb_token_", "csrf_token", "token"}
+# 匹配回放时忽略的易变字段（时间戳）
+VOLATILE_FIELDS = {"t", "_", "timestamp"}
+# 轮询类接口：宽松回放（loose=True）时允许按路径顺序取记录、记录用完后重复最后一条
+POLL_PATHS = ("/checkProcess.json",)
+
+REDACTED = "<redacted>"
+
+
+class CassetteMiss(requests.ConnectionError):
+    """回放时 cassette 中没有与请求匹配的记录（调用方按网络错误处理）。"""
+
+
+# ======================== Request keys ========================
+
+def _form_pairs(data) -> list[tuple[str, str]]:
+    """把 requests 的 data 参数（dict / list / str / bytes）统一成 [(字段, 值)]。"""
+    if data is None:
+        return []
+    if isinstance(data, dict):
+        return [(str(k), str(v)) for k, v in data.items()]
+    if isinstance(data, (list, tuple)):
+        return [(str(k), str(v)) for k, v in data]
+    if isinstance(data, bytes):
+        data = data.decode("utf-8", errors="replace")
+    return urllib.parse.parse_qsl(str(data), keep_blank_values=True)
+
+
+def _redact_pairs(pairs: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    return [(k, REDACTED if k.lower() in REDACT_FIELDS else v) for k, v in pairs]
+
+
+def _redact_url(url: str) -> str:
+    parts = urllib.parse.urlsplit(url)
+    if not parts.query:
+        return url
+    query = urllib.parse.urlencode(_redact_pairs(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc, parts.path, query, parts.fragment))
+
+
+def _redact_headers(headers) -> dict:
+    return {k: (REDACTED if k.lower() in REDACT_HEADERS else v) for k, v in (headers or {}).items()}
+
+
+_FIELD_ALT = "|".join(re.escape(f) for f in sorted(REDACT_FIELDS))
+# "token": "xxx" / _csrf_token = 'xxx'（页面脚本、JSONP 中的写法）
+_BODY_FIELD_RE = re.compile(rf"""((?<![\w-])["']?(?:{_FIELD_ALT})["']?\s*[:=]\s*["'])([^"']+)(["'])""", re.I)
+# <input name="_csrf_token" value="xxx">
+_BODY_INPUT_RE = re.compile(rf"""(name=["'](?:{_FIELD_ALT})["'][^>]*?value=["'])([^"']*)(["'])""", re.I)
+
+
+def _redact_json(obj):
+    """递归把 JSON 中 REDACT_FIELDS 字段的值替换掉；返回 (新对象, 是否有改动)。"""
+    if isinstance(obj, dict):
+        changed = False
+        out = {}
+        for k, v in obj.items():
+            if str(k).lower() in REDACT_FIELDS and v not in (None, ""):
+                out[k], changed = REDACTED, True
+            else:
+                out[k], c = _redact_json(v)
+                changed = changed or c
+        return out, changed
+    if isinstance(obj, list):
+        items = [_redact_json(v) for v in obj]
+        return [v for v, _ in items], any(c for _, c in items)
+    return obj, False
+
+
+def _redact_content(content: bytes, encoding: str | None) -> bytes:
+    """\
+    响应体中的 token 字段脱敏：JSON 按字段名递归处理，HTML / 脚本文本按常见写法正则替换。
+    二进制内容（xlsx 等）原样保留。只处理 REDACT_FIELDS，其它敏感内容（账号名、地址等）不会被脱敏。
+    """
+    if not content:
+        return content
+    enc = encoding or "utf-8"
+    try:
+        text = content.decode(enc)
+    except (UnicodeDecodeError, LookupError):
+        return content
+
+    if text.lstrip()[:1] in ("{", "["):
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            obj = None
+        if obj is not None:
+            redacted, changed = _redact_json(obj)
+            return json.dumps(redacted).encode(enc) if changed else content
+
+    new = _BODY_FIELD_RE.sub(rf"\g<1>{REDACTED}\g<3>", text)
+    new = _BODY_INPUT_RE.sub(rf"\g<1>{REDACTED}\g<3>", new)
+    return new.encode(enc) if new != text else content
+
+
+def request_key(method: str, url: str, data=None, params=None) -> str:
+    """匹配用的请求键：方法 + 主机 + 路径 + 排序后的查询 / 表单字段（去掉时间戳等易变字段）。"""
+    parts = urllib.parse.urlsplit(url)
+    pairs = urllib.parse.parse_qsl(parts.query, keep_blank_values=True) + _form_pairs(params) + _form_pairs(data)
+    pairs = sorted((k, v) for k, v in _redact_pairs(pairs) if k not in VOLATILE_FIELDS)
+    return f"{method.upper()} {parts.netloc}{parts.path}?{urllib.parse.urlencode(pairs)}"
+
+
+def route_key(method: str, url: str) -> str:
+    """宽松匹配：方法 + 主机 + 路径。"""
+    parts = urllib.parse.urlsplit(url)
+    return f"{method.upper()} {parts.netloc}{parts.path}"
+
+
+# ======================== Cassette ========================
+
+class Cassette:
+    """\
+    mode="record"：每个请求的最终响应（重试之后）或网络异常追加写入 gzip JSONL，每条写完即 flush，
+                   进程中途崩溃时已写入的记录仍可回放。
+    mode="replay"：按请求键依次返回记录的响应；同一键有多条记录时按录制顺序返回。
+                   键不匹配或该键的记录已用完时抛 CassetteMiss（不会拿别的请求的响应冒充）。
+    loose=True：仅对 POLL_PATHS 中的轮询接口放宽——键不匹配时按 方法+路径 顺序取，记录用完后重复最后一条。
+    """
+
+    def __init__(self, path: str, mode: str, loose: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError("mode 只能是 record 或 replay")
+        self.path = path
+        self.mode = mode
+        self.loose = loose
+        self._lock = threading.Lock()
+        self._file = None
+        self._exact: dict[str, deque] = defaultdict(deque)
+        self._route: dict[str, deque] = defaultdict(deque)
+        self._last: dict[str, dict] = {}
+        self.count = 0
+
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+        else:
+            for entry in load_entries(path):
+                self._exact[entry["key"]].append(entry)
+                self._route[entry["route"]].append(entry)
+                self.count += 1
+
+    # ---------- record ----------
+
+    def record(self, method: str, url: str, kwargs: dict, resp: requests.Response | None = None,
+               error: BaseException | None = None, seconds: float = 0.0) -> None:
+        entry = {
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "key": request_key(method, url, kwargs.get("data"), kwargs.get("params")),
+            "route": route_key(method, url),
+            "method": method.upper(),
+            "url": _redact_url(url),
+            "body": _redact_pairs(_form_pairs(kwargs.get("data"))),
+            "elapsed_ms": round(seconds * 1000, 1),
+        }
+        if error is not None:
+            entry["error"] = type(error).__name__
+            entry["error_msg"] = str(error)[:500]
+        else:
+            entry["status"] = resp.status_code
+            entry["reason"] = resp.reason
+            entry["headers"] = _redact_headers(resp.headers)
+            content = _redact_content(resp.content or b"", resp.encoding)
+            entry["content_b64"] = base64.b64encode(content).decode("ascii")
+
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ---------- replay ----------
+
+    @staticmethod
+    def _pop_unused(queue: deque | None) -> dict | None:
+        # 同一条记录同时在 _exact 和 _route 中，用 _used 标记避免被取两次
+        while queue:
+            entry = queue.popleft()
+            if not entry.get("_used"):
+                entry["_used"] = True
+                return entry
+        return None
+
+    def _next(self, key: str, route: str) -> dict | None:
+        with self._lock:
+            entry = self._pop_unused(self._exact.get(key))
+            if entry is None:
+                if not (self.loose and route.endswith(POLL_PATHS)):
+                    return None
+                entry = self._pop_unused(self._route.get(route))
+                if entry is None:
+                    return self._last.get(route)
+            self._last[route] = entry
+            return entry
+
+    def play(self, method: str, url: str, kwargs: dict) -> requests.Response:
+        key = request_key(method, url, kwargs.get("data"), kwargs.get("params"))
+        entry = self._next(key, route_key(method, url))
+        if entry is None:
+            raise CassetteMiss(f"cassette 中没有匹配的请求: {key[:200]}")
+
+        if "error" in entry:
+            exc_type = getattr(requests, entry["error"], requests.ConnectionError)
+            if not (isinstance(exc_type, type) and issubclass(exc_type, requests.RequestException)):
+                exc_type = requests.ConnectionError
+            raise exc_type(f"[replay] {entry.get('error_msg', '')}")
+
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp.reason = entry.get("reason") or ""
+        resp.headers = CaseInsensitiveDict(entry.get("headers") or {})
+        resp._content = base64.b64decode(entry.get("content_b64") or "")
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        resp.url = url
+        return resp
+
+
+def load_entries(path: str) -> list[dict]:
+    """读取 cassette；录制进程中途被杀时文件结尾不完整，读到的完整记录照常返回。"""
+    entries = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    except (EOFError, gzip.BadGzipFile, OSError) as e:
+        if not entries:
+            raise
+        print(f"[WARN] cassette 文件结尾不完整（{e}），只读取了前 {len(entries)} 条记录。")
+    return entries
+
+
+# ======================== Active cassette ========================
+
+_active: Cassette | None = None
+
+
+def default_path() -> str:
+    script = os.path.splitext(os.path.basename(sys.argv[0] or "run"))[0] or "run"
+    return os.path.join(CASSETTE_DIR, f"{script}_{time.strftime('%Y%m%d_%H%M%S')}.jsonl.gz")
+
+
+def use_cassette(path: str | None, mode: str | None, loose: bool = False) -> Cassette | None:
+    """设置当前进程使用的 cassette（mode 为 None / 空时关闭）；loose 见 Cassette。返回 Cassette 对象。"""
+    global _active
+    if _active is not None:
+        _active.close()
+        _active = None
+    if not mode:
+        return None
+    if mode == "replay" and not path:
+        raise ValueError("回放需要指定 cassette 文件（环境变量 HTTP_CASSETTE）")
+    _active = Cassette(path or default_path(), mode, loose=loose)
+    if mode == "record":
+        print(f"[INFO] HTTP 录制到: {_active.path}（Cookie 已脱敏）")
+    else:
+        print(f"[INFO] HTTP 从 cassette 回放: {_active.path}（{_active.count} 条记录，不访问网络）")
+    return _active
+
+
+def active() -> Cassette | None:
+    return _active
+
+
+def replaying() -> bool:
+    return _active is not None and _active.mode == "replay"
+
+
+def summarize(path: str) -> None:
+    entries = load_entries(path)
+    by_route: dict[str, list[int]] = defaultdict(list)
+    for e in entries:
+        by_route[e["route"]].append(e.get("status") or 0)
+    print(f"{path}: {len(entries)} 条记录")
+    for route, statuses in sorted(by_route.items()):
+        failed = sum(1 for s in statuses if s == 0 or s >= 400)
+        print(f"  {len(statuses):>5}  (失败 {failed:>3})  {route}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit("用法: python cassette.py <cassette.jsonl.gz> [...]")
+    for p in sys.argv[1:]:
+        summarize(p)
@@ -0,0 +1,301 @@
+"""Unified command line for the 1688 / DXM automation scripts.
+
+    python cli.py status                    # 待加购拣货单 / 待审核快照 / 导出台账 / 阶段缓存（不导入 pandas）
+    python cli.py retries --days 7          # 最近结果表中加购失败的行
+    python cli.py scrape [--excel [x.xlsx]] # = scrape_1688_http_paste_links_open.py
+    python cli.py map [--all]               # = Update_mapping_from_scrape.py
+    python cli.py export [--mode 2] [--audit] [--reexport]
+    python cli.py audit                     # 审核已导出且仍待审核的包裹
+    python cli.py cart [consign]            # = add_to_cart_http_1688.py
+    python cli.py pipeline [...]            # = pipeline.py
+    python cli.py history failures --days 30  # = results_warehouse.py（历史结果仓库）
+    python cli.py crop [folder]             # = ../crop_ratio_fix.py
+    python cli.py ocr [folder]              # = ../../Shopee/Jusifang_Withdrawal_Automation.py
+
+Heavy modules (pandas, requests, openpyxl, PIL) are imported only by the subcommand that needs
+them, so status / retries / --help start in a fraction of a second. --profile works as in each script.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import metrics
+from config import MAPPING_PATH, PICKLIST_FOLDER, SCRAPE_FOLDER
+
+
+# ======================== CONFIG ========================
+
+WORK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(os.path.dirname(WORK_DIR))
+
+# 与各脚本中的路径一致（这里直接读 JSON，避免为了 status 导入 pandas）
+PENDING_SNAPSHOT_PATH = os.path.join(WORK_DIR, "dxm_pending_snapshot.json")
+EXPORT_LEDGER_PATH = os.path.join(WORK_DIR, "dxm_export_ledger.json")
+SCRAPE_LEDGER_PATH = os.path.join(SCRAPE_FOLDER, "processed_done_workbooks.json")
+FINISHED_DIR = os.path.join(PICKLIST_FOLDER, "Finished_added_to_cart")
+
+CROP_SCRIPT = os.path.join(REPO_DIR, "Python", "crop_ratio_fix.py")
+OCR_SCRIPT = os.path.join(REPO_DIR, "Shopee", "Jusifang_Withdrawal_Automation.py")
+
+RETRY_DAYS = 7
+
+
+# ======================== Helpers ========================
+
+def _read_json(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else None
+    except (OSError, ValueError):
+        return None
+
+
+def _fmt_epoch(ts) -> str:
+    try:
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(float(ts)))
+    except (TypeError, ValueError):
+        return "-"
+
+
+def _xlsx_files(folder: str, done: bool | None = None) -> list[str]:
+    """folder 中的 .xlsx（done=True 只要 (done) 结果表，False 排除结果表），按修改时间从旧到新。"""
+    if not os.path.isdir(folder):
+        return []
+    out = []
+    for fn in os.listdir(folder):
+        if fn.startswith("~$") or not fn.lower().endswith(".xlsx"):
+            continue
+        is_done = os.path.splitext(fn)[0].endswith("(done)")
+        if done is not None and is_done != done:
+            continue
+        out.append(os.path.join(folder, fn))
+    out.sort(key=os.path.getmtime)
+    return out
+
+
+def _run_script(module: str, argv: list[str]) -> None:
+    """把剩余参数交给脚本自己的 __main__（和直接 python xxx.py 完全一样）。"""
+    import runpy
+
+    sys.argv = [module + ".py", *argv]
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+
+def _load_file_module(path: str, name: str):
+    """按路径导入仓库中其它目录的脚本（crop / ocr）。"""
+    import importlib.util
+
+    if not os.path.exists(path):
+        raise SystemExit(f"[ERROR] 找不到脚本: {path}")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ======================== Cheap commands ========================
+
+def cmd_status(args) -> None:
+    print("=== 状态 ===")
+
+    waiting = _xlsx_files(PICKLIST_FOLDER, done=False)
+    print(f"待加购拣货单 ({PICKLIST_FOLDER}): {len(waiting)}")
+    for p in waiting[-5:]:
+        print(f"    {_fmt_epoch(os.path.getmtime(p))}  {os.path.basename(p)}")
+
+    finished = _xlsx_files(FINISHED_DIR, done=True)
+    last = _fmt_epoch(os.path.getmtime(finished[-1])) if finished else "-"
+    print(f"已完成结果表: {len(finished)}（最近 {last}）")
+
+    snap = _read_json(PENDING_SNAPSHOT_PATH)
+    if snap is None:
+        print("待审核快照: 无")
+    else:
+        print(
+            f"待审核快照: {len(snap.get('packages') or {})} 个包裹"
+            f"（同步 {_fmt_epoch(snap.get('synced_at'))}，全量 {_fmt_epoch(snap.get('full_synced_at'))}）"
+        )
+
+    ledger = _read_json(EXPORT_LEDGER_PATH) or {}
+    last_export = max((float(v.get("exported_at_epoch", 0)) for v in ledger.values()), default=None)
+    print(f"导出台账: {len(ledger)} 个包裹（最近导出 {_fmt_epoch(last_export)}）")
+
+    # 与 Update_mapping_from_scrape.find_unprocessed_done_workbooks 的判断一致
+    scrape_ledger = _read_json(SCRAPE_LEDGER_PATH) or {}
+    unmerged = 0
+    for p in _xlsx_files(SCRAPE_FOLDER, done=True):
+        st = os.stat(p)
+        entry = scrape_ledger.get(os.path.basename(p)) or {}
+        if entry.get("mtime") != st.st_mtime or entry.get("size") != st.st_size:
+            unmerged += 1
+    print(f"未合并的抓取结果 (done): {unmerged}")
+
+    if os.path.exists(MAPPING_PATH):
+        print(f"Mapping_Data: 更新于 {_fmt_epoch(os.path.getmtime(MAPPING_PATH))}")
+    else:
+        print(f"Mapping_Data: 不存在 ({MAPPING_PATH})")
+
+    from stage_cache import load_cache
+
+    cache = load_cache()
+    if cache:
+        print("流水线阶段缓存:")
+        for name, entry in cache.items():
+            print(f"    {name:<15} {entry.get('finished_at', '-')}  {entry.get('seconds', 0):.1f}s")
+
+    runs = sorted(
+        (os.path.join(metrics.METRICS_DIR, f) for f in os.listdir(metrics.METRICS_DIR) if f.endswith(".jsonl")),
+        key=os.path.getmtime,
+    ) if os.path.isdir(metrics.METRICS_DIR) else []
+    if runs:
+        print(f"最近一次性能记录: {runs[-1]}")
+
+
+def cmd_retries(args) -> None:
+    """列出最近 N 天结果表中加购失败（状态=FAILED）的行，只读需要的列（openpyxl 只读模式）。"""
+    from openpyxl import load_workbook
+
+    cutoff = time.time() - args.days * 86400
+    files = [p for p in _xlsx_files(FINISHED_DIR, done=True) if os.path.getmtime(p) >= cutoff]
+    if not files:
+        print(f"[INFO] 最近 {args.days} 天没有结果表: {FINISHED_DIR}")
+        return
+
+    wanted = ("SKU", "数量", "商品链接", "Spec ID", "状态", "备注")
+    total = 0
+    for path in files:
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+            idx = {name: header.index(name) for name in wanted if name in header}
+            if "状态" not in idx:
+                continue
+            failed = []
+            for row in rows:
+                status = row[idx["状态"]] if idx["状态"] < len(row) else None
+                if str(status or "").strip() != "FAILED":
+                    continue
+                failed.append({k: (row[i] if i < len(row) else None) for k, i in idx.items()})
+        finally:
+            wb.close()
+
+        if not failed:
+            continue
+        total += len(failed)
+        print(f"\n{os.path.basename(path)}  ({_fmt_epoch(os.path.getmtime(path))})  失败 {len(failed)} 行")
+        for r in failed[: args.limit]:
+            remark = str(r.get("备注") or "")[:60]
+            print(f"    {str(r.get('SKU') or ''):<24} x{str(r.get('数量') or ''):<4} {remark}")
+        if len(failed) > args.limit:
+            print(f"    ... 以及另外 {len(failed) - args.limit} 行")
+
+    print(f"\n[INFO] 最近 {args.days} 天共 {len(files)} 个结果表，失败 {total} 行。")
+
+
+# ======================== Script commands ========================
+
+def cmd_export(args) -> None:
+    metrics.start_run("dxm_export", profile=args.profile)
+    from DXM_export_and_audit import export_and_maybe_audit
+
+    export_and_maybe_audit(
+        args.mode,
+        workbook_path=args.workbook,
+        reinclude_exported=True if args.reexport else None,
+        do_audit=args.audit,
+    )
+
+
+def cmd_audit(args) -> None:
+    metrics.start_run("dxm_audit", profile=args.profile)
+    from DXM_export_and_audit import run_audit_exported_pending
+
+    run_audit_exported_pending()
+
+
+def cmd_crop(args) -> None:
+    module = _load_file_module(CROP_SCRIPT, "crop_ratio_fix")
+    module.process_folder(args.folder or module.script_folder())
+
+
+def cmd_ocr(args) -> None:
+    module = _load_file_module(OCR_SCRIPT, "jusifang_withdrawal_automation")
+    if args.folder:
+        module.BASE_DIR = args.folder
+    module.main()
+
+
+# 子命令 → 脚本模块（剩余参数原样转交给脚本）
+SCRIPT_COMMANDS = {
+    "scrape": ("scrape_1688_http_paste_links_open", "抓取 1688 商品 SKU / Spec ID"),
+    "map": ("Update_mapping_from_scrape", "把抓取结果合并进 Mapping_Data（--all 处理全部）"),
+    "cart": ("add_to_cart_http_1688", "按最新拣货单加购（consign = 代发）"),
+    "pipeline": ("pipeline", "DXM 导出 + 审核 → 加购 单进程流水线"),
+    "drift": ("scan_spec_id_drift", "扫描 Mapping_Data 中失效的 SKU ID / Spec ID"),
+    "history": ("results_warehouse", "历史加购结果查询（失败供应商 / SKU 件数等）"),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="1688 / 店小秘 自动化统一入口")
+    sub = parser.add_subparsers(dest="command", metavar="命令")
+
+    p = sub.add_parser("status", help="当前状态概览（秒开）")
+    p.set_defaults(func=cmd_status)
+
+    p = sub.add_parser("retries", help="列出最近结果表中加购失败的行")
+    p.add_argument("--days", type=float, default=RETRY_DAYS, help=f"最近几天（默认 {RETRY_DAYS}）")
+    p.add_argument("--limit", type=int, default=20, help="每个文件最多显示行数")
+    p.set_defaults(func=cmd_retries)
+
+    p = sub.add_parser("export", help="DXM 导出拣货单（默认不审核）")
+    p.add_argument("--mode", type=int, choices=(1, 2), default=1, help="1=所有待审核订单，2=从订单工作簿")
+    p.add_argument("--workbook", default=None, help="Mode 2 的订单工作簿（默认取最新）")
+    p.add_argument("--reexport", action="store_true", help="已导出过的包裹也重新导出")
+    p.add_argument("--audit", action="store_true", help="导出后审核")
+    p.add_argument("--profile", action="store_true", help="写 cProfile / tracemalloc 报告")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("audit", help="审核已导出且仍待审核的包裹")
+    p.add_argument("--profile", action="store_true", help="写 cProfile / tracemalloc 报告")
+    p.set_defaults(func=cmd_audit)
+
+    p = sub.add_parser("crop", help="图片比例修正（crop_ratio_fix.py）")
+    p.add_argument("folder", nargs="?", default=None, help="图片目录（默认脚本所在目录）")
+    p.set_defaults(func=cmd_crop)
+
+    p = sub.add_parser("ocr", help="提款截图 OCR（Jusifang_Withdrawal_Automation.py）")
+    p.add_argument("folder", nargs="?", default=None, help="工作簿目录（默认脚本所在目录）")
+    p.set_defaults(func=cmd_ocr)
+
+    for name, (module, help_text) in SCRIPT_COMMANDS.items():
+        p = sub.add_parser(name, help=help_text, add_help=False)
+        p.set_defaults(script=module)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+
+    if getattr(args, "script", None):
+        _run_script(args.script, rest)
+        return
+    if rest:
+        parser.error(f"无法识别的参数: {' '.join(rest)}")
+    if not args.command:
+        parser.print_help()
+        return
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import os
+import csv
+import json
+import importlib.util
+
+
+# ======================== CONFIG ========================
+
+# 读取引擎优先级：calamine（Rust，需 pip install python-calamine）比 openpyxl 快数倍；
+# 没装时自动回退到 openpyxl。可用环境变量 EXCEL_READ_ENGINE=openpyxl 强制指定。
+READ_ENGINES = ["calamine", "openpyxl"]
+READ_ENGINE_OVERRIDE = os.environ.get("EXCEL_READ_ENGINE", "").strip().lower()
+
+# 引擎 → 需要能导入的模块
+_ENGINE_MODULES = {
+    "calamine": "python_calamine",
+    "openpyxl": "openpyxl",
+}
+
+# 列式旁路文件（sidecar）：(done) 结果、抓取结果、汇总拣货单写 xlsx 时在同目录额外写一份
+# X.parquet / X.feather / X.csv，下游读取时若旁路文件存在且不比 xlsx 旧则直接读它（快得多）。
+# auto = 装了 pyarrow / fastparquet 用 parquet，否则用 csv；off = 不写旁路文件
+SIDECAR_FORMAT = os.environ.get("EXCEL_SIDECAR", "auto").strip().lower()
+SIDECAR_EXTS = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+# csv 旁路文件第一行记录非文本列的类型，读回时与 xlsx 一致（避免 商品ID 等文本被读成数字）
+CSV_DTYPES_PREFIX = "#dtypes "
+
+# 行数达到这个值时 xlsx 用流式写出（xlsxwriter constant_memory；没装则 openpyxl write_only），内存不随行数增长
+STREAMING_WRITE_ROWS = 20_000
+
+_available: list[str] | None = None
+
+
+# ======================== Engines ========================
+
+def available_engines() -> list[str]:
+    """按优先级返回当前环境可用的读取引擎（只检查模块是否存在，不导入）。"""
+    global _available
+    if _available is None:
+        _available = [e for e in READ_ENGINES if importlib.util.find_spec(_ENGINE_MODULES[e]) is not None]
+    return _available
+
+
+def reader_engine() -> str:
+    """当前使用的读取引擎。"""
+    if READ_ENGINE_OVERRIDE:
+        return READ_ENGINE_OVERRIDE
+    engines = available_engines()
+    return engines[0] if engines else "openpyxl"
+
+
+def _usecols_filter(usecols):
+    """\
+    列名列表 → 容错的列过滤函数：文件中不存在的列直接忽略（pandas 对不存在的列名会报错），
+    表头两侧空白不影响匹配。整数列号 / 字符串 "A:C" / 函数原样交给 pandas。
+    """
+    if usecols is None or callable(usecols) or isinstance(usecols, str):
+        return usecols
+    cols = list(usecols)
+    if cols and all(isinstance(c, int) for c in cols):
+        return cols
+    wanted = {str(c).strip() for c in cols}
+    return lambda c: str(c).strip() in wanted
+
+
+# ======================== Read / write ========================
+
+def read_excel(source, usecols=None, dtype=None, engine: str | None = None, prefer_sidecar: bool = True, **kwargs):
+    """\
+    pd.read_excel 的统一入口：
+      - source 是路径且旁边有不比它旧的列式旁路文件时直接读旁路文件（prefer_sidecar=False 关闭）
+      - 自动选择最快的可用引擎（calamine → openpyxl），calamine 读取失败时用 openpyxl 重试
+      - usecols=[列名...]：只解析需要的列；文件中缺少的列忽略（调用方照常检查 df.columns）
+      - dtype：与 pandas 相同（str / {"列": str} 等）
+    source 可以是路径或 BytesIO。其余参数（sheet_name / nrows / header 等）原样传给 pandas。
+    """
+    import pandas as pd
+
+    usecols = _usecols_filter(usecols)
+    # 旁路文件只支持按列名筛选（usecols 为 None / 函数）和 nrows
+    if (prefer_sidecar and isinstance(source, (str, os.PathLike)) and set(kwargs) <= {"nrows"}
+            and (usecols is None or callable(usecols))):
+        side = fresh_sidecar(source)
+        if side:
+            try:
+                return read_sidecar(side, usecols=usecols, dtype=dtype, nrows=kwargs.get("nrows"))
+            except Exception as e:
+                print(f"[WARN] 读取旁路文件失败，改读 xlsx: {side}: {e}")
+
+    engine = engine or reader_engine()
+    try:
+        return pd.read_excel(source, usecols=usecols, dtype=dtype, engine=engine, **kwargs)
+    except Exception as e:
+        if engine == "openpyxl":
+            raise
+        # calamine 未安装 / 不支持的文件：回退 openpyxl（openpyxl 也失败时抛出它自己的异常）
+        print(f"[WARN] {engine} 读取失败，改用 openpyxl: {e}")
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return pd.read_excel(source, usecols=usecols, dtype=dtype, engine="openpyxl", **kwargs)
+
+
+def read_header(source, **kwargs) -> list[str]:
+    """只读取表头（列名去两侧空白）。"""
+    df = read_excel(source, nrows=0, **kwargs)
+    return [str(c).strip() for c in df.columns]
+
+
+def write_excel(df, path: str, index: bool = False, sidecar: bool = False, **kwargs) -> str:
+    """\
+    DataFrame 写 xlsx（统一入口）。返回 path。
+      - 行数 >= STREAMING_WRITE_ROWS 且没有额外参数时流式写出
+      - sidecar=True：再写一份列式旁路文件（SIDECAR_FORMAT），供下游 read_excel 优先读取；
+        sidecar=False 时删除同名的旧旁路文件，避免下游读到过期数据
+    """
+    if len(df) >= STREAMING_WRITE_ROWS and not index and not kwargs:
+        _write_xlsx_streaming(df, path)
+    else:
+        df.to_excel(path, index=index, **kwargs)
+
+    if sidecar and sidecar_format() != "off":
+        try:
+            write_sidecar(df, path)
+        except Exception as e:
+            print(f"[WARN] 写旁路文件失败（不影响 xlsx）: {e}")
+    else:
+        remove_sidecars(path)
+    return path
+
+
+def _write_xlsx_streaming(df, path: str) -> None:
+    """逐行写出 xlsx：优先 xlsxwriter constant_memory，没装则 openpyxl write_only。空值写成空单元格。"""
+    import pandas as pd
+
+    def rows():
+        for row in df.itertuples(index=False, name=None):
+            yield [None if pd.isna(v) else (v.item() if hasattr(v, "item") and not isinstance(v, str) else v) for v in row]
+
+    header = [str(c) for c in df.columns]
+    if importlib.util.find_spec("xlsxwriter") is not None:
+        import xlsxwriter
+
+        wb = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False})
+        ws = wb.add_worksheet("Sheet1")
+        ws.write_row(0, 0, header)
+        for r, values in enumerate(rows(), start=1):
+            ws.write_row(r, 0, values)
+        wb.close()
+        return
+
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(header)
+    for values in rows():
+        ws.append(values)
+    wb.save(path)
+
+
+# ======================== Streaming column reads ========================
+
+def _cell_text(v) -> str:
+    """单元格值 → 去空白文本，与 read_excel(dtype=str) 一致（1234.0 → "1234"，空 → ""）。"""
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v).strip()
+
+
+def _open_first_sheet(path: str):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    ws = wb.worksheets[0]
+    # 有些导出工具写的 dimension 不准（只写 A1），不重置会被截断成一行
+    ws.reset_dimensions()
+    return wb, ws
+
+
+def read_header_row(path: str) -> list[str]:
+    """用 openpyxl 只读模式读取第一个工作表的表头行（列名去两侧空白），不解析数据行。"""
+    wb, ws = _open_first_sheet(path)
+    try:
+        row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        return [_cell_text(v) for v in row]
+    finally:
+        wb.close()
+
+
+def iter_column(path: str, column):
+    """\
+    逐行产出第一个工作表中某一列的非空文本（openpyxl 只读模式，流式解析）。
+    内存占用与文件行数无关，适合几十万行的订单导出 / 链接表。
+      column：列名 / 列名列表（任一匹配，忽略两侧空白） / 从 0 开始的列号
+    找不到列时抛 KeyError。
+    """
+    wb, ws = _open_first_sheet(path)
+    try:
+        if isinstance(column, int):
+            idx = column
+        else:
+            names = {n.strip() for n in ([column] if isinstance(column, str) else column)}
+            header = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+            idx = next((i for i, h in enumerate(header) if _cell_text(h) in names), None)
+            if idx is None:
+                raise KeyError(f"工作簿缺少列: {'/'.join(sorted(names))}")
+        # 只取这一列的单元格（每行其余单元格解析后即丢弃）
+        for (v,) in ws.iter_rows(min_row=2, min_col=idx + 1, max_col=idx + 1, values_only=True):
+            text = _cell_text(v)
+            if text:
+                yield text
+    finally:
+        wb.close()
+
+
+# ======================== Columnar sidecars ========================
+
+def sidecar_format() -> str:
+    """实际使用的旁路文件格式：parquet / feather / csv / off。"""
+    if SIDECAR_FORMAT != "auto":
+        return SIDECAR_FORMAT
+    for mod in ("pyarrow", "fastparquet"):
+        if importlib.util.find_spec(mod) is not None:
+            return "parquet"
+    return "csv"
+
+
+def sidecar_paths(path: str) -> list[str]:
+    """path 旁边已存在的旁路文件（X.xlsx → X.parquet / X.feather / X.csv）。"""
+    base = os.path.splitext(path)[0]
+    return [base + ext for ext in SIDECAR_EXTS.values() if os.path.exists(base + ext)]
+
+
+def fresh_sidecar(path: str) -> str | None:
+    """不比 xlsx 旧的旁路文件（xlsx 被手工改过后旁路文件自动失效）；没有则返回 None。"""
+    try:
+        xlsx_mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    for side in sidecar_paths(path):
+        if os.path.getmtime(side) >= xlsx_mtime:
+            return side
+    return None
+
+
+def remove_sidecars(path: str) -> None:
+    for side in sidecar_paths(path):
+        try:
+            os.remove(side)
+        except OSError:
+            pass
+
+
+def move_sidecars(src: str, dst: str) -> None:
+    """xlsx 从 src 移到 dst 后，把它的旁路文件一起移过去（保持同名配对）。"""
+    dst_base = os.path.splitext(dst)[0]
+    for side in sidecar_paths(src):
+        try:
+            os.replace(side, dst_base + os.path.splitext(side)[1])
+        except OSError as e:
+            print(f"[WARN] 移动旁路文件失败: {side}: {e}")
+
+
+def write_sidecar(df, path: str, fmt: str | None = None) -> str:
+    """在 xlsx 旁边写列式旁路文件（先写临时文件再替换）。返回旁路文件路径。"""
+    fmt = fmt or sidecar_format()
+    side = os.path.splitext(path)[0] + SIDECAR_EXTS[fmt]
+    tmp = side + ".tmp"
+    out = df.reset_index(drop=True)
+    out.columns = [str(c) for c in out.columns]
+    if fmt == "parquet":
+        out.to_parquet(tmp, index=False)
+    elif fmt == "feather":
+        out.to_feather(tmp)
+    else:
+        typed = {c: str(t) for c, t in out.dtypes.items() if t.kind in "biufM"}
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(CSV_DTYPES_PREFIX + json.dumps(typed, ensure_ascii=False) + "\n")
+            out.to_csv(f, index=False)
+    os.replace(tmp, side)
+    # 保证旁路文件不比 xlsx 旧（同一秒内写出的文件系统时间精度问题）
+    st = os.stat(path)
+    if os.path.getmtime(side) < st.st_mtime:
+        os.utime(side, (st.st_atime, st.st_mtime))
+    return side
+
+
+def read_sidecar(side: str, usecols=None, dtype=None, nrows: int | None = None):
+    """读取旁路文件；usecols 为列名过滤函数（见 _usecols_filter），dtype / nrows 与 read_excel 相同。"""
+    import pandas as pd
+
+    ext = os.path.splitext(side)[1]
+    if ext == ".csv":
+        with open(side, "r", encoding="utf-8", newline="") as f:
+            first = f.readline()
+            typed = {}
+            if first.startswith(CSV_DTYPES_PREFIX):
+                typed = json.loads(first[len(CSV_DTYPES_PREFIX):])
+            else:
+                f.seek(0)
+            dates = [c for c, t in typed.items() if t.startswith("datetime") and (usecols is None or usecols(c))]
+            if dtype is None:
+                # 未记录类型的列都是文本，与 read_excel(dtype=str) 相同（空单元格为 NaN）
+                pos = f.tell()
+                header = next(csv.reader([f.readline()]))
+                f.seek(pos)
+                dtype = {c: typed.get(c, str) for c in header if c not in dates}
+            return pd.read_csv(f, usecols=usecols, nrows=nrows, dtype=dtype, parse_dates=dates or False)
+
+    df = pd.read_parquet(side) if ext == ".parquet" else pd.read_feather(side)
+    if usecols is not None:
+        df = df[[c for c in df.columns if usecols(c)]]
+    if nrows is not None:
+        df = df.head(nrows)
+    if dtype is not None:
+        df = df.astype(dtype)
+    return df
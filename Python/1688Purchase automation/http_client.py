@@ -0,0 +1,235 @@
+import os
+import time
+import atexit
+import random
+import threading
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import cassette
+import metrics
+from config import (
+    ALI_COOKIE_PATH,
+    DXM_COOKIE_PATH,
+    TIMEOUT,
+)
+
+
+# ======================== CONFIG ========================
+
+# 连接池：DXM 导出/审核/分页最多同时 4 个线程，1688 抓取 4 个线程；留足余量避免连接被丢弃重建
+POOL_CONNECTIONS = 8   # 缓存的 host 数
+POOL_MAXSIZE = 16      # 每个 host 保持的长连接数
+
+# (连接超时, 读取超时)：连接阶段卡住应尽快失败，读取沿用 config.py 的 TIMEOUT
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = TIMEOUT
+
+# 可重试请求遇到这些状态码 / 网络错误时，按带抖动的指数退避重试
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_BASE_SEC = 0.5
+BACKOFF_MAX_SEC = 8.0
+
+# 默认只有这些方法会自动重试；POST 需要调用方显式传 retry=True（只用于查询类接口）
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# 非空时所有请求改发到这个地址（只保留路径和查询参数），用于本地模拟服务 mock_server.py；
+# 也可以在运行时用 set_base_url() 设置
+BASE_URL_OVERRIDE = os.environ.get("AUTOMATION_BASE_URL", "").strip()
+
+# 录制 / 回放（见 cassette.py）：HTTP_CASSETTE_MODE=record|replay，HTTP_CASSETTE=cassette 文件
+# 录制时不指定文件则写入 cassettes/<脚本名>_<时间戳>.jsonl.gz
+CASSETTE_MODE = os.environ.get("HTTP_CASSETTE_MODE", "").strip().lower()
+CASSETTE_PATH = os.environ.get("HTTP_CASSETTE", "").strip()
+# HTTP_CASSETTE_LOOSE=1：回放时轮询接口（checkProcess）允许不完全匹配 / 重复最后一条记录
+CASSETTE_LOOSE = os.environ.get("HTTP_CASSETTE_LOOSE", "").strip().lower() in ("1", "true", "yes")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# kind -> (环境变量, 默认 Cookie 文件)
+COOKIE_SOURCES = {
+    "ali": ("ALI_COOKIE", [ALI_COOKIE_PATH]),
+    "dxm": ("DXM_COOKIE", [DXM_COOKIE_PATH]),
+}
+
+
+# ======================== Cookies ========================
+
+_cookie_cache: dict[tuple, str] = {}
+_cookie_lock = threading.Lock()
+
+
+def load_cookie(kind: str, extra_paths: list[str] | tuple = ()) -> str:
+    """\
+    读取 Cookie（每个进程每种 Cookie + extra_paths 组合只读一次）：
+      1. 环境变量（ALI_COOKIE / DXM_COOKIE）
+      2. extra_paths 中的文件（调用方自己的兼容路径）
+      3. config.py 中配置的 Cookie 文件
+    找不到时返回空字符串，由调用方决定如何报错。
+    """
+    # 不同调用方的兼容路径可能指向不同的 Cookie 文件，缓存键必须包含 extra_paths
+    key = (kind, tuple(extra_paths))
+    with _cookie_lock:
+        if key in _cookie_cache:
+            return _cookie_cache[key]
+
+        env_var, default_paths = COOKIE_SOURCES[kind]
+        ck = os.environ.get(env_var, "").strip()
+        if not ck:
+            for p in [*extra_paths, *default_paths]:
+                if p and os.path.exists(p):
+                    with open(p, "r", encoding="utf-8") as f:
+                        ck = f.read().strip()
+                    if ck:
+                        break
+        if ck:
+            _cookie_cache[key] = ck
+        return ck
+
+
+def clear_cookie_cache() -> None:
+    """更新 Cookie 文件后（长时间运行的进程中）强制下次重新读取。"""
+    with _cookie_lock:
+        _cookie_cache.clear()
+
+
+# ======================== Session ========================
+
+_cassette_lock = threading.Lock()
+_cassette_initialised = False
+
+
+def _init_cassette() -> None:
+    """第一次创建 Session 时按环境变量启用录制 / 回放（每个进程一次）。"""
+    global _cassette_initialised
+    with _cassette_lock:
+        if _cassette_initialised:
+            return
+        _cassette_initialised = True
+        if CASSETTE_MODE and cassette.active() is None:
+            cassette.use_cassette(CASSETTE_PATH or None, CASSETTE_MODE, loose=CASSETTE_LOOSE)
+            atexit.register(cassette.use_cassette, None, None)
+
+
+def pause(seconds: float) -> None:
+    """脚本中的轮询 / 限速等待：回放 cassette 时跳过，离线回放按 CPU 速度运行。"""
+    if seconds > 0 and not cassette.replaying():
+        time.sleep(seconds)
+
+
+def set_base_url(url: str | None) -> None:
+    """把之后的请求全部改发到 url（如 http://127.0.0.1:8780）；传 None / 空字符串恢复访问真实站点。"""
+    global BASE_URL_OVERRIDE
+    BASE_URL_OVERRIDE = (url or "").strip()
+
+
+def rewrite_url(url: str) -> str:
+    """设置了 BASE_URL_OVERRIDE 时，把 https://www.dianxiaomi.com/a/b?x=1 改成 <override>/a/b?x=1。"""
+    if not BASE_URL_OVERRIDE:
+        return url
+    parsed = urllib.parse.urlsplit(url)
+    base = urllib.parse.urlsplit(BASE_URL_OVERRIDE)
+    return urllib.parse.urlunsplit((base.scheme, base.netloc, parsed.path, parsed.query, parsed.fragment))
+
+
+def backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    """第 attempt 次重试前的等待时间：优先服从 Retry-After，否则 full jitter 指数退避。"""
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX_SEC, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * (2 ** attempt)))
+
+
+class RetryingSession(requests.Session):
+    """\
+    带连接池调优、默认超时和重试的 Session。
+
+    - 所有请求默认 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)，不会再无限挂起
+    - GET/HEAD/OPTIONS 默认重试；POST 只有 retry=True 时才重试（加购、导出、审核不是幂等请求）
+    - 连接超时（请求尚未发出）对所有方法都重试
+    - 每次尝试的耗时按端点计入 metrics 延迟直方图
+    - 设置了 BASE_URL_OVERRIDE 时请求改发到本地模拟服务（metrics 仍按原始 URL 归类）
+    - 录制模式下每个请求的最终响应写入 cassette；回放模式下直接返回 cassette 中的响应，不访问网络
+    """
+
+    def __init__(self, max_retries: int = MAX_RETRIES):
+        super().__init__()
+        self.max_retries = max_retries
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, retry: bool | None = None, **kwargs):
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+
+        tape = cassette.active()
+        t0 = time.perf_counter()
+        if tape is not None and tape.mode == "replay":
+            try:
+                resp = tape.play(method, url, kwargs)
+            except requests.RequestException:
+                metrics.observe_http(url, time.perf_counter() - t0, "error")
+                raise
+            metrics.observe_http(url, time.perf_counter() - t0, resp.status_code)
+            return resp
+        if tape is None:
+            return self._request_with_retries(method, url, retry, *args, **kwargs)
+
+        try:
+            resp = self._request_with_retries(method, url, retry, *args, **kwargs)
+        except requests.RequestException as e:
+            tape.record(method, url, kwargs, error=e, seconds=time.perf_counter() - t0)
+            raise
+        tape.record(method, url, kwargs, resp=resp, seconds=time.perf_counter() - t0)
+        return resp
+
+    def _request_with_retries(self, method, url, retry: bool, *args, **kwargs):
+        target = rewrite_url(url)
+
+        attempt = 0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                resp = super().request(method, target, *args, **kwargs)
+            except requests.ConnectTimeout as e:
+                metrics.observe_http(url, time.perf_counter() - t0, "error")
+                err = e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.observe_http(url, time.perf_counter() - t0, "error")
+                if not retry:
+                    raise
+                err = e
+            else:
+                metrics.observe_http(url, time.perf_counter() - t0, resp.status_code)
+                if not retry or resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return resp
+                delay = backoff_delay(attempt, resp.headers.get("Retry-After"))
+                print(f"[HTTP] {method} {_short(url)} -> {resp.status_code}，{delay:.1f}s 后重试 ({attempt + 1}/{self.max_retries})")
+                resp.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if attempt >= self.max_retries:
+                raise err
+            delay = backoff_delay(attempt)
+            print(f"[HTTP] {method} {_short(url)} 网络错误: {err}，{delay:.1f}s 后重试 ({attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+            attempt += 1
+
+
+def _short(url: str) -> str:
+    return url.split("?", 1)[0]
+
+
+def make_session(max_retries: int = MAX_RETRIES) -> RetryingSession:
+    """DXM / 1688 脚本统一用这个创建 Session。"""
+    _init_cassette()
+    return RetryingSession(max_retries=max_retries)
@@ -0,0 +1,395 @@
+import os
+import json
+import time
+import threading
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import (
+    MAPPING_PATH,
+    MAPPING_SERVICE_HOST,
+    MAPPING_SERVICE_PORT,
+    MAPPING_SERVICE_URL,
+)
+
+
+# ======================== CONFIG ========================
+
+KEY_COL = "商品選項貨號"
+KEY_COL_ALIASES = ["商品選項貨號", "商品选項貨號", "商品选项货号"]
+
+# 映射行必须有这些列才能加购；缺任意一个的行在覆盖检查中按“缺映射”处理
+REQUIRED_MAPPING_COLS = ("商品链接", "Spec ID")
+
+# 轮询 Mapping_Data.xlsx 修改时间的间隔（秒）；文件变化后自动重新加载
+WATCH_INTERVAL_SEC = 2.0
+
+# 客户端查询超时：服务没开时要尽快回退到直接读 xlsx
+CLIENT_TIMEOUT_SEC = 0.5
+
+# 允许跨域访问的页面（Tampermonkey 助手以 @grant none 运行时走页面 fetch，需要 CORS）
+ALLOWED_ORIGINS = (
+    "https://www.bigseller.pro",
+    "https://www.dianxiaomi.com",
+    "https://detail.1688.com",
+    "https://cart.1688.com",
+)
+
+# 写接口（POST）的共享口令：设置环境变量 MAPPING_SERVICE_TOKEN 后，请求头必须带 X-Mapping-Token
+# 留空则只校验 Origin + Content-Type（非 JSON 的 POST 一律拒绝，浏览器跨域必须先走预检）
+MAPPING_SERVICE_TOKEN = os.environ.get("MAPPING_SERVICE_TOKEN", "")
+TOKEN_HEADER = "X-Mapping-Token"
+
+
+def normalize_key(v) -> str:
+    """与 add_to_cart_http_1688 一致：SKU 去空白 + 大写。"""
+    if v is None:
+        return ""
+    s = str(v).strip()
+    if s.lower() in ("nan", "none"):
+        return ""
+    return s.upper()
+
+
+def is_complete_mapping(row: dict) -> bool:
+    """映射行是否可用于加购：REQUIRED_MAPPING_COLS 都非空。"""
+    return all(normalize_key(row.get(c)) for c in REQUIRED_MAPPING_COLS)
+
+
+def load_mapping_keys(path: str, complete_only: bool = False) -> set[str]:
+    """\
+    只读取 商品選項貨號 一列，返回归一化后的 SKU 集合（用于快速覆盖检查）。
+    complete_only=True 时额外读取 REQUIRED_MAPPING_COLS，只返回这些列都非空的 SKU。
+    """
+    from excel_io import read_excel, read_header
+
+    header = read_header(path)
+    key_col = next((c for c in KEY_COL_ALIASES if c in header), None)
+    if key_col is None:
+        raise KeyError(f"Mapping_Data 中未找到 '{KEY_COL}' 这一列")
+    if not complete_only:
+        col = read_excel(path, usecols=[key_col], dtype=str).iloc[:, 0]
+        return {k for k in col.map(normalize_key) if k}
+
+    # 表里根本没有的必需列视为全空：所有行都不完整
+    if any(c not in header for c in REQUIRED_MAPPING_COLS):
+        return set()
+    df = read_excel(path, usecols=[key_col, *REQUIRED_MAPPING_COLS], dtype=str)
+    keys = df[key_col].map(normalize_key)
+    ok = keys.astype(bool)
+    for c in REQUIRED_MAPPING_COLS:
+        ok &= df[c].map(normalize_key).astype(bool)
+    return set(keys[ok])
+
+
+# ======================== In-memory index ========================
+
+class MappingIndex:
+    """Mapping_Data.xlsx 的内存索引：大写 SKU -> 整行（全部列，字符串）。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.columns: list[str] = []
+        self.rows: dict[str, dict] = {}
+        self.mtime = 0.0
+        self.loaded_at = 0.0
+        self._lock = threading.RLock()
+
+    def load(self) -> None:
+        from excel_io import read_excel
+
+        mtime = os.path.getmtime(self.path)
+        t0 = time.perf_counter()
+        df = read_excel(self.path, dtype=str).fillna("")
+
+        key_col = next((c for c in KEY_COL_ALIASES if c in df.columns), None)
+        if key_col is None:
+            raise KeyError(f"Mapping_Data 中未找到 '{KEY_COL}' 这一列")
+        if key_col != KEY_COL:
+            df = df.rename(columns={key_col: KEY_COL})
+
+        rows: dict[str, dict] = {}
+        for rec in df.to_dict(orient="records"):
+            k = normalize_key(rec.get(KEY_COL))
+            if k and k not in rows:  # 与 merge 行为一致：重复键以第一行为准
+                rows[k] = {c: str(v).strip() for c, v in rec.items()}
+
+        with self._lock:
+            self.columns = [str(c) for c in df.columns]
+            self.rows = rows
+            self.mtime = mtime
+            self.loaded_at = time.time()
+        print(f"[INFO] 已加载 Mapping_Data: {len(rows)} 个 SKU，用时 {time.perf_counter() - t0:.2f}s")
+
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        print("[INFO] 检测到 Mapping_Data.xlsx 已修改，重新加载...")
+        self.load()
+        return True
+
+    def lookup(self, skus: list) -> tuple[dict, list]:
+        found: dict[str, dict] = {}
+        missing: list[str] = []
+        with self._lock:
+            for sku in skus:
+                k = normalize_key(sku)
+                if not k:
+                    continue
+                row = self.rows.get(k)
+                if row is None:
+                    missing.append(k)
+                else:
+                    found[k] = row
+        return found, missing
+
+    def upsert(self, rows: list[dict], overwrite: bool = False) -> dict:
+        """
+        把 rows 写入 Mapping_Data.xlsx（新 SKU 追加到末尾；已存在的 SKU 仅在 overwrite=True 时更新）。
+        写入后立即刷新内存索引。
+        """
+        import pandas as pd
+        from excel_io import read_excel, write_excel
+
+        with self._lock:
+            df = read_excel(self.path)
+            key_col = next((c for c in KEY_COL_ALIASES if c in df.columns), KEY_COL)
+            keys = df[key_col].map(normalize_key) if key_col in df.columns else pd.Series(dtype=str)
+            pos = {k: i for i, k in reversed(list(enumerate(keys))) if k}
+
+            added, updated, skipped = 0, 0, 0
+            new_rows: list[dict] = []
+            batch_keys: set[str] = set()
+            for r in rows:
+                r = {(key_col if c in KEY_COL_ALIASES else c): v for c, v in r.items()}
+                k = normalize_key(r.get(key_col))
+                if not k or k in batch_keys:
+                    # 空键 / 同一批内重复的 SKU 只处理第一次
+                    skipped += 1
+                    continue
+                batch_keys.add(k)
+                if k in pos:
+                    if not overwrite:
+                        skipped += 1
+                        continue
+                    i = df.index[pos[k]]
+                    for c, v in r.items():
+                        if c == key_col:
+                            continue
+                        if c not in df.columns:
+                            df[c] = ""
+                        df[c] = df[c].astype(object)
+                        df.at[i, c] = v
+                    updated += 1
+                else:
+                    new_rows.append(r)
+                    added += 1
+
+            if new_rows:
+                add_df = pd.DataFrame(new_rows).reindex(columns=df.columns, fill_value="")
+                df = pd.concat([df, add_df], ignore_index=True)
+
+            if added or updated:
+                write_excel(df, self.path)
+                self.load()
+
+        return {"added": added, "updated": updated, "skipped": skipped}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ok": True,
+                "path": self.path,
+                "rows": len(self.rows),
+                "columns": self.columns,
+                "mtime": self.mtime,
+                "loaded_at": self.loaded_at,
+            }
+
+
+# ======================== HTTP server ========================
+
+def make_handler(index: MappingIndex):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_cors(self) -> None:
+            # 只对白名单页面放行，其它网页无法读写本机的 Mapping
+            origin = self.headers.get("Origin", "")
+            if origin in ALLOWED_ORIGINS:
+                self.send_header("Access-Control-Allow-Origin", origin)
+                self.send_header("Vary", "Origin")
+
+        def _origin_allowed(self) -> bool:
+            # 没有 Origin 的是本机脚本（urllib/requests）；带 Origin 的必须在白名单里
+            origin = self.headers.get("Origin")
+            return not origin or origin in ALLOWED_ORIGINS
+
+        def _check_post(self) -> bool:
+            """写请求的准入检查；不通过时已回写错误响应，返回 False。"""
+            if not self._origin_allowed():
+                self._send_json(403, {"error": "origin not allowed"})
+                return False
+            ctype = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+            if ctype != "application/json":
+                # text/plain、表单等“简单请求”不触发 CORS 预检，任意网页都能发过来
+                self._send_json(415, {"error": "Content-Type must be application/json"})
+                return False
+            if MAPPING_SERVICE_TOKEN and self.headers.get(TOKEN_HEADER) != MAPPING_SERVICE_TOKEN:
+                self._send_json(401, {"error": f"missing or invalid {TOKEN_HEADER}"})
+                return False
+            return True
+
+        def _send_json(self, code: int, obj) -> None:
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self._send_cors()
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            n = int(self.headers.get("Content-Length") or 0)
+            if n <= 0:
+                return {}
+            return json.loads(self.rfile.read(n).decode("utf-8"))
+
+        def do_OPTIONS(self):
+            if not self._origin_allowed():
+                self._send_json(403, {"error": "origin not allowed"})
+                return
+            self.send_response(204)
+            self._send_cors()
+            self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+            self.send_header("Access-Control-Allow-Headers", f"Content-Type, {TOKEN_HEADER}")
+            self.end_headers()
+
+        def do_GET(self):
+            if not self._origin_allowed():
+                self._send_json(403, {"error": "origin not allowed"})
+                return
+            parsed = urllib.parse.urlparse(self.path)
+            if parsed.path == "/health":
+                self._send_json(200, index.stats())
+            elif parsed.path == "/lookup":
+                skus = urllib.parse.parse_qs(parsed.query).get("sku", [])
+                found, missing = index.lookup(skus)
+                self._send_json(200, {"found": found, "missing": missing})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if not self._check_post():
+                return
+            try:
+                payload = self._read_json()
+            except Exception as e:
+                self._send_json(400, {"error": f"invalid JSON: {e}"})
+                return
+
+            try:
+                if self.path == "/lookup":
+                    found, missing = index.lookup(payload.get("skus") or [])
+                    self._send_json(200, {"found": found, "missing": missing})
+                elif self.path == "/upsert":
+                    result = index.upsert(payload.get("rows") or [], bool(payload.get("overwrite")))
+                    self._send_json(200, result)
+                elif self.path == "/reload":
+                    index.load()
+                    self._send_json(200, index.stats())
+                else:
+                    self._send_json(404, {"error": "not found"})
+            except PermissionError as e:
+                # Windows 下 Excel 打开文件时会锁定，写入失败
+                self._send_json(409, {"error": f"Mapping_Data.xlsx 被占用: {e}"})
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+
+        def log_message(self, fmt, *args):
+            # 查询量大时不刷屏
+            pass
+
+    return Handler
+
+
+def _watch_loop(index: MappingIndex, stop: threading.Event) -> None:
+    while not stop.wait(WATCH_INTERVAL_SEC):
+        try:
+            index.reload_if_changed()
+        except Exception as e:
+            print("[WARN] 重新加载 Mapping_Data 失败（保留旧索引）:", e)
+
+
+def serve(host: str = MAPPING_SERVICE_HOST, port: int = MAPPING_SERVICE_PORT) -> None:
+    index = MappingIndex(MAPPING_PATH)
+    index.load()
+
+    stop = threading.Event()
+    watcher = threading.Thread(target=_watch_loop, args=(index, stop), daemon=True)
+    watcher.start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(index))
+    print(f"[INFO] Mapping 服务已启动: http://{host}:{port}  (Ctrl+C 退出)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] 正在停止 Mapping 服务...")
+    finally:
+        stop.set()
+        server.server_close()
+
+
+# ======================== Client helpers ========================
+
+def _client_headers() -> dict:
+    headers = {"Content-Type": "application/json"}
+    if MAPPING_SERVICE_TOKEN:
+        headers[TOKEN_HEADER] = MAPPING_SERVICE_TOKEN
+    return headers
+
+
+def _post_json(path: str, payload: dict, timeout: float = CLIENT_TIMEOUT_SEC) -> dict:
+    req = urllib.request.Request(
+        MAPPING_SERVICE_URL + path,
+        data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+        headers=_client_headers(),
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def lookup_skus(skus: list) -> dict | None:
+    """
+    向本地 Mapping 服务批量查询，返回 {大写 SKU: 行}。
+    服务未启动 / 出错时返回 None，调用方应回退到直接读取 Mapping_Data.xlsx。
+    """
+    try:
+        return _post_json("/lookup", {"skus": list(skus)}).get("found", {})
+    except Exception:
+        return None
+
+
+def upsert_rows(rows: list[dict], overwrite: bool = False) -> dict | None:
+    """通过服务写入映射行；服务未启动时返回 None。"""
+    try:
+        return _post_json("/upsert", {"rows": rows, "overwrite": overwrite}, timeout=60)
+    except Exception:
+        return None
+
+
+def notify_reload() -> bool:
+    """Mapping_Data.xlsx 被其它脚本改写后，通知服务立即重新加载（服务未启动时静默忽略）。"""
+    try:
+        _post_json("/reload", {}, timeout=60)
+        return True
+    except Exception:
+        return False
+
+
+if __name__ == "__main__":
+    serve()
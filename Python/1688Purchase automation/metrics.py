@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+# ======================== CONFIG ========================
+
+WORK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 每次运行一个 JSONL 文件：metrics/<run>_<时间戳>.jsonl（--profile 时旁边再放 .prof / .tracemalloc.txt）
+METRICS_DIR = os.path.join(WORK_DIR, "metrics")
+
+# 延迟直方图桶上界（毫秒），最后一个桶是 +inf
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000]
+
+# tracemalloc 报告中列出的分配位置数
+TRACEMALLOC_TOP = 30
+
+
+# ======================== State ========================
+
+_lock = threading.Lock()
+_timers: dict[str, dict] = {}
+_http: dict[str, dict] = {}
+_run: dict | None = None
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _emit(record: dict) -> None:
+    """运行已开始时把一条记录追加到本次的 JSONL 文件；否则只在内存中汇总。"""
+    run = _run
+    if run is None:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _lock:
+        with open(run["path"], "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# ======================== Timers ========================
+
+def record(name: str, seconds: float, **fields) -> None:
+    """记录一段耗时（阶段计时 / 等待时间），按名称汇总 count / total / max。"""
+    with _lock:
+        t = _timers.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        t["count"] += 1
+        t["total"] += seconds
+        t["max"] = max(t["max"], seconds)
+    _emit({"type": "timer", "name": name, "seconds": round(seconds, 6), "at": _now(), **fields})
+
+
+@contextmanager
+def timer(name: str, **fields):
+    """with metrics.timer("cart.read_excel"): ...  异常时同样记录耗时（ok=False）。"""
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record(name, time.perf_counter() - t0, ok=ok, **fields)
+
+
+# ======================== HTTP latency ========================
+
+def endpoint_label(url: str) -> str:
+    """把 URL 归类为端点名：1688 商品详情页统一为 detail，其余取路径最后一段（如 list.json）。"""
+    from urllib.parse import urlparse
+
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    if host.startswith("detail.1688.com"):
+        return "detail"
+    name = parsed.path.rstrip("/").rsplit("/", 1)[-1]
+    if name.lower().endswith((".xlsx", ".xls")):
+        return "download"
+    return name or host
+
+
+def observe_http(url: str, seconds: float, status) -> None:
+    """记录一次 HTTP 请求（每次重试单独计一次）的耗时，放入该端点的直方图。"""
+    label = endpoint_label(url)
+    ms = seconds * 1000
+    with _lock:
+        h = _http.get(label)
+        if h is None:
+            h = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0,
+                 "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1), "samples": []}
+            _http[label] = h
+        h["count"] += 1
+        h["total_ms"] += ms
+        h["max_ms"] = max(h["max_ms"], ms)
+        if not isinstance(status, int) or status >= 400:
+            h["errors"] += 1
+        h["buckets"][bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        h["samples"].append(ms)
+
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+def http_summary() -> dict[str, dict]:
+    with _lock:
+        out = {}
+        for label, h in _http.items():
+            vals = sorted(h["samples"])
+            out[label] = {
+                "count": h["count"],
+                "errors": h["errors"],
+                "mean_ms": round(h["total_ms"] / h["count"], 1),
+                "p50_ms": round(_percentile(vals, 0.50), 1),
+                "p95_ms": round(_percentile(vals, 0.95), 1),
+                "max_ms": round(h["max_ms"], 1),
+                "buckets_ms": dict(zip([*map(str, LATENCY_BUCKETS_MS), "inf"], h["buckets"])),
+            }
+        return out
+
+
+def timer_summary() -> dict[str, dict]:
+    with _lock:
+        return {
+            name: {"count": t["count"], "total_s": round(t["total"], 3), "max_s": round(t["max"], 3)}
+            for name, t in _timers.items()
+        }
+
+
+# ======================== Memory ========================
+
+def peak_memory_mb() -> float | None:
+    """\
+    进程峰值内存（MB）：POSIX 用 resource 的 ru_maxrss，Windows 用 psutil 的 peak working set。
+    拿不到真正的峰值时返回 None（不用当前 RSS 冒充峰值）。
+    """
+    try:
+        import resource
+
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位是 KB，macOS 是字节
+        return round(kb / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return round(peak / 1024 / 1024, 1) if peak else None
+    except ImportError:
+        return None
+
+
+# ======================== Run lifecycle ========================
+
+def start_run(name: str, profile: bool = False) -> str:
+    """\
+    开始记录本次运行：之后的计时 / HTTP 记录逐条写入 metrics/<name>_<ts>.jsonl，
+    进程退出（或调用 finish_run）时追加汇总。profile=True 时同时启用 cProfile + tracemalloc。
+    返回 JSONL 路径。
+    """
+    global _run
+    if _run is not None:
+        return _run["path"]
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(METRICS_DIR, f"{name}_{ts}")
+    run = {"name": name, "path": base + ".jsonl", "base": base, "t0": time.perf_counter(), "profiler": None}
+
+    if profile:
+        import cProfile
+        import tracemalloc
+
+        tracemalloc.start()
+        run["profiler"] = cProfile.Profile()
+        run["profiler"].enable()
+
+    _run = run
+    _emit({"type": "run_start", "name": name, "at": _now(), "argv": sys.argv, "pid": os.getpid(), "profile": profile})
+    atexit.register(finish_run)
+    print(f"[INFO] 性能指标将写入: {run['path']}")
+    return run["path"]
+
+
+def start_run_from_argv(name: str) -> str:
+    """从 sys.argv 中取出 --profile（以免干扰脚本自己的参数解析），然后 start_run。"""
+    profile = "--profile" in sys.argv
+    if profile:
+        sys.argv[:] = [a for a in sys.argv if a != "--profile"]
+    return start_run(name, profile=profile)
+
+
+def finish_run() -> None:
+    """写入计时 / HTTP 直方图 / 峰值内存汇总；--profile 时导出 cProfile 与 tracemalloc 报告。"""
+    global _run
+    run = _run
+    if run is None:
+        return
+
+    profiler = run["profiler"]
+    if profiler is not None:
+        import pstats
+        import tracemalloc
+
+        profiler.disable()
+        profiler.dump_stats(run["base"] + ".prof")
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(run["base"] + ".tracemalloc.txt", "w", encoding="utf-8") as f:
+            f.write(f"traced current={current / 1024 / 1024:.1f} MB, peak={peak / 1024 / 1024:.1f} MB\n\n")
+            for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]:
+                f.write(f"{stat}\n")
+        with open(run["base"] + ".pstats.txt", "w", encoding="utf-8") as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+
+    for name, t in timer_summary().items():
+        _emit({"type": "timer_summary", "name": name, **t})
+    for label, h in http_summary().items():
+        _emit({"type": "http_summary", "endpoint": label, **h})
+    _emit({
+        "type": "run_end",
+        "name": run["name"],
+        "at": _now(),
+        "wall_s": round(time.perf_counter() - run["t0"], 3),
+        "peak_memory_mb": peak_memory_mb(),
+    })
+    _run = None
+
+    print(f"[INFO] 性能指标已写入: {run['path']}")
+    if profiler is not None:
+        print(f"[INFO] cProfile / tracemalloc 报告: {run['base']}.prof / .pstats.txt / .tracemalloc.txt")
@@ -0,0 +1,509 @@
+"""Local stand-in for the 1688 and Dianxiaomi endpoints used by the automation scripts.
+
+Start it, then point the shared HTTP client at it:
+
+    python mock_server.py --profile realistic --packages 500
+    set AUTOMATION_BASE_URL=http://127.0.0.1:8780      (Windows)
+    python DXM_export_and_audit.py
+
+Emulated endpoints (routed by path, so any host works):
+
+    POST /api/package/list.json          待审核包裹分页（支持 orderId / startTime 过滤）
+    POST /order/exportPickData.json      创建导出任务，返回 uuid
+    POST /checkProcess.json              导出进度；完成后 msg 为下载链接
+    GET  /download/<uuid>.xlsx           拣货单 xlsx
+    POST /api/package/batchAudit.json    审核：包裹离开【待审核】
+    GET  /offer/<offerId>.html           1688 商品详情页（含 skuModel / companyName）
+    POST /ajax/safe/add_to_cart_list_new.jsx
+    POST /ajax/purchaseRender.jsx
+    GET  /__stats                        每个端点的请求数 / 注入的错误与限流次数
+
+Latency, error and throttling behaviour come from PROFILES (or the command-line overrides).
+Only synthetic data is served; nothing is sent to DXM or 1688.
+
+The list.json package rows use the same field names the scripts read
+(productList / productSku / productCount / orderPayTime / totalSize), and those
+names are partly guesses rather than captured DXM responses. A wrong guess is
+copied here too, so the end-to-end benchmark cannot catch it: check field names
+against a recorded cassette (cassette.py) of the real site.
+"""
+
+import io
+import json
+import time
+import uuid
+import random
+import threading
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ======================== CONFIG ========================
+
+MOCK_HOST = "127.0.0.1"
+MOCK_PORT = 8780  # 8765 已被 mapping_service.py 使用
+
+# latency_ms + [0, jitter_ms) 随机抖动；endpoint_latency_ms 按端点覆盖 latency_ms
+# error_rate：按概率返回 error_statuses 中的一个状态码
+# throttle_rps：所有端点合计每秒超过这个请求数时返回 429 + Retry-After（0 = 不限流）
+# export_ms：exportPickData 任务从创建到 checkProcess 返回下载链接的时间
+PROFILES = {
+    "fast": {
+        "latency_ms": 0, "jitter_ms": 0, "endpoint_latency_ms": {},
+        "error_rate": 0.0, "error_statuses": [503], "throttle_rps": 0, "export_ms": 0,
+    },
+    "realistic": {
+        "latency_ms": 120, "jitter_ms": 80,
+        "endpoint_latency_ms": {
+            "list.json": 350, "exportPickData.json": 500, "checkProcess.json": 80,
+            "batchAudit.json": 600, "detail": 400, "add_to_cart_list_new.jsx": 250, "download": 200,
+        },
+        "error_rate": 0.0, "error_statuses": [503], "throttle_rps": 0, "export_ms": 3000,
+    },
+    "flaky": {
+        "latency_ms": 120, "jitter_ms": 200, "endpoint_latency_ms": {},
+        "error_rate": 0.05, "error_statuses": [500, 502, 503], "throttle_rps": 0, "export_ms": 1500,
+    },
+    "throttled": {
+        "latency_ms": 30, "jitter_ms": 20, "endpoint_latency_ms": {},
+        "error_rate": 0.0, "error_statuses": [503], "throttle_rps": 10, "export_ms": 500,
+    },
+}
+
+DEFAULT_PACKAGES = 200
+DEFAULT_SKUS = 120
+SKUS_PER_OFFER = 4          # 每个模拟商品详情页包含的 SKU 数
+ITEMS_PER_PACKAGE = (1, 3)  # 每个包裹的商品行数范围
+ADD_TO_CART_FAIL_RATE = 0.0  # add_to_cart 返回 success=false 的概率（业务失败，不是 HTTP 错误）
+
+
+# ======================== Synthetic data ========================
+
+def mock_sku(i: int) -> str:
+    return f"MOCK-{i:05d}"
+
+
+def mock_offer_id(sku_index: int) -> str:
+    return str(600000000000 + sku_index // SKUS_PER_OFFER)
+
+
+def mock_spec_id(sku_index: int) -> str:
+    return f"{sku_index:08x}spec"
+
+
+def mock_detail_url(sku_index: int) -> str:
+    return f"https://detail.1688.com/offer/{mock_offer_id(sku_index)}.html"
+
+
+class MockState:
+    """模拟服务的全部数据：待审核包裹、导出任务、加购计数。所有方法线程安全。"""
+
+    def __init__(self, packages: int = DEFAULT_PACKAGES, skus: int = DEFAULT_SKUS, seed: int = 7):
+        rnd = random.Random(seed)
+        self.n_skus = skus
+        self.lock = threading.Lock()
+        base_ms = int(time.time() * 1000) - packages * 60_000
+        self.pending: dict[str, dict] = {}
+        for i in range(packages):
+            pkg = str(900000000 + i)
+            items = [
+                {"productSku": mock_sku(rnd.randrange(skus)), "productCount": rnd.randint(1, 5)}
+                for _ in range(rnd.randint(*ITEMS_PER_PACKAGE))
+            ]
+            # 字段名与脚本读取的一致（部分是推测的，不能用来验证真实 DXM 的字段名）
+            self.pending[pkg] = {
+                "id": int(pkg),
+                "idStr": pkg,
+                "orderId": f"MOCK-ORDER-{i:06d}",
+                "orderPayTime": base_ms + i * 60_000,
+                "productList": items,
+            }
+        self.exports: dict[str, dict] = {}
+        self.audited: set[str] = set()
+        self.cart_adds = 0
+        self.cart_units = 0
+
+    # ---------- DXM ----------
+
+    def list_page(self, form: dict) -> dict:
+        page_no = max(1, int(form.get("pageNo") or 1))
+        page_size = max(1, int(form.get("pageSize") or 100))
+        order_id = (form.get("orderId") or "").strip()
+        start_time = (form.get("startTime") or "").strip()
+        since_ms = None
+        if start_time:
+            since_ms = int(time.mktime(time.strptime(start_time[:19], "%Y-%m-%d %H:%M:%S")) * 1000)
+
+        with self.lock:
+            rows = sorted(self.pending.values(), key=lambda r: r["orderPayTime"])
+        if order_id:
+            rows = [r for r in rows if r["orderId"] == order_id]
+        if since_ms is not None:
+            rows = [r for r in rows if r["orderPayTime"] >= since_ms]
+
+        start = (page_no - 1) * page_size
+        total = len(rows)
+        return {
+            "code": 0,
+            "data": {"page": {
+                "list": rows[start:start + page_size],
+                "totalSize": total,
+                "totalPage": (total + page_size - 1) // page_size,
+                "pageNo": page_no,
+                "pageSize": page_size,
+            }},
+        }
+
+    def create_export(self, package_ids: list[str]) -> str:
+        task = uuid.uuid4().hex
+        with self.lock:
+            self.exports[task] = {"package_ids": package_ids, "created": time.monotonic(), "xlsx": None}
+        return task
+
+    def export_progress(self, task: str, export_ms: float) -> dict:
+        with self.lock:
+            job = self.exports.get(task)
+        if job is None:
+            return {"processMsg": {"code": -1, "msg": "任务不存在"}}
+        total = len(job["package_ids"])
+        frac = 1.0 if export_ms <= 0 else min(1.0, (time.monotonic() - job["created"]) * 1000 / export_ms)
+        if frac < 1.0:
+            return {"processMsg": {"code": 0, "num": int(total * frac), "totalNum": total, "msg": "导出中"}}
+        return {"processMsg": {"code": 1, "num": total, "totalNum": total, "msg": f"/download/{task}.xlsx"}}
+
+    def export_xlsx(self, task: str) -> bytes | None:
+        with self.lock:
+            job = self.exports.get(task)
+            if job is None:
+                return None
+            if job["xlsx"] is not None:
+                return job["xlsx"]
+            packages = [self.pending.get(p) for p in job["package_ids"]]
+
+        import pandas as pd
+
+        rows = []
+        for pkg in packages:
+            if pkg is None:
+                continue
+            for it in pkg["productList"]:
+                sku = it["productSku"]
+                rows.append({
+                    "仓库": "默认仓库",
+                    "SKU": sku,
+                    "商品编码": sku.replace("MOCK", "P"),
+                    "名称": f"模拟商品 {sku}",
+                    "货架位": f"A-{int(sku[-5:]) % 99 + 1:02d}",
+                    "数量": it["productCount"],
+                    "拣货备注": "",
+                    "客服备注": "",
+                })
+        buf = io.BytesIO()
+        pd.DataFrame(rows, columns=["仓库", "SKU", "商品编码", "名称", "货架位", "数量", "拣货备注", "客服备注"]).to_excel(buf, index=False)
+        content = buf.getvalue()
+        with self.lock:
+            job["xlsx"] = content
+        return content
+
+    def audit(self, package_ids: list[str]) -> dict:
+        with self.lock:
+            for p in package_ids:
+                if self.pending.pop(p, None) is not None:
+                    self.audited.add(p)
+        return {"code": 0, "msg": "审核成功"}
+
+    # ---------- 1688 ----------
+
+    def detail_html(self, offer_id: str) -> str | None:
+        try:
+            first = (int(offer_id) - 600000000000) * SKUS_PER_OFFER
+        except ValueError:
+            return None
+        if first < 0 or first >= self.n_skus:
+            return None
+        sku_map = {}
+        for i in range(first, min(first + SKUS_PER_OFFER, self.n_skus)):
+            sku_map[f"颜色{i % SKUS_PER_OFFER}"] = {
+                "skuId": str(5000000000 + i),
+                "specId": mock_spec_id(i),
+                "specAttrs": [{"value": f"颜色{i % SKUS_PER_OFFER}"}, {"value": "均码"}],
+            }
+        model = json.dumps({"skuInfoMap": sku_map}, ensure_ascii=False)
+        return (
+            "<html><head><title>模拟商品</title></head><body><script>\n"
+            f"window.__INIT_DATA = {{\"companyName\":\"模拟店铺{int(offer_id) % 50:02d}\"}};\n"
+            f"var iDetailData = {{ skuModel: {model} }};\n"
+            "</script></body></html>"
+        )
+
+    def add_to_cart(self, form: dict) -> dict:
+        qty = 0
+        try:
+            specs = json.loads(form.get("specData") or "[]")
+            qty = sum(int(float(s.get("amount") or 0)) for s in specs if isinstance(s, dict))
+        except (ValueError, TypeError):
+            pass
+        if not form.get("cargoIdentity") or not qty:
+            return {"success": False, "errorMsg": "缺少 cargoIdentity / specData"}
+        if ADD_TO_CART_FAIL_RATE and random.random() < ADD_TO_CART_FAIL_RATE:
+            return {"success": False, "errorMsg": "模拟失败"}
+        with self.lock:
+            self.cart_adds += 1
+            self.cart_units += qty
+        return {"success": True}
+
+    def seed_mapping_rows(self) -> list[dict]:
+        """与模拟详情页一致的 Mapping_Data 行，供 benchmark 在沙箱中生成 Mapping_Data.xlsx。"""
+        return [
+            {
+                "商品選項貨號": mock_sku(i),
+                "商品链接": mock_detail_url(i),
+                "商品ID": mock_offer_id(i),
+                "属性SKU": f"颜色{i % SKUS_PER_OFFER}-均码",
+                "SKU ID": str(5000000000 + i),
+                "Spec ID": mock_spec_id(i),
+                "主供应商": f"模拟店铺{int(mock_offer_id(i)) % 50:02d}",
+            }
+            for i in range(self.n_skus)
+        ]
+
+
+# ======================== HTTP ========================
+
+def endpoint_of(path: str) -> str:
+    """与 metrics.endpoint_label 相同的端点命名：详情页为 detail，xlsx 下载为 download。"""
+    if path.startswith("/offer/"):
+        return "detail"
+    name = path.rstrip("/").rsplit("/", 1)[-1]
+    if name.endswith(".xlsx"):
+        return "download"
+    return name
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockDXM1688/1.0"
+    protocol_version = "HTTP/1.1"  # keep-alive，和真实站点一样复用连接
+    disable_nagle_algorithm = True  # 响应头和正文分两次写，否则 keep-alive 下每个请求多等 ~40ms（延迟 ACK）
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    # ---------- helpers ----------
+
+    def _send(self, status: int, body: bytes, content_type: str, extra_headers: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, obj, status: int = 200):
+        self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"), "application/json;charset=UTF-8")
+
+    def _form(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8") if length else ""
+        return {k: v[0] for k, v in urllib.parse.parse_qs(raw, keep_blank_values=True).items()}
+
+    def _inject(self, endpoint: str) -> bool:
+        """按 profile 注入延迟 / 限流 / 错误；已经发出响应时返回 True。"""
+        srv = self.server
+        prof = srv.profile
+        srv.count(endpoint, "requests")
+
+        latency = prof["endpoint_latency_ms"].get(endpoint, prof["latency_ms"])
+        jitter = prof["jitter_ms"]
+        delay_ms = latency + (random.uniform(0, jitter) if jitter else 0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        if prof["throttle_rps"] and srv.over_rate_limit():
+            srv.count(endpoint, "throttled")
+            body = json.dumps({"code": 429, "msg": "请求过于频繁"}, ensure_ascii=False).encode("utf-8")
+            self._send(429, body, "application/json;charset=UTF-8", {"Retry-After": "1"})
+            return True
+        if prof["error_rate"] and random.random() < prof["error_rate"]:
+            srv.count(endpoint, "errors")
+            status = random.choice(prof["error_statuses"])
+            self._send(status, b"mock error", "text/plain")
+            return True
+        return False
+
+    # ---------- routes ----------
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/__stats":
+            self._json(self.server.stats())
+            return
+
+        endpoint = endpoint_of(path)
+        if self._inject(endpoint):
+            return
+        state = self.server.state
+
+        if path.startswith("/offer/") and path.endswith(".html"):
+            html = state.detail_html(path[len("/offer/"):-len(".html")])
+            if html is None:
+                self._send(404, b"offer not found", "text/plain")
+            else:
+                self._send(200, html.encode("utf-8"), "text/html;charset=UTF-8")
+            return
+
+        if path.startswith("/download/") and path.endswith(".xlsx"):
+            content = state.export_xlsx(path[len("/download/"):-len(".xlsx")])
+            if content is None:
+                self._send(404, b"export not found", "text/plain")
+            else:
+                self._send(200, content, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            return
+
+        self._send(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path
+        form = self._form()
+        endpoint = endpoint_of(path)
+        if self._inject(endpoint):
+            return
+        state = self.server.state
+        ids = [p for p in (form.get("packageIds") or "").split(",") if p]
+
+        if endpoint == "list.json":
+            self._json(state.list_page(form))
+        elif endpoint == "exportPickData.json":
+            self._json({"code": 0, "uuid": state.create_export(ids)})
+        elif endpoint == "checkProcess.json":
+            progress = state.export_progress(form.get("uuid", ""), self.server.profile["export_ms"])
+            msg = progress["processMsg"].get("msg", "")
+            if isinstance(msg, str) and msg.startswith("/download/"):
+                progress["processMsg"]["msg"] = self.server.url + msg
+            self._json(progress)
+        elif endpoint == "batchAudit.json":
+            self._json(state.audit(ids))
+        elif endpoint == "add_to_cart_list_new.jsx":
+            self._json(state.add_to_cart(form))
+        elif endpoint == "purchaseRender.jsx":
+            self._json({"success": True})
+        else:
+            self._send(404, b"not found", "text/plain")
+
+
+class MockServer(ThreadingHTTPServer):
+    """\
+    模拟服务：
+        srv = MockServer(profile="realistic", packages=500).start()
+        http_client.set_base_url(srv.url)
+        ...
+        srv.stop()
+    port=0 时自动选择空闲端口。
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        profile: str | dict = "fast",
+        packages: int = DEFAULT_PACKAGES,
+        skus: int = DEFAULT_SKUS,
+        host: str = MOCK_HOST,
+        port: int = MOCK_PORT,
+        seed: int = 7,
+        verbose: bool = False,
+    ):
+        super().__init__((host, port), MockHandler)
+        base = PROFILES[profile] if isinstance(profile, str) else profile
+        self.profile = {**PROFILES["fast"], **base}
+        self.state = MockState(packages=packages, skus=skus, seed=seed)
+        self.verbose = verbose
+        self._stats_lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+        self._recent: deque = deque()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint: str, key: str) -> None:
+        with self._stats_lock:
+            s = self._stats.setdefault(endpoint, {"requests": 0, "errors": 0, "throttled": 0})
+            s[key] += 1
+
+    def over_rate_limit(self) -> bool:
+        """滑动 1 秒窗口内的请求数超过 throttle_rps 时返回 True（被限流的请求不计入窗口）。"""
+        now = time.monotonic()
+        with self._stats_lock:
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.profile["throttle_rps"]:
+                return True
+            self._recent.append(now)
+            return False
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            endpoints = {k: dict(v) for k, v in self._stats.items()}
+        with self.state.lock:
+            return {
+                "endpoints": endpoints,
+                "pending": len(self.state.pending),
+                "audited": len(self.state.audited),
+                "exports": len(self.state.exports),
+                "cart_adds": self.state.cart_adds,
+                "cart_units": self.state.cart_units,
+            }
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="1688 / 店小秘 接口本地模拟服务")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic", help="延迟 / 错误 / 限流配置")
+    parser.add_argument("--host", default=MOCK_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_PORT)
+    parser.add_argument("--packages", type=int, default=DEFAULT_PACKAGES, help="待审核包裹数")
+    parser.add_argument("--skus", type=int, default=DEFAULT_SKUS, help="SKU 种类数")
+    parser.add_argument("--latency-ms", type=float, default=None, help="覆盖 profile 的基础延迟")
+    parser.add_argument("--error-rate", type=float, default=None, help="覆盖 profile 的错误率（0~1）")
+    parser.add_argument("--throttle-rps", type=float, default=None, help="覆盖 profile 的限流阈值（0 = 不限流）")
+    parser.add_argument("--verbose", action="store_true", help="打印每个请求")
+    args = parser.parse_args()
+
+    profile = dict(PROFILES[args.profile])
+    if args.latency_ms is not None:
+        profile["latency_ms"] = args.latency_ms
+        profile["endpoint_latency_ms"] = {}
+    if args.error_rate is not None:
+        profile["error_rate"] = args.error_rate
+    if args.throttle_rps is not None:
+        profile["throttle_rps"] = args.throttle_rps
+
+    srv = MockServer(profile, packages=args.packages, skus=args.skus, host=args.host, port=args.port, verbose=args.verbose)
+    print(f"[INFO] 模拟服务已启动: {srv.url}（profile={args.profile}, 待审核包裹 {args.packages} 个）")
+    print(f"[INFO] 让脚本使用模拟服务: 设置环境变量 AUTOMATION_BASE_URL={srv.url}")
+    print(f"[INFO] 统计: {srv.url}/__stats   （Ctrl+C 退出）")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] 已停止。")
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""DXM → 1688 one-process pipeline.
+
+Runs DXM export (+ audit) and 1688 add-to-cart in the same interpreter:
+
+    python pipeline.py              # 批发
+    python pipeline.py consign      # 代发
+    python pipeline.py --mode 2     # 从订单工作簿导出（同 dxm_export_and_audit.py 的 Mode 2）
+
+The summarised picklists exported in this run are passed to add_to_cart in memory,
+so there is no re-read from disk and no "is the newest xlsx fresh?" mtime check:
+only picklists produced by this run can ever be added to cart.
+
+Full purchase flow as cached stages (scrape → fill codes → mapping update → DXM export → cart):
+
+    python pipeline.py --stages                 # 输入未变化的阶段直接跳过
+    python pipeline.py --stages --force cart    # 强制重跑某个阶段（及其受影响的下游）
+    python pipeline.py --stages --links a.xlsx  # 从指定工作簿的 商品链接 列抓取
+
+Every run writes metrics/pipeline_<ts>.jsonl (stage timers, per-endpoint latency, peak memory);
+add --profile to also dump cProfile / tracemalloc reports next to it.
+"""
+
+import os
+import time
+
+import metrics
+from DXM_export_and_audit import UNMAPPED_QUEUE_PATH, PartialExportError, export_and_maybe_audit
+from add_to_cart_http_1688 import process_workbook
+from config import MAPPING_PATH, SCRAPE_FOLDER
+from excel_io import iter_column, read_excel
+from stage_cache import Stage, run_stages
+
+
+def parse_purchase_type(arg: str) -> str:
+    """与 add_to_cart_http_1688.py 的命令行参数一致：consign / daifa / 代发 → 代发，其它 → 批发。"""
+    if arg.lower().strip() in ("consign", "consign_purchase_type", "daifa", "代发"):
+        return "consign_purchase_type"
+    return ""
+
+
+def run_pipeline(
+    mode: int = 1,
+    purchase_type: str = "",
+    workbook_path: str | None = None,
+    reinclude_exported: bool | None = None,
+) -> list[str]:
+    """\
+    导出 → (可选)审核 → 加购，返回本次生成的 (done) 结果表路径。
+    DXM 没有导出新的拣货单时直接结束，不做加购。
+    """
+    t0 = time.perf_counter()
+    print("====================================================")
+    print("【DXM → 1688 流水线】导出 + 审核 → 加购（单进程）")
+    print("====================================================")
+
+    partial: PartialExportError | None = None
+    with metrics.timer("pipeline.export_audit"):
+        try:
+            picklists = export_and_maybe_audit(mode, workbook_path=workbook_path, reinclude_exported=reinclude_exported)
+        except PartialExportError as e:
+            # 成功批次已记入导出台账，下次不会再导出：先把它们加购，最后再报告失败
+            print(f"[WARN] {e}")
+            picklists, partial = e.picklists, e
+    t_export = time.perf_counter() - t0
+
+    if not picklists:
+        if partial is not None:
+            raise partial
+        print("[INFO] DXM 本次没有导出新的拣货单，跳过加购。")
+        return []
+
+    if purchase_type == "consign_purchase_type":
+        print("本次将以【代发】方式加购。")
+    else:
+        print("本次将以【批发】方式加购。")
+
+    results: list[str] = []
+    with metrics.timer("pipeline.cart", picklists=len(picklists)):
+        for path, df in picklists:
+            # df 为 None（拣货单无法解析汇总）时 process_workbook 会自己读盘
+            results.append(process_workbook(path, purchase_type=purchase_type, df=df, interactive=False))
+
+    print(
+        f"\n[INFO] 流水线完成：{len(results)} 个拣货单已加购，"
+        f"导出/审核 {t_export:.1f}s，总用时 {time.perf_counter() - t0:.1f}s"
+    )
+    for p in results:
+        print("  -", p)
+    if partial is not None:
+        raise partial
+    return results
+
+
+# ======================== Cached stages ========================
+
+def read_links(path: str) -> list[str]:
+    """读取工作簿 商品链接 列中的 http 链接（去重，保持顺序）；文件或列不存在时返回空列表。"""
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        return list(dict.fromkeys(u for u in iter_column(path, "商品链接") if u.startswith("http")))
+    except KeyError:
+        return []
+
+
+def build_purchase_stages(
+    links_path: str | None = None,
+    mode: int = 1,
+    purchase_type: str = "",
+    workbook_path: str | None = None,
+    reinclude_exported: bool | None = None,
+) -> list[Stage]:
+    """\
+    scrape → fill_codes → update_mapping → dxm_export → cart。
+    每个阶段的输入按内容哈希；重跑时输入未变的阶段直接复用上次的输出。
+    links_path 默认是 DXM 覆盖检查生成的待抓取队列（unmapped_sku_queue.xlsx）。
+    """
+    import Update_mapping_from_scrape as mapping_updater
+    from scrape_1688_http_paste_links_open import scrape_urls
+
+    links_path = links_path or UNMAPPED_QUEUE_PATH
+
+    def unprocessed_done() -> list[str]:
+        ledger = mapping_updater.load_or_seed_ledger(mapping_updater.LEDGER_PATH, SCRAPE_FOLDER, MAPPING_PATH)
+        return mapping_updater.find_unprocessed_done_workbooks(SCRAPE_FOLDER, ledger)
+
+    # 1) scrape：输入是链接集合本身（与工作簿格式 / 其它列无关）
+    def scrape_inputs(ctx):
+        return [], {"links": sorted(read_links(links_path))}
+
+    def scrape_run(ctx):
+        links = read_links(links_path)
+        if not links:
+            print("[INFO] 没有待抓取的商品链接。")
+            return {"outputs": [], "result": None}
+        out_path = scrape_urls(links)
+        return {"outputs": [out_path], "result": out_path}
+
+    # 2) fill_codes：就地填充所有未合并的 (done) 工作簿
+    def fill_inputs(ctx):
+        return unprocessed_done(), {}
+
+    def fill_run(ctx):
+        paths = unprocessed_done()
+        if not paths:
+            print("[INFO] 没有未处理的 (done) 工作簿。")
+            return {"outputs": [], "result": []}
+        frames, done_paths = mapping_updater.fill_done_workbooks(paths)
+        return {"outputs": done_paths, "result": done_paths, "data": frames}
+
+    # 3) update_mapping：合并已填充的工作簿并写入 Mapping_Data
+    def mapping_inputs(ctx):
+        return list(ctx["fill_codes"]["result"] or []), {}
+
+    def mapping_run(ctx):
+        paths = list(ctx["fill_codes"]["result"] or [])
+        if not paths:
+            return {"outputs": [], "result": False}
+        frames = ctx["fill_codes"]["data"] or [read_excel(p) for p in paths]
+        if not mapping_updater.merge_done_workbooks(frames, paths, open_mapping=False):
+            raise RuntimeError("更新 Mapping_Data 失败")
+        return {"outputs": [MAPPING_PATH], "result": True}
+
+    # 4) dxm_export：拣货单仍留在 Batch_added_to_cart（尚未被加购归档）且 Mapping 未变时复用
+    def export_inputs(ctx):
+        return [MAPPING_PATH], {"mode": mode, "workbook": workbook_path, "reexport": bool(reinclude_exported)}
+
+    def export_run(ctx):
+        picklists = export_and_maybe_audit(mode, workbook_path=workbook_path, reinclude_exported=reinclude_exported)
+        paths = [path for path, _ in picklists]
+        return {"outputs": paths, "result": paths, "data": picklists}
+
+    # 5) cart：输入是本次（或缓存中）的拣货单 + Mapping_Data
+    def cart_inputs(ctx):
+        return list(ctx["dxm_export"]["result"] or []) + [MAPPING_PATH], {"purchase_type": purchase_type}
+
+    def cart_run(ctx):
+        picklists = ctx["dxm_export"]["data"]
+        if picklists is None:
+            # 导出阶段被跳过：从磁盘读取缓存的拣货单
+            picklists = [(p, None) for p in ctx["dxm_export"]["result"] or [] if os.path.exists(p)]
+        if not picklists:
+            print("[INFO] 没有待加购的拣货单。")
+            return {"outputs": [], "result": []}
+        results = [
+            process_workbook(path, purchase_type=purchase_type, df=df, interactive=False)
+            for path, df in picklists
+        ]
+        return {"outputs": results, "result": results}
+
+    return [
+        Stage("scrape", scrape_inputs, scrape_run),
+        Stage("fill_codes", fill_inputs, fill_run, inplace=True),
+        Stage("update_mapping", mapping_inputs, mapping_run),
+        Stage("dxm_export", export_inputs, export_run, reuse_empty=False),
+        Stage("cart", cart_inputs, cart_run, reuse_empty=False),
+    ]
+
+
+def run_purchase_stages(force=(), **kwargs) -> dict:
+    t0 = time.perf_counter()
+    ctx = run_stages(build_purchase_stages(**kwargs), force=force)
+    print(f"\n[INFO] 全部阶段完成，总用时 {time.perf_counter() - t0:.1f}s")
+    for name, info in ctx.items():
+        state = "跳过" if info["skipped"] else f"{info['seconds']:.1f}s"
+        print(f"  - {name}: {state}")
+    return ctx
+
+
+def main():
+    import argparse
+
+    metrics.start_run_from_argv("pipeline")
+    parser = argparse.ArgumentParser(description="DXM 导出 + 审核 → 1688 加购（单进程流水线）")
+    parser.add_argument("purchase_type", nargs="?", default="", help="wholesale（默认）或 consign / daifa / 代发")
+    parser.add_argument("--mode", type=int, choices=(1, 2), default=1, help="1=所有待审核订单（默认），2=从订单工作簿")
+    parser.add_argument("--workbook", default=None, help="Mode 2 使用的订单工作簿（默认取最新）")
+    parser.add_argument("--reexport", action="store_true", help="已导出过的包裹也重新导出")
+    parser.add_argument("--stages", action="store_true", help="运行完整的带缓存阶段流水线（抓取 → 填充 → Mapping → 导出 → 加购）")
+    parser.add_argument("--force", nargs="+", default=[], help="--stages 时强制重跑的阶段名（或 all）")
+    parser.add_argument("--links", default=None, help="--stages 时抓取的链接工作簿（默认 unmapped_sku_queue.xlsx）")
+    args = parser.parse_args()
+
+    if args.stages:
+        run_purchase_stages(
+            force=args.force,
+            links_path=args.links,
+            mode=args.mode,
+            purchase_type=parse_purchase_type(args.purchase_type),
+            workbook_path=args.workbook,
+            reinclude_exported=True if args.reexport else None,
+        )
+        return
+
+    run_pipeline(
+        mode=args.mode,
+        purchase_type=parse_purchase_type(args.purchase_type),
+        workbook_path=args.workbook,
+        reinclude_exported=True if args.reexport else None,
+    )
+
+
+if __name__ == "__main__":
+    main()
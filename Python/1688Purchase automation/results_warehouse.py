@@ -0,0 +1,398 @@
+"""Local history of every add-to-cart result, built from Finished_added_to_cart.
+
+Each (done) workbook is loaded once into an indexed sqlite file (results_warehouse.sqlite).
+Files are de-duplicated by content hash, so renamed copies (xxx(done)_<ts>.xlsx) are skipped.
+Every query ingests new files first, then answers from sqlite in milliseconds:
+
+    python results_warehouse.py ingest [--rebuild]
+    python results_warehouse.py summary
+    python results_warehouse.py failures --since 2026-01-01 [--by supplier|sku|remark]
+    python results_warehouse.py sku SKU-000123 --days 30
+    python results_warehouse.py top --days 30
+    python results_warehouse.py sql "SELECT status, COUNT(*) FROM results GROUP BY status"
+
+or through the unified entry point: python cli.py history ...
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import datetime
+import pathlib
+
+from config import PICKLIST_FOLDER
+
+
+# ======================== CONFIG ========================
+
+WORK_DIR = os.path.dirname(os.path.abspath(__file__))
+WAREHOUSE_PATH = os.path.join(WORK_DIR, "results_warehouse.sqlite")
+FINISHED_DIR = os.path.join(PICKLIST_FOLDER, "Finished_added_to_cart")
+
+# 表结构变化时加 1，旧库会自动重建
+SCHEMA_VERSION = 2
+
+# (done) 结果表列 → results 表字段
+RESULT_COLUMNS = {
+    "SKU": "sku",
+    "数量": "qty",
+    "商品链接": "link",
+    "商品ID": "offer_id",
+    "Spec ID": "spec_id",
+    "主供应商": "primary_supplier",
+    "副供应商": "secondary_supplier",
+    "加购供应商": "cart_supplier_label",
+    "拣货备注": "pick_note",
+    "状态": "status",
+    "备注": "remark",
+}
+
+# 加购供应商 列记录的是哪一个供应商加购成功（标签，不是供应商名称）→ 对应的名称字段
+CART_SUPPLIER_LABELS = {
+    "主供应商": "primary_supplier",
+    "副供应商": "secondary_supplier",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id          INTEGER PRIMARY KEY,
+    sha256      TEXT NOT NULL UNIQUE,
+    name        TEXT NOT NULL,
+    path        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime       REAL NOT NULL,
+    run_at      TEXT NOT NULL,
+    rows        INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_path ON files(path);
+
+-- 同一路径内容相同的副本（重名时加了时间戳）只记录路径，不重复导入
+CREATE TABLE IF NOT EXISTS seen_paths (
+    path   TEXT PRIMARY KEY,
+    size   INTEGER NOT NULL,
+    mtime  REAL NOT NULL,
+    sha256 TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    file_id            INTEGER NOT NULL REFERENCES files(id),
+    row_no             INTEGER NOT NULL,
+    run_at             TEXT NOT NULL,
+    sku                TEXT,
+    qty                INTEGER,
+    link               TEXT,
+    offer_id           TEXT,
+    spec_id            TEXT,
+    primary_supplier   TEXT,
+    secondary_supplier TEXT,
+    cart_supplier_label TEXT,
+    supplier           TEXT,
+    pick_note          TEXT,
+    status             TEXT,
+    remark             TEXT,
+    PRIMARY KEY (file_id, row_no)
+);
+CREATE INDEX IF NOT EXISTS idx_results_run_at ON results(run_at);
+CREATE INDEX IF NOT EXISTS idx_results_sku ON results(sku, run_at);
+CREATE INDEX IF NOT EXISTS idx_results_supplier ON results(supplier, status);
+CREATE INDEX IF NOT EXISTS idx_results_status ON results(status, run_at);
+"""
+
+
+# ======================== Store ========================
+
+def connect(path: str = WAREHOUSE_PATH) -> sqlite3.Connection:
+    """打开（必要时创建 / 按 SCHEMA_VERSION 重建）本地仓库。"""
+    conn = sqlite3.connect(path)
+    if conn.execute("PRAGMA user_version").fetchone()[0] not in (0, SCHEMA_VERSION):
+        conn.close()
+        print(f"[INFO] 仓库结构已更新，重建: {path}")
+        os.remove(path)
+        conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return conn
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _fmt_time(epoch: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(epoch))
+
+
+def _done_workbooks(folder: str) -> list[str]:
+    if not os.path.isdir(folder):
+        return []
+    out = []
+    for fn in os.listdir(folder):
+        if fn.startswith("~$") or not fn.lower().endswith(".xlsx"):
+            continue
+        if "(done)" in fn:
+            out.append(os.path.join(folder, fn))
+    out.sort(key=os.path.getmtime)
+    return out
+
+
+def _clean(v) -> str:
+    if v is None:
+        return ""
+    s = str(v).strip()
+    return "" if s.lower() == "nan" else s
+
+
+def _qty(v) -> int | None:
+    try:
+        return int(float(_clean(v)))
+    except ValueError:
+        return None
+
+
+def _load_rows(path: str) -> list[dict]:
+    """读取一个 (done) 结果表的关键列（有新的旁路文件时读旁路文件）。"""
+    from excel_io import read_excel
+
+    df = read_excel(path, usecols=list(RESULT_COLUMNS), dtype=str)
+    df.columns = [str(c).strip() for c in df.columns]
+    present = [c for c in RESULT_COLUMNS if c in df.columns]
+    rows = []
+    unknown: set[str] = set()
+    for values in df[present].itertuples(index=False, name=None):
+        row = {RESULT_COLUMNS[c]: _clean(v) for c, v in zip(present, values)}
+        if not row.get("sku"):
+            continue
+        row["qty"] = _qty(row.get("qty"))
+        label = row.get("cart_supplier_label") or ""
+        if label and label not in CART_SUPPLIER_LABELS:
+            unknown.add(label)
+        # supplier 是实际加购的供应商名称：副供应商成功时取 副供应商 列，否则取 主供应商 列
+        row["supplier"] = row.get(CART_SUPPLIER_LABELS.get(label, "primary_supplier")) or ""
+        rows.append(row)
+    if unknown:
+        print(f"[WARN] {os.path.basename(path)}: 加购供应商 出现未知标签 {sorted(unknown)}，按主供应商统计。")
+    return rows
+
+
+def ingest(folders: list[str] | None = None, conn: sqlite3.Connection | None = None, verbose: bool = True) -> int:
+    """\
+    把 folders（默认 Finished_added_to_cart）中尚未导入的 (done) 结果表写入仓库，返回新导入的文件数。
+    路径 + 大小 + 修改时间没变的文件直接跳过（不计算哈希）；内容哈希已存在的副本不重复导入。
+    """
+    own = conn is None
+    conn = conn or connect()
+    fields = [*RESULT_COLUMNS.values(), "supplier"]
+    insert_sql = (
+        f"INSERT INTO results (file_id, row_no, run_at, {', '.join(fields)}) "
+        f"VALUES (?, ?, ?, {', '.join('?' for _ in fields)})"
+    )
+    added = 0
+    try:
+        for folder in folders or [FINISHED_DIR]:
+            for path in _done_workbooks(folder):
+                st = os.stat(path)
+                seen = conn.execute("SELECT size, mtime FROM seen_paths WHERE path = ?", (path,)).fetchone()
+                if seen and seen[0] == st.st_size and seen[1] == st.st_mtime:
+                    continue
+
+                sha = file_sha256(path)
+                if conn.execute("SELECT 1 FROM files WHERE sha256 = ?", (sha,)).fetchone() is None:
+                    try:
+                        rows = _load_rows(path)
+                    except Exception as e:
+                        print(f"[WARN] 读取失败，跳过: {path}: {e}")
+                        continue
+                    run_at = _fmt_time(st.st_mtime)
+                    with conn:
+                        cur = conn.execute(
+                            "INSERT INTO files (sha256, name, path, size, mtime, run_at, rows, ingested_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (sha, os.path.basename(path), path, st.st_size, st.st_mtime, run_at, len(rows), _fmt_time(time.time())),
+                        )
+                        conn.executemany(insert_sql, [
+                            (cur.lastrowid, i, run_at, *(r.get(f) for f in fields))
+                            for i, r in enumerate(rows)
+                        ])
+                    added += 1
+                    if verbose:
+                        print(f"[INFO] 已导入 {os.path.basename(path)}（{len(rows)} 行，{run_at}）")
+                elif verbose:
+                    print(f"[INFO] 内容重复，跳过: {os.path.basename(path)}")
+
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO seen_paths (path, size, mtime, sha256) VALUES (?, ?, ?, ?)",
+                        (path, st.st_size, st.st_mtime, sha),
+                    )
+    finally:
+        if own:
+            conn.close()
+    return added
+
+
+# ======================== Queries ========================
+
+def date_range(since: str | None = None, until: str | None = None, days: float | None = None) -> tuple[str, str]:
+    """--since / --until（YYYY-MM-DD，含当天）或 --days → run_at 比较用的 [起, 止) 字符串。"""
+    if days is not None:
+        since = _fmt_time(time.time() - days * 86400)
+    start = since or "0000-00-00"
+    end = "9999-99-99"
+    if until:
+        end = (datetime.date.fromisoformat(until) + datetime.timedelta(days=1)).isoformat()
+    return start, end
+
+
+def query(conn: sqlite3.Connection, sql: str, params=()) -> tuple[list[str], list[tuple]]:
+    cur = conn.execute(sql, params)
+    return [d[0] for d in cur.description or ()], cur.fetchall()
+
+
+def failures(conn: sqlite3.Connection, start: str, end: str, by: str = "supplier", limit: int = 20):
+    """按 供应商 / SKU / 失败原因 统计加购次数与失败次数（失败多的在前）。"""
+    col = {"supplier": "supplier", "sku": "sku", "remark": "remark"}[by]
+    where = "run_at >= ? AND run_at < ?"
+    if by == "remark":
+        where += " AND status = 'FAILED'"
+    return query(conn, f"""
+        SELECT COALESCE(NULLIF({col}, ''), '(空)') AS {by},
+               COUNT(*) AS rows,
+               SUM(status = 'FAILED') AS failed,
+               ROUND(100.0 * SUM(status = 'FAILED') / COUNT(*), 1) AS failed_pct
+        FROM results
+        WHERE {where}
+        GROUP BY 1
+        HAVING failed > 0
+        ORDER BY failed DESC, rows DESC
+        LIMIT ?
+    """, (start, end, limit))
+
+
+def sku_history(conn: sqlite3.Connection, sku: str, start: str, end: str):
+    """某个 SKU 每次加购的数量与结果。"""
+    return query(conn, """
+        SELECT run_at, qty, status, supplier, remark
+        FROM results
+        WHERE sku = ? AND run_at >= ? AND run_at < ?
+        ORDER BY run_at
+    """, (sku, start, end))
+
+
+def top_skus(conn: sqlite3.Connection, start: str, end: str, limit: int = 20):
+    """加购成功件数最多的 SKU。"""
+    return query(conn, """
+        SELECT sku, SUM(qty) AS units, COUNT(*) AS runs, MAX(run_at) AS last_run
+        FROM results
+        WHERE status = 'SUCCESS' AND run_at >= ? AND run_at < ?
+        GROUP BY sku
+        ORDER BY units DESC
+        LIMIT ?
+    """, (start, end, limit))
+
+
+def summary(conn: sqlite3.Connection):
+    return query(conn, """
+        SELECT COUNT(DISTINCT file_id) AS files, COUNT(*) AS rows,
+               SUM(status = 'SUCCESS') AS success, SUM(status = 'FAILED') AS failed,
+               SUM(CASE WHEN status = 'SUCCESS' THEN qty END) AS units,
+               MIN(run_at) AS first_run, MAX(run_at) AS last_run
+        FROM results
+    """)
+
+
+def print_table(columns: list[str], rows: list[tuple]) -> None:
+    if not rows:
+        print("（无结果）")
+        return
+    cells = [[("" if v is None else str(v)) for v in r] for r in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+
+# ======================== CLI ========================
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="results_warehouse.py", description="加购结果历史仓库（sqlite）")
+    parser.add_argument("--db", default=WAREHOUSE_PATH, help="仓库文件")
+    parser.add_argument("--no-ingest", action="store_true", help="查询前不导入新结果表")
+    sub = parser.add_subparsers(dest="command", metavar="命令")
+
+    p = sub.add_parser("ingest", help="导入新的 (done) 结果表")
+    p.add_argument("folders", nargs="*", help=f"结果表目录（默认 {FINISHED_DIR}）")
+    p.add_argument("--rebuild", action="store_true", help="删除仓库后全部重新导入")
+
+    sub.add_parser("summary", help="仓库概览")
+
+    def add_range(p):
+        p.add_argument("--since", default=None, help="起始日期 YYYY-MM-DD")
+        p.add_argument("--until", default=None, help="结束日期 YYYY-MM-DD（含当天）")
+        p.add_argument("--days", type=float, default=None, help="最近几天（代替 --since）")
+        p.add_argument("--limit", type=int, default=20)
+
+    p = sub.add_parser("failures", help="失败统计（按供应商 / SKU / 失败原因）")
+    p.add_argument("--by", choices=("supplier", "sku", "remark"), default="supplier")
+    add_range(p)
+
+    p = sub.add_parser("sku", help="某个 SKU 的加购记录与件数")
+    p.add_argument("sku")
+    add_range(p)
+
+    p = sub.add_parser("top", help="加购件数最多的 SKU")
+    add_range(p)
+
+    p = sub.add_parser("sql", help="执行任意只读 SQL（表: files / results）")
+    p.add_argument("statement")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(sys.argv[1:] if argv is None else argv)
+    command = args.command or "summary"
+
+    if command == "ingest" and args.rebuild and os.path.exists(args.db):
+        os.remove(args.db)
+    conn = connect(args.db)
+    try:
+        if command == "ingest":
+            n = ingest(args.folders or None, conn=conn)
+            print(f"[INFO] 新导入 {n} 个结果表: {args.db}")
+            return
+        if not args.no_ingest:
+            ingest(conn=conn, verbose=False)
+
+        t0 = time.perf_counter()
+        if command == "summary":
+            cols, rows = summary(conn)
+        elif command == "failures":
+            cols, rows = failures(conn, *date_range(args.since, args.until, args.days), by=args.by, limit=args.limit)
+        elif command == "sku":
+            cols, rows = sku_history(conn, args.sku, *date_range(args.since, args.until, args.days))
+        elif command == "top":
+            cols, rows = top_skus(conn, *date_range(args.since, args.until, args.days), limit=args.limit)
+        else:
+            ro = sqlite3.connect(pathlib.Path(args.db).resolve().as_uri() + "?mode=ro", uri=True)
+            try:
+                cols, rows = query(ro, args.statement)
+            finally:
+                ro.close()
+        print_table(cols, rows)
+        if command == "sku" and rows:
+            units = sum(r[1] or 0 for r in rows if r[2] == "SUCCESS")
+            print(f"\n[INFO] {args.sku}: 成功加购 {units} 件（{len(rows)} 次记录）")
+        print(f"\n[INFO] 查询用时 {(time.perf_counter() - t0) * 1000:.1f} ms")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
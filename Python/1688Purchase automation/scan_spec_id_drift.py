@@ -0,0 +1,352 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+import metrics
+from config import (
+    MAPPING_PATH,
+    TIMEOUT,
+)
+from excel_io import read_excel, write_excel
+from http_client import make_session, pause
+from scrape_1688_http_paste_links_open import (
+    extract_offer_id,
+    make_detail_headers,
+    parse_sku_data_from_html,
+)
+
+
+# ======================== CONFIG ========================
+
+MAPPING_DIR = os.path.dirname(MAPPING_PATH)
+
+# 已解析的商品 SKU 列表缓存（每个 offerId 一个 JSON），避免重复请求同一页面
+CACHE_DIR = os.path.join(MAPPING_DIR, "offer_cache")
+CACHE_TTL_SEC = 6 * 3600
+
+# 并发抓取线程数 + 全局最小请求间隔（所有线程共享，避免触发 1688 风控）
+MAX_WORKERS = 4
+MIN_INTERVAL_SEC = 0.5
+
+CODE_COL = "商品選項貨號"
+
+# (供应商标签, 商品链接列, 商品ID列, 属性SKU列, SKU ID列, Spec ID列)
+SUPPLIER_COLUMNS = [
+    ("主供应商", "商品链接", "商品ID", "属性SKU", "SKU ID", "Spec ID"),
+    ("副供应商", "商品链接.1", "商品ID.1", "属性SKU.1", "SKU ID.1", "Spec ID.1"),
+]
+
+STATUS_OK = "OK"
+STATUS_DRIFT = "DRIFT"
+STATUS_MISSING_ATTR = "MISSING_ATTR"
+STATUS_FETCH_FAILED = "FETCH_FAILED"
+
+
+# ======================== Helpers ========================
+
+class RateLimiter:
+    """所有线程共享的最小请求间隔。"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait_s = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.min_interval
+        if wait_s > 0:
+            pause(wait_s)
+
+
+_thread_local = threading.local()
+
+
+def _get_session() -> requests.Session:
+    """每个工作线程一个 Session（requests.Session 不保证线程安全）。"""
+    s = getattr(_thread_local, "session", None)
+    if s is None:
+        s = make_session()
+        _thread_local.session = s
+    return s
+
+
+def clean(v) -> str:
+    if v is None:
+        return ""
+    s = str(v).strip()
+    if s.lower() in ("nan", "none"):
+        return ""
+    # Excel 中的长数字可能被读成 "123.0"
+    if s.endswith(".0") and s[:-2].isdigit():
+        s = s[:-2]
+    return s
+
+
+def offer_url(link: str, offer_id: str) -> str:
+    if extract_offer_id(link):
+        return link
+    return f"https://detail.1688.com/offer/{offer_id}.html"
+
+
+def _cache_path(offer_id: str) -> str:
+    return os.path.join(CACHE_DIR, f"{offer_id}.json")
+
+
+def load_cached_offer(offer_id: str) -> dict | None:
+    path = _cache_path(offer_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if time.time() - float(data.get("fetched_at", 0)) > CACHE_TTL_SEC:
+        return None
+    return data
+
+
+def save_cached_offer(offer_id: str, data: dict) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = _cache_path(offer_id) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, _cache_path(offer_id))
+
+
+def fetch_offer_skus(offer_id: str, url: str, limiter: RateLimiter, use_cache: bool = True) -> dict | None:
+    """
+    返回 {"fetched_at", "shop_name", "records"}；失败返回 None。
+    records 即 parse_sku_data_from_html 的输出。
+    """
+    if use_cache:
+        cached = load_cached_offer(offer_id)
+        if cached is not None:
+            return cached
+
+    limiter.wait()
+    try:
+        resp = _get_session().get(
+            url,
+            headers=make_detail_headers(url),
+            timeout=TIMEOUT,
+            allow_redirects=True,
+        )
+    except Exception as e:
+        print(f"  [WARN] offerId={offer_id} 请求失败: {e}")
+        return None
+
+    if resp.status_code != 200:
+        print(f"  [WARN] offerId={offer_id} HTTP {resp.status_code}")
+        return None
+
+    records, shop_name = parse_sku_data_from_html(resp.text)
+    if not records:
+        print(f"  [WARN] offerId={offer_id} 未解析到 SKU（Cookie 过期或页面结构变化？）")
+        return None
+
+    data = {"fetched_at": time.time(), "shop_name": shop_name, "records": records}
+    try:
+        save_cached_offer(offer_id, data)
+    except Exception as e:
+        print(f"  [WARN] 写入缓存失败 offerId={offer_id}: {e}")
+    return data
+
+
+# ======================== Main Logic ========================
+
+def collect_offers(mdf: pd.DataFrame) -> dict[str, str]:
+    """从 Mapping_Data 中收集需要检查的 offerId -> 页面 URL（主/副供应商都算）。"""
+    offers: dict[str, str] = {}
+    for _, link_col, pid_col, _, _, _ in SUPPLIER_COLUMNS:
+        if link_col not in mdf.columns and pid_col not in mdf.columns:
+            continue
+        for _, row in mdf.iterrows():
+            link = clean(row.get(link_col, ""))
+            oid = extract_offer_id(link) or clean(row.get(pid_col, ""))
+            if oid and oid.isdigit() and oid not in offers:
+                offers[oid] = offer_url(link, oid)
+    return offers
+
+
+def diff_mapping(mdf: pd.DataFrame, live: dict[str, dict | None]) -> pd.DataFrame:
+    """逐行对比 Mapping_Data 与线上 SKU 列表，按 属性SKU 匹配。"""
+    report: list[dict] = []
+    for idx, row in mdf.iterrows():
+        for label, link_col, pid_col, attr_col, sku_col, spec_col in SUPPLIER_COLUMNS:
+            if link_col not in mdf.columns and pid_col not in mdf.columns:
+                continue
+            link = clean(row.get(link_col, ""))
+            oid = extract_offer_id(link) or clean(row.get(pid_col, ""))
+            if not oid or not oid.isdigit():
+                continue
+
+            attr = clean(row.get(attr_col, ""))
+            old_sku = clean(row.get(sku_col, ""))
+            old_spec = clean(row.get(spec_col, ""))
+
+            entry = {
+                "行号": idx + 2,  # Excel 行号（含表头）
+                CODE_COL: clean(row.get(CODE_COL, "")),
+                "供应商": label,
+                "商品ID": oid,
+                "属性SKU": attr,
+                "旧 SKU ID": old_sku,
+                "新 SKU ID": "",
+                "旧 Spec ID": old_spec,
+                "新 Spec ID": "",
+                "状态": "",
+            }
+
+            data = live.get(oid)
+            if data is None:
+                entry["状态"] = STATUS_FETCH_FAILED
+                report.append(entry)
+                continue
+
+            by_attr = {str(r.get("属性SKU", "")).strip(): r for r in data["records"]}
+            rec = by_attr.get(attr)
+            if rec is None:
+                entry["状态"] = STATUS_MISSING_ATTR
+                report.append(entry)
+                continue
+
+            new_sku = clean(rec.get("SKU ID", ""))
+            new_spec = clean(rec.get("Spec ID", ""))
+            entry["新 SKU ID"] = new_sku
+            entry["新 Spec ID"] = new_spec
+            if new_sku == old_sku and new_spec == old_spec:
+                entry["状态"] = STATUS_OK
+            else:
+                entry["状态"] = STATUS_DRIFT
+            report.append(entry)
+
+    return pd.DataFrame(report)
+
+
+def _index_rows(map_df: pd.DataFrame, label: str) -> dict[tuple[str, str], list]:
+    """(商品選項貨號, offerId) -> 该供应商列所在的行索引列表。"""
+    _, link_col, pid_col, _, _, _ = next(c for c in SUPPLIER_COLUMNS if c[0] == label)
+    index: dict[tuple[str, str], list] = {}
+    if CODE_COL not in map_df.columns or (link_col not in map_df.columns and pid_col not in map_df.columns):
+        return index
+    for i, row in map_df.iterrows():
+        link = clean(row.get(link_col, ""))
+        oid = extract_offer_id(link) or clean(row.get(pid_col, ""))
+        code = clean(row.get(CODE_COL, ""))
+        if code and oid:
+            index.setdefault((code, oid), []).append(i)
+    return index
+
+
+def apply_fixes(report_df: pd.DataFrame, mapping_path: str) -> int:
+    """把 DRIFT 行的新 SKU ID / Spec ID 写回 Mapping_Data.xlsx，返回实际写回的行数。
+
+    按 商品選項貨號 + 供应商 offerId 重新定位行（扫描期间文件可能被追加/排序），
+    找不到、匹配到多行或旧 Spec ID 已变化的报告行一律跳过。
+    """
+    drift = report_df[report_df["状态"] == STATUS_DRIFT]
+    if drift.empty:
+        return 0
+
+    # 不带 dtype 读取，保持其它单元格原样写回
+    map_df = read_excel(mapping_path)
+    cols_by_label = {c[0]: c for c in SUPPLIER_COLUMNS}
+    indexes = {label: _index_rows(map_df, label) for label in cols_by_label}
+    applied = 0
+    for _, r in drift.iterrows():
+        label = r["供应商"]
+        _, _, _, _, sku_col, spec_col = cols_by_label[label]
+        code, oid = clean(r[CODE_COL]), clean(r["商品ID"])
+        rows = indexes[label].get((code, oid), [])
+        if len(rows) != 1:
+            why = "已不存在" if not rows else f"匹配到 {len(rows)} 行"
+            print(f"  [WARN] 跳过 {code} ({label} offerId={oid}): Mapping_Data 中该行{why}")
+            continue
+        i = rows[0]
+        current_spec = clean(map_df.at[i, spec_col]) if spec_col in map_df.columns else ""
+        if current_spec != clean(r["旧 Spec ID"]):
+            print(f"  [WARN] 跳过 {code} ({label} offerId={oid}): Spec ID 已被修改为 {current_spec or '(空)'}")
+            continue
+        for col, val in ((sku_col, r["新 SKU ID"]), (spec_col, r["新 Spec ID"])):
+            if col not in map_df.columns:
+                map_df[col] = ""
+            map_df[col] = map_df[col].astype(object)
+            map_df.at[i, col] = val
+        applied += 1
+
+    if applied:
+        write_excel(map_df, mapping_path)
+    return applied
+
+
+def scan(apply: bool = False, use_cache: bool = True) -> str | None:
+    """扫描入口：返回报告路径（无可检查商品时返回 None）。"""
+    if not os.path.exists(MAPPING_PATH):
+        raise SystemExit(f"[FATAL] 找不到 Mapping_Data 文件: {MAPPING_PATH}")
+
+    print(f"[INFO] 正在加载 Mapping_Data: {MAPPING_PATH}")
+    mdf = read_excel(MAPPING_PATH, usecols=[CODE_COL, *(c for cols in SUPPLIER_COLUMNS for c in cols[1:])], dtype=str)
+
+    offers = collect_offers(mdf)
+    if not offers:
+        print("[INFO] Mapping_Data 中没有可检查的商品链接。")
+        return None
+    print(f"[INFO] 需要检查的商品数: {len(offers)}（并发 {MAX_WORKERS}，最小间隔 {MIN_INTERVAL_SEC}s）")
+
+    limiter = RateLimiter(MIN_INTERVAL_SEC)
+    live: dict[str, dict | None] = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {
+            oid: pool.submit(fetch_offer_skus, oid, url, limiter, use_cache)
+            for oid, url in offers.items()
+        }
+        for n, (oid, fut) in enumerate(futures.items(), start=1):
+            live[oid] = fut.result()
+            if n % 20 == 0 or n == len(futures):
+                print(f"[INFO] 进度 {n}/{len(futures)}")
+
+    report_df = diff_mapping(mdf, live)
+    counts = report_df["状态"].value_counts().to_dict() if not report_df.empty else {}
+    print("[INFO] 检查结果:", counts)
+
+    ts = time.strftime("%Y%m%d-%H%M%S")
+    report_path = os.path.join(MAPPING_DIR, f"spec_drift_report_{ts}.xlsx")
+    problems = report_df[report_df["状态"] != STATUS_OK] if not report_df.empty else report_df
+    write_excel(problems, report_path)
+    print(f"[INFO] 已输出漂移报告（仅含非 OK 行）: {report_path}")
+
+    if apply:
+        n = apply_fixes(report_df, MAPPING_PATH)
+        print(f"[INFO] 已把 {n} 行新的 SKU ID / Spec ID 写回 Mapping_Data.xlsx")
+    elif counts.get(STATUS_DRIFT):
+        print("[INFO] 使用 --apply 可把 DRIFT 行自动写回 Mapping_Data.xlsx")
+
+    return report_path
+
+
+def main():
+    import argparse
+
+    metrics.start_run_from_argv("spec_drift")
+    parser = argparse.ArgumentParser(
+        description="对比 Mapping_Data 与 1688 线上 SKU/SpecID，找出供应商改动的映射。",
+    )
+    parser.add_argument("--apply", action="store_true", help="把 DRIFT 行的新 SKU ID / Spec ID 写回 Mapping_Data.xlsx")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存，全部重新抓取")
+    args = parser.parse_args()
+
+    print("=== 1688 Spec ID 漂移扫描 ===")
+    scan(apply=args.apply, use_cache=not args.refresh)
+
+
+if __name__ == "__main__":
+    main()
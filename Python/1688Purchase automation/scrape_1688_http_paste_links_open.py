@@ -7,12 +7,14 @@ import subprocess
 import requests
 import pandas as pd
 
+import metrics
 from config import (
     SCRAPE_FOLDER,
-    ALI_COOKIE_PATH,
     USER_AGENT,
     TIMEOUT,
 )
+from excel_io import iter_column, write_excel
+from http_client import load_cookie as load_shared_cookie, make_session
 
 SCRIPT_VERSION = "scrape_1688_http v2025-11-30-01"
 
@@ -35,16 +37,11 @@ def load_cookie() -> str:
     Load 1688 cookie from:
     1. Environment variable ALI_COOKIE
     2. ali_cookie.txt at ALI_COOKIE_PATH
+    Read once per process via http_client (make_detail_headers is called per product).
     """
-    env_ck = os.environ.get("ALI_COOKIE", "").strip()
-    if env_ck:
-        return env_ck
-
-    if ALI_COOKIE_PATH and os.path.exists(ALI_COOKIE_PATH):
-        with open(ALI_COOKIE_PATH, "r", encoding="utf-8") as f:
-            ck = f.read().strip()
-        if ck:
-            return ck
+    ck = load_shared_cookie("ali")
+    if ck:
+        return ck
 
     raise SystemExit("❌ 未找到 1688 Cookie，请设置环境变量 ALI_COOKIE 或配置 ALI_COOKIE_PATH")
 
@@ -354,15 +351,12 @@ def main():
             print("待处理工作簿：")
             print("   ", wb_path)
 
-            df = pd.read_excel(wb_path, dtype=str)
-            if "商品链接" not in df.columns:
+            # 流式只读 商品链接 这一列（大表也不会整表载入内存）
+            try:
+                urls.extend(iter_column(wb_path, "商品链接"))
+            except KeyError:
                 raise SystemExit("❌ Excel 缺少列：商品链接")
 
-            for _, row in df.iterrows():
-                u = str(row.get("商品链接", "")).strip()
-                if u:
-                    urls.append(u)
-
         except Exception as e:
             print(f"[WARN] 读取 Excel 失败：{e}")
             print("[WARN] 将退出，不生成输出文件。\n")
@@ -386,17 +380,25 @@ def main():
         print("[WARN] 未提供任何有效商品链接。请重新运行并粘贴链接。\n")
         return
 
+    out_path = scrape_urls(cleaned)
+    if out_path:
+        open_file_with_default_app(out_path)
+
+
+def scrape_urls(urls: list[str]) -> str | None:
+    """抓取已清洗去重的商品链接，输出 (done).xlsx 并返回路径；没有任何 SKU 数据时返回 None。"""
     # 2) 抓取
-    session = requests.Session()
+    session = make_session()
     all_rows: list[dict] = []
     failed_urls: list[str] = []
 
-    for url in cleaned:
-        rows = scrape_one_product(session, url)
-        if rows:
-            all_rows.extend(rows)
-        else:
-            failed_urls.append(url)
+    with metrics.timer("scrape.fetch_parse", urls=len(urls)):
+        for url in urls:
+            rows = scrape_one_product(session, url)
+            if rows:
+                all_rows.extend(rows)
+            else:
+                failed_urls.append(url)
 
     # 3) 输出或告警
     if not all_rows:
@@ -411,11 +413,12 @@ def main():
                 print(f"  ... 以及另外 {len(failed_urls) - 20} 条")
 
         print("\n建议排查：Cookie 是否过期、链接是否需要登录、或查看 debug_html 中保存的页面源码。\n")
-        return
+        return None
 
     out_df = pd.DataFrame(all_rows)
     out_path = build_output_path()
-    out_df.to_excel(out_path, index=False)
+    with metrics.timer("scrape.write", rows=len(out_df)):
+        write_excel(out_df, out_path, sidecar=True)
 
     print("\n全部处理完成。输出：", out_path)
 
@@ -423,7 +426,10 @@ def main():
     if failed_urls:
         print(f"[WARN] 有 {len(failed_urls)} 个链接未抓取到数据（已忽略）。")
 
-    open_file_with_default_app(out_path)
+    return out_path
+
+
 if __name__ == "__main__":
+    metrics.start_run_from_argv("scrape")
     main()
 
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import hashlib
+import zipfile
+
+import metrics
+
+
+# ======================== CONFIG ========================
+
+WORK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 每个阶段上次成功运行的 输入哈希 / 输出文件哈希 / 结果
+CACHE_PATH = os.path.join(WORK_DIR, "pipeline_stage_cache.json")
+
+HASH_CHUNK = 1 << 20
+
+
+# ======================== Hashing ========================
+
+def _xlsx_digest(path: str) -> str | None:
+    """\
+    xlsx 按表格内容哈希：跳过 docProps/（每次保存都会写入新的修改时间），
+    内容相同的工作簿重写后哈希不变。不是合法 zip 时返回 None，退回按字节哈希。
+    """
+    h = hashlib.sha256()
+    try:
+        with zipfile.ZipFile(path) as zf:
+            for name in sorted(zf.namelist()):
+                if name.startswith("docProps/"):
+                    continue
+                h.update(name.encode("utf-8"))
+                with zf.open(name) as f:
+                    while True:
+                        chunk = f.read(HASH_CHUNK)
+                        if not chunk:
+                            break
+                        h.update(chunk)
+    except zipfile.BadZipFile:
+        return None
+    return h.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """文件内容的 sha256（xlsx 只哈希表格内容）；文件不存在时返回空字符串。"""
+    if not path or not os.path.isfile(path):
+        return ""
+    if path.lower().endswith(".xlsx"):
+        digest = _xlsx_digest(path)
+        if digest is not None:
+            return digest
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def digest_inputs(files: list[str] = (), params: dict | None = None) -> str:
+    """把输入文件内容哈希 + 参数合成一个阶段输入哈希（文件顺序无关）。"""
+    payload = {
+        "files": {os.path.abspath(p): file_digest(p) for p in sorted(set(files))},
+        "params": params or {},
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ======================== Cache file ========================
+
+def load_cache(path: str = CACHE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        print("[WARN] 读取阶段缓存失败，将全部重新运行:", e)
+        return {}
+
+
+def save_cache(cache: dict, path: str = CACHE_PATH) -> None:
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+    except Exception as e:
+        print("[WARN] 保存阶段缓存失败:", e)
+
+
+def outputs_unchanged(outputs: dict) -> bool:
+    """缓存中记录的输出文件都还在，且内容未被改动。"""
+    return all(file_digest(p) == d for p, d in outputs.items())
+
+
+# ======================== Stages ========================
+
+class Stage:
+    """\
+    流水线中的一个阶段。
+
+    inputs(ctx) -> (files, params)：本阶段依赖的文件和参数（上游阶段的结果在 ctx 中）
+    run(ctx)    -> {"outputs": [文件], "result": 可 JSON 序列化的结果, "data": 仅本进程内传递的对象}
+
+    inplace=True：阶段会改写自己的输入文件（如填充 (done) 工作簿），输入哈希在运行后重新计算；
+                  上游阶段记录的同名输出也更新为改写后的哈希，否则下次运行上游会被误判为输出已变化。
+    reuse_empty=False：上次没有产生任何输出时不复用（输入里没有体现的外部状态可能已经变化）。
+    """
+
+    def __init__(self, name: str, inputs, run, inplace: bool = False, reuse_empty: bool = True):
+        self.name = name
+        self.inputs = inputs
+        self.run = run
+        self.inplace = inplace
+        self.reuse_empty = reuse_empty
+
+
+def run_stages(
+    stages: list[Stage],
+    force: tuple | list | set = (),
+    cache_path: str = CACHE_PATH,
+) -> dict:
+    """\
+    依次运行各阶段；输入哈希与上次相同且上次的输出文件未变化时跳过，复用缓存的结果。
+    每个阶段成功后立即写缓存，后面的阶段失败时，重跑会从失败的阶段开始。
+    force 中的阶段（或 "all"）总是重新运行；某阶段重跑后，下游阶段的输入通常随之变化，也会重跑。
+
+    返回 {阶段名: {"result", "data", "skipped", "seconds"}}。
+    """
+    cache = load_cache(cache_path)
+    ctx: dict = {}
+    force = set(force)
+    done: list[str] = []
+
+    for st in stages:
+        files, params = st.inputs(ctx)
+        key = digest_inputs(files, params)
+        entry = cache.get(st.name)
+
+        reusable = (
+            entry is not None
+            and "all" not in force
+            and st.name not in force
+            and entry.get("input_hash") == key
+            and outputs_unchanged(entry.get("outputs") or {})
+            and (st.reuse_empty or entry.get("outputs"))
+        )
+        if reusable:
+            print(f"[SKIP] 阶段 {st.name}: 输入未变化，复用 {entry.get('finished_at')} 的结果。")
+            ctx[st.name] = {"result": entry.get("result"), "data": None, "skipped": True, "seconds": 0.0}
+            done.append(st.name)
+            continue
+
+        print(f"\n[STAGE] ===== {st.name} =====")
+        t0 = time.perf_counter()
+        out = st.run(ctx) or {}
+        seconds = time.perf_counter() - t0
+        metrics.record(f"stage.{st.name}", seconds)
+
+        if st.inplace:
+            files, params = st.inputs(ctx)
+            key = digest_inputs(files, params)
+        outputs = {os.path.abspath(p): file_digest(p) for p in out.get("outputs") or [] if p}
+        if st.inplace:
+            _refresh_upstream_outputs(cache, done, outputs)
+        cache[st.name] = {
+            "input_hash": key,
+            "outputs": outputs,
+            "result": out.get("result"),
+            "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "seconds": round(seconds, 3),
+        }
+        save_cache(cache, cache_path)
+        ctx[st.name] = {"result": out.get("result"), "data": out.get("data"), "skipped": False, "seconds": seconds}
+        print(f"[STAGE] {st.name} 完成，用时 {seconds:.1f}s")
+        done.append(st.name)
+
+    return ctx
+
+
+def _refresh_upstream_outputs(cache: dict, upstream: list[str], rewritten: dict) -> None:
+    """就地改写的文件如果是上游阶段的输出，把上游缓存中的哈希同步为改写后的内容。"""
+    for name in upstream:
+        recorded = (cache.get(name) or {}).get("outputs") or {}
+        for p in recorded.keys() & rewritten.keys():
+            recorded[p] = rewritten[p]
@@ -1,8 +1,8 @@
 // ==UserScript==
 // @name         BigSeller Shopee Title Prefix Helper
 // @namespace    https://joe.bigseller.helper
-// @version      0.95
-// @description  Shopee listing helper on BigSeller: title prefixes, description templates, SKU normalize, MD5, and variant name conversion.
+// @version      0.96
+// @description  Shopee listing helper on BigSeller: title prefixes, description templates, SKU normalize, MD5, variant name conversion, and 1688 mapping lookup.
 // @match        https://www.bigseller.pro/web/listing/shopee/edit/*
 // @run-at       document-idle
 // @grant        none
@@ -12,6 +12,14 @@
   'use strict';
 
   // ===================== CONFIG =====================
+  // 本機 Mapping 服務（Python/1688Purchase automation/mapping_service.py）
+  // 以 @grant none 運行，走頁面 fetch；服務端已把 https://www.bigseller.pro 加入 CORS 白名單
+  const MAPPING_SERVICE_URL = 'http://127.0.0.1:8765';
+  // 服務端設置了 MAPPING_SERVICE_TOKEN 時，這裡填同一個值（放在 X-Mapping-Token 請求頭）
+  const MAPPING_SERVICE_TOKEN = '';
+  // 映射行必須有這些欄位才能加購（與 mapping_service.REQUIRED_MAPPING_COLS 一致）
+  const REQUIRED_MAPPING_COLS = ['商品链接', 'Spec ID'];
+
   const STORE_CONFIG = {
     '墨墨優選': {
       titlePrefix: '🎀台灣現貨🎀',
@@ -771,25 +779,8 @@
 
   // ===================== SKU NORMALIZATION =====================
 
-  async function updateSkuWithParent(parentSku) {
-    if (!parentSku) return;
-
-    // 確保 OpenCC 已初始化（如果 CDN 掉了，仍會退回到小字典）
-    await loadOpenCC();
-
-    // 1) 把父 SKU 轉為簡體，確保前綴統一
-    const parentSkuSimplified = toSimplified(parentSku);
-    const prefixFinal = parentSkuSimplified || parentSku;
-
-    // 2) 把父 SKU 輸入框本身也改成簡體顯示
-    const parentSkuInput = getParentSkuInput();
-    if (parentSkuInput && parentSkuInput.value !== prefixFinal) {
-      parentSkuInput.value = prefixFinal;
-      parentSkuInput.dispatchEvent(new Event('input', { bubbles: true }));
-      parentSkuInput.dispatchEvent(new Event('change', { bubbles: true }));
-    }
-
-    // 3) 只在銷售區塊 (saleInfo) 內搜尋子 SKU 欄位
+  // 銷售區塊 (saleInfo) 內有值的子 SKU 輸入框（排除父 SKU）
+  function getVariantSkuFields(parentSkuInput) {
     const saleInfo = document.querySelector('div[data-anchor="saleInfo"]');
     const scope = saleInfo || document;
 
@@ -828,6 +819,30 @@
       return false;
     });
 
+    return skuFields;
+  }
+
+  async function updateSkuWithParent(parentSku) {
+    if (!parentSku) return;
+
+    // 確保 OpenCC 已初始化（如果 CDN 掉了，仍會退回到小字典）
+    await loadOpenCC();
+
+    // 1) 把父 SKU 轉為簡體，確保前綴統一
+    const parentSkuSimplified = toSimplified(parentSku);
+    const prefixFinal = parentSkuSimplified || parentSku;
+
+    // 2) 把父 SKU 輸入框本身也改成簡體顯示
+    const parentSkuInput = getParentSkuInput();
+    if (parentSkuInput && parentSkuInput.value !== prefixFinal) {
+      parentSkuInput.value = prefixFinal;
+      parentSkuInput.dispatchEvent(new Event('input', { bubbles: true }));
+      parentSkuInput.dispatchEvent(new Event('change', { bubbles: true }));
+    }
+
+    // 3) 只在銷售區塊 (saleInfo) 內搜尋子 SKU 欄位
+    const skuFields = getVariantSkuFields(parentSkuInput);
+
     if (!skuFields.length) {
       console.warn('[Title Helper] 未找到SKU輸入框（未匹配到包含 "SKU" 的欄位）');
       return;
@@ -875,6 +890,55 @@
     );
   }
 
+  // ===================== 1688 MAPPING LOOKUP =====================
+
+  // 批量查詢本機 Mapping 服務：POST /lookup {skus: [...]} -> {found: {大寫SKU: 行}, missing: [...]}
+  async function lookupMapping(skus) {
+    const headers = { 'Content-Type': 'application/json' };
+    if (MAPPING_SERVICE_TOKEN) headers['X-Mapping-Token'] = MAPPING_SERVICE_TOKEN;
+    const resp = await fetch(MAPPING_SERVICE_URL + '/lookup', {
+      method: 'POST',
+      headers,
+      body: JSON.stringify({ skus }),
+    });
+    if (!resp.ok) throw new Error('HTTP ' + resp.status);
+    const data = await resp.json();
+    return data.found || {};
+  }
+
+  function isCompleteMapping(row) {
+    return REQUIRED_MAPPING_COLS.every((c) => String((row && row[c]) || '').trim() !== '');
+  }
+
+  // 給每個子 SKU 輸入框加上顏色標記：綠 = 已有完整映射，紅 = 缺映射；滑鼠懸停顯示供應商
+  async function checkSkuMapping() {
+    const fields = getVariantSkuFields(getParentSkuInput());
+    if (!fields.length) {
+      console.warn('[Title Helper] 未找到SKU輸入框，無法查詢映射');
+      return '未找到SKU';
+    }
+    const keys = fields.map((el) => (el.value || '').trim().toUpperCase());
+
+    let found;
+    try {
+      found = await lookupMapping(Array.from(new Set(keys)));
+    } catch (e) {
+      console.warn('[Title Helper] Mapping 服務不可用（請先運行 mapping_service.py）:', e);
+      return '映射服務未啟動';
+    }
+
+    let missing = 0;
+    fields.forEach((el, i) => {
+      const row = found[keys[i]];
+      const ok = isCompleteMapping(row);
+      if (!ok) missing++;
+      el.style.outline = ok ? '2px solid #52c41a' : '2px solid #ff4d4f';
+      el.title = ok ? '1688: ' + (row['主供应商'] || row['商品链接']) : '缺 1688 映射';
+    });
+    console.log('[Title Helper] 映射查詢完成：', fields.length, '個SKU，缺映射', missing, '個');
+    return missing ? '缺映射 ' + missing + '/' + fields.length : '全部已映射 (' + fields.length + ')';
+  }
+
   // ===================== TITLE PREFIX CORE =====================
 
   function getStoreConfigSafe(storeNameOverride) {
@@ -1119,6 +1183,31 @@
 
     panel.appendChild(btnColor);
 
+    const btnMapping = document.createElement('button');
+    btnMapping.textContent = '查1688映射';
+    Object.assign(btnMapping.style, {
+      display: 'block',
+      width: '100%',
+      marginTop: '4px',
+      padding: '4px 0',
+      cursor: 'pointer',
+      borderRadius: '4px',
+      border: '1px solid #ccc',
+      background: '#f6ffed',
+    });
+
+    const mappingStatus = document.createElement('div');
+    mappingStatus.style.marginTop = '2px';
+    mappingStatus.style.color = '#666';
+
+    btnMapping.addEventListener('click', async () => {
+      mappingStatus.textContent = '查询中...';
+      mappingStatus.textContent = await checkSkuMapping();
+    });
+
+    panel.appendChild(btnMapping);
+    panel.appendChild(mappingStatus);
+
     function refreshShopLabel() {
       const autoShop = getShopName();
       if (autoShop) {